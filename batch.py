@@ -0,0 +1,217 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flow import create_bilibili_summary_flow
+from utils.download_subtitle import normalize_video_url
+from utils.llm_cache import get_llm_cache, cache_enabled
+from utils.archive import build_archive, print_archive_stats
+from utils.checkpoint import checkpoint_enabled, get_checkpoint_store
+from utils.rate_limit import limiter_stats
+from utils.llm_router import get_router
+
+def read_video_list(list_file):
+    """
+    读取视频列表文件，每行一个BV号、av号或视频URL
+
+    无法识别的行不会中断读取，作为失败的结果返回，最终出现在批次报告中。
+
+    参数:
+        list_file (str): 视频列表文件路径，空行和以#开头的行会被忽略
+
+    返回:
+        tuple: (视频URL列表（保持原有顺序并去重）, 无法识别的行对应的失败结果列表)
+    """
+    video_urls = []
+    invalid = []
+    seen = set()
+    with open(list_file, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                url = normalize_video_url(line)
+            except ValueError as e:
+                invalid.append({
+                    "video_url": line,
+                    "success": False,
+                    "error": f"第{line_number}行: {e}",
+                    "elapsed": 0.0
+                })
+                continue
+            if url not in seen:
+                seen.add(url)
+                video_urls.append(url)
+    return video_urls, invalid
+
+def summarize_video(video_url, config):
+    """
+    对单个视频运行完整的总结流程
+
+    参数:
+        video_url (str): 视频URL
+        config (dict): 运行配置（sessdata、api_key、model_name、base_url、output_dir，
+            以及rerun_from：从该阶段起忽略已保存的检查点重新运行）
+
+    返回:
+        dict: 单个视频的处理结果
+    """
+    shared = {
+        "video_url": video_url,
+        "sessdata": config.get("sessdata"),
+        "api_key": config.get("api_key"),
+        "model_name": config.get("model_name"),
+        "base_url": config.get("base_url"),
+        "output_dir": config.get("output_dir"),
+        # 各阶段的输出保存为检查点，失败后重跑时跳过已完成的阶段
+        "checkpoints": get_checkpoint_store() if checkpoint_enabled() else None,
+        "rerun_from": config.get("rerun_from")
+    }
+
+    start = time.perf_counter()
+    try:
+        # 每个视频使用独立的流程实例，避免并发时共享节点状态
+        create_bilibili_summary_flow().run(shared)
+    except Exception as e:
+        # 优先保留节点记录的原始错误，后续节点的连带异常只作为兜底
+        shared.setdefault("error", str(e))
+    elapsed = time.perf_counter() - start
+
+    if "html_path" in shared:
+        return {
+            "video_url": video_url,
+            "success": True,
+            "html_path": shared["html_path"],
+            "summary": shared.get("summary"),
+            "duplicate_of": shared.get("duplicate_of"),
+            "elapsed": elapsed
+        }
+    return {
+        "video_url": video_url,
+        "success": False,
+        "error": shared.get("error", "流程未完成"),
+        "elapsed": elapsed
+    }
+
+def run_batch(video_urls, sessdata, api_key=None, model_name=None, base_url=None,
+              output_dir=None, max_workers=4, rerun_from=None):
+    """
+    以有限并发批量总结多个视频，单个视频失败不会中断整个批次
+
+    参数:
+        video_urls (list): 视频URL列表
+        sessdata (str): B站的SESSDATA cookie
+        api_key (str, optional): OpenAI API密钥
+        model_name (str, optional): 模型名称
+        base_url (str, optional): API基础URL
+        output_dir (str, optional): HTML输出目录
+        max_workers (int): 同时处理的视频数量上限
+        rerun_from (str, optional): 从该阶段起忽略已保存的检查点重新运行
+
+    返回:
+        dict: 批次报告，包含每个视频的结果和整体吞吐量
+    """
+    config = {
+        "sessdata": sessdata,
+        "api_key": api_key,
+        "model_name": model_name,
+        "base_url": base_url,
+        "output_dir": output_dir,
+        "rerun_from": rerun_from
+    }
+
+    results = []
+    limiter_before = limiter_stats()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(summarize_video, url, config): url for url in video_urls}
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            status = "✅" if result["success"] else "❌"
+            detail = result["html_path"] if result["success"] else result["error"]
+            print(f"[{len(results)}/{len(video_urls)}] {status} {result['video_url']} "
+                  f"({result['elapsed']:.1f}s) {detail}")
+    elapsed = time.perf_counter() - start
+
+    # 按输入顺序输出结果
+    order = {url: i for i, url in enumerate(video_urls)}
+    results.sort(key=lambda r: order[r["video_url"]])
+
+    succeeded = sum(1 for r in results if r["success"])
+    duplicates = sum(1 for r in results if r.get("duplicate_of"))
+    # 限流器的统计是进程内累计值，取本批次的增量
+    limiter_after = limiter_stats()
+    llm_limiter = {key: limiter_after[key] - limiter_before[key] for key in limiter_after}
+    return {
+        "results": results,
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "duplicates": duplicates,
+        "elapsed": elapsed,
+        "videos_per_minute": len(results) / elapsed * 60 if elapsed > 0 else 0.0,
+        "llm_cache": get_llm_cache().stats() if cache_enabled() else None,
+        "llm_limiter": llm_limiter,
+        "llm_endpoints": get_router().stats() if get_router() is not None else None
+    }
+
+def print_batch_report(report):
+    """打印批次汇总信息"""
+    print("\n" + "=" * 50)
+    print(f"批量处理完成: 共 {report['total']} 个视频，"
+          f"成功 {report['succeeded']} 个，失败 {report['failed']} 个")
+    print(f"总耗时: {report['elapsed']:.1f}s，吞吐量: {report['videos_per_minute']:.2f} 个视频/分钟")
+    if report.get("llm_cache"):
+        print(f"LLM缓存: 命中 {report['llm_cache']['hits']} 次，未命中 {report['llm_cache']['misses']} 次")
+    if report.get("duplicates"):
+        print(f"重复字幕: {report['duplicates']} 个视频复用了已有摘要，未调用LLM")
+    limiter = report.get("llm_limiter")
+    if limiter and (limiter["throttle_seconds"] or limiter["retries"] or limiter["rejected"]):
+        print(f"LLM限流: 累计等待 {limiter['throttle_seconds']:.1f}s，重试 {limiter['retries']} 次"
+              f"（其中被限流 {limiter['rate_limited']} 次），熔断 {limiter['circuit_opened']} 次，"
+              f"熔断期间拒绝 {limiter['rejected']} 次")
+    for endpoint in report.get("llm_endpoints") or []:
+        print(f"LLM接口 {endpoint['name']}（{endpoint['model']}）: 请求 {endpoint['requests']} 次，"
+              f"采用 {endpoint['wins']} 次，对冲 {endpoint['hedges']} 次，失败 {endpoint['errors']} 次，"
+              f"延迟p50 {endpoint['p50']}s，p95 {endpoint['p95']}s")
+    failed = [r for r in report["results"] if not r["success"]]
+    if failed:
+        print("\n失败的视频:")
+        for r in failed:
+            print(f"  - {r['video_url']}: {r['error']}")
+    print("=" * 50)
+
+def main(args):
+    """批量模式入口"""
+    sessdata = args.sessdata or os.environ.get("BILIBILI_SESSDATA")
+    if not sessdata:
+        print("⚠️ 批量模式需要通过 --sessdata 或环境变量 BILIBILI_SESSDATA 提供SESSDATA")
+        return 1
+
+    video_urls, invalid = read_video_list(args.list_file)
+    print(f"共读取 {len(video_urls)} 个视频，并发数: {args.workers}")
+    for result in invalid:
+        print(f"⚠️ 跳过无法识别的视频: {result['error']}")
+
+    report = run_batch(
+        video_urls,
+        sessdata,
+        api_key=args.api_key,
+        model_name=args.model,
+        base_url=args.base_url,
+        output_dir=args.output_dir,
+        max_workers=args.workers,
+        rerun_from=args.rerun_from
+    )
+    # 无法识别的行计入失败的视频
+    report["results"].extend(invalid)
+    report["total"] += len(invalid)
+    report["failed"] += len(invalid)
+    print_batch_report(report)
+
+    # 更新输出目录中的归档索引，只重写新增或变化的页面
+    if report["succeeded"]:
+        stats = build_archive(args.output_dir or os.getcwd())
+        print_archive_stats(stats)
+    return 0 if report["failed"] == 0 else 1
@@ -0,0 +1,199 @@
+"""
+本地的B站接口替代服务，用于离线测试进程内的字幕获取
+
+按录制的接口回复格式实现总结流程用到的接口:
+    /x/web-interface/nav    返回WBI签名密钥
+    /x/web-interface/view   返回视频信息和分P列表
+    /x/player/wbi/v2        返回字幕轨道列表
+    /bfs/subtitle/<文件>     返回BCC格式的字幕JSON（由样例字幕文件转换）
+
+任意BV号都会返回同一份样例字幕，每个视频的分P数和字幕轨道可通过参数配置。
+字幕轨道接口校验WBI签名，签名缺失或不正确时返回-403。
+"""
+import os
+import sys
+import json
+import time
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from fake_yutto import default_fixture
+
+# 录制的nav回复中的签名密钥
+NAV_WBI_IMG = {
+    "img_url": "https://i0.hdslb.com/bfs/wbi/7cd084941338484aae1ad9425b84077c.png",
+    "sub_url": "https://i0.hdslb.com/bfs/wbi/4932caff0ff746eab6f01bf08b70ac45.png"
+}
+
+def _valid_signature(query):
+    """按录制的签名密钥重新计算w_rid，检查请求的WBI签名"""
+    from utils.bilibili_api import sign_wbi
+    if "w_rid" not in query or "wts" not in query:
+        return False
+    img_key = NAV_WBI_IMG["img_url"].rsplit("/", 1)[-1].split(".")[0]
+    sub_key = NAV_WBI_IMG["sub_url"].rsplit("/", 1)[-1].split(".")[0]
+    params = {k: v for k, v in query.items() if k not in ("w_rid", "wts")}
+    try:
+        expected = sign_wbi(params, img_key, sub_key, int(query["wts"]))["w_rid"]
+    except ValueError:
+        return False
+    return expected == query["w_rid"]
+
+def fixture_to_bcc(fixture):
+    """将样例字幕文件转换为BCC格式的JSON内容"""
+    from utils.process_subtitle import detect_subtitle_format, parse_srt, parse_ass, parse_bcc
+    parsers = {"srt": parse_srt, "ass": parse_ass, "bcc": parse_bcc}
+    cues = parsers[detect_subtitle_format(fixture)](fixture)
+    body = [
+        {"from": cue.start_ms / 1000, "to": cue.end_ms / 1000, "sid": i + 1, "location": 2, "content": cue.text}
+        for i, cue in enumerate(cues)
+    ]
+    return json.dumps({
+        "font_size": 0.4, "font_color": "#FFFFFF", "background_alpha": 0.5,
+        "background_color": "#9C27B0", "Stroke": "none", "body": body
+    }, ensure_ascii=False).encode("utf-8")
+
+class FakeBilibiliServer:
+    """
+    在后台线程中运行的B站接口替代服务
+
+    参数:
+        fixture (str): 作为字幕内容的样例文件，默认使用datas/下的第一个.srt文件
+        latency (float): 每个请求的模拟延迟（秒）
+        pages (int): 每个视频的分P数
+        languages (list): 每个分P的字幕语言，为空时视频没有字幕
+        drop_requests (int): 前几个请求不回复、直接断开连接（模拟服务端关闭的长连接）
+        host (str): 监听地址
+        port (int): 监听端口，0表示自动分配
+    """
+
+    def __init__(self, fixture=None, latency=0.0, pages=1, languages=("ai-zh",), drop_requests=0,
+                 host="127.0.0.1", port=0):
+        self.latency = latency
+        self.pages = pages
+        self.languages = list(languages)
+        self.drop_requests = drop_requests
+        self.subtitle = fixture_to_bcc(fixture or default_fixture())
+        self.request_counts = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, endpoint):
+        with self._lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+
+    def _take_drop(self):
+        with self._lock:
+            if self.drop_requests <= 0:
+                return False
+            self.drop_requests -= 1
+            self.request_counts["dropped"] = self.request_counts.get("dropped", 0) + 1
+            return True
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 长连接上响应头和响应体分两次写出，关闭Nagle算法避免延迟确认带来的额外等待
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if server._take_drop():
+                    self.close_connection = True
+                    return
+                parts = urlsplit(self.path)
+                query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+                if server.latency:
+                    time.sleep(server.latency)
+
+                if parts.path == "/x/web-interface/nav":
+                    server._count("nav")
+                    # 未登录时的真实回复：code为-101，但仍包含wbi_img
+                    self._send_json({"code": -101, "message": "账号未登录", "ttl": 1,
+                                     "data": {"isLogin": False, "wbi_img": NAV_WBI_IMG}})
+                elif parts.path == "/x/web-interface/view":
+                    server._count("view")
+                    bvid = query.get("bvid") or f"BV1fake{query.get('aid', '0')}"
+                    pages = [
+                        {"cid": 100000 + page, "page": page, "part": f"第{page}集", "duration": 600}
+                        for page in range(1, server.pages + 1)
+                    ]
+                    self._send_json({"code": 0, "message": "0", "ttl": 1, "data": {
+                        "bvid": bvid, "aid": 170001, "title": f"测试视频 {bvid}",
+                        "cid": pages[0]["cid"], "pages": pages
+                    }})
+                elif parts.path == "/x/player/wbi/v2":
+                    server._count("player")
+                    if not _valid_signature(query):
+                        self._send_json({"code": -403, "message": "访问权限不足", "ttl": 1})
+                        return
+                    host = self.headers.get("Host")
+                    subtitles = [
+                        {"id": i + 1, "lan": lan, "lan_doc": lan,
+                         "subtitle_url": f"//{host}/bfs/subtitle/{query.get('cid')}_{lan}.json"}
+                        for i, lan in enumerate(server.languages)
+                    ]
+                    self._send_json({"code": 0, "message": "0", "ttl": 1, "data": {
+                        "bvid": query.get("bvid"), "cid": int(query.get("cid", 0)),
+                        "subtitle": {"allow_submit": False, "lan": "", "lan_doc": "", "subtitles": subtitles}
+                    }})
+                elif parts.path.startswith("/bfs/subtitle/"):
+                    server._count("subtitle")
+                    self._send(server.subtitle)
+                else:
+                    self.send_error(404)
+
+            def _send_json(self, payload):
+                self._send(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+            def _send(self, data):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def start(self):
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="本地B站接口替代服务")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--pages", type=int, default=1)
+    args = parser.parse_args()
+    server = FakeBilibiliServer(latency=args.latency, pages=args.pages, port=args.port)
+    print(f"模拟服务已启动: {server.base_url}（设置BILI_API_BASE={server.base_url}）")
+    server._server.serve_forever()
@@ -0,0 +1,164 @@
+"""
+本地的OpenAI兼容服务，用于离线基准测试
+
+实现/v1/chat/completions接口（支持stream=True），按配置的延迟返回固定的摘要JSON，
+也可以按比例返回带Retry-After的429回复（测试限流和重试），或按比例返回特别慢的回复（测试对冲请求）。
+"""
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_SUMMARY = {
+    "标题": "基准测试摘要",
+    "核心内容": "这是本地模拟服务返回的固定摘要，用于测量流程本身的性能。",
+    "关键点": ["第一个关键点", "第二个关键点", "第三个关键点"],
+    "详细摘要": "本地模拟服务不调用真实模型，只按配置的延迟返回固定内容。" * 10,
+    "结论": "基准测试结束。"
+}
+
+class FakeOpenAIServer:
+    """
+    在后台线程中运行的OpenAI兼容服务
+
+    参数:
+        latency (float): 每个请求的模拟延迟（秒）
+        response (dict|str): 返回的内容，dict会被序列化为JSON
+        rate_limit_ratio (float): 返回429的请求比例
+        retry_after (float): 429回复中Retry-After头的秒数
+        tail_ratio (float): 以tail_latency代替latency的请求比例，模拟长尾延迟
+        tail_latency (float): 长尾请求的延迟（秒）
+        host (str): 监听地址
+        port (int): 监听端口，0表示自动分配
+    """
+
+    def __init__(self, latency=0.5, response=None, rate_limit_ratio=0.0, retry_after=1.0,
+                 tail_ratio=0.0, tail_latency=5.0, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.tail_ratio = tail_ratio
+        self.tail_latency = tail_latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.rate_limited_count = 0
+        content = CANNED_SUMMARY if response is None else response
+        self.content = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+
+                with server._lock:
+                    server.request_count += 1
+                    rate_limited = random.random() < server.rate_limit_ratio
+                    if rate_limited:
+                        server.rate_limited_count += 1
+                if rate_limited:
+                    self._send_json({"error": {"message": "Rate limit reached", "type": "requests",
+                                               "code": "rate_limit_exceeded"}},
+                                    status=429, headers={"Retry-After": f"{server.retry_after:g}"})
+                    return
+                slow = random.random() < server.tail_ratio
+                time.sleep(server.tail_latency if slow else server.latency)
+
+                prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+                usage = {
+                    "prompt_tokens": len(prompt),
+                    "completion_tokens": len(server.content),
+                    "total_tokens": len(prompt) + len(server.content)
+                }
+                if body.get("stream"):
+                    self._send_stream(body.get("model"), usage)
+                else:
+                    self._send_json({
+                        "id": "chatcmpl-bench",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model"),
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": server.content},
+                            "finish_reason": "stop"
+                        }],
+                        "usage": usage
+                    })
+
+            def _send_json(self, payload, status=200, headers=None):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, model, usage):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                content = server.content
+                for i in range(0, len(content), 16):
+                    chunk = {
+                        "id": "chatcmpl-bench",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": content[i:i + 16]}, "finish_reason": None}]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+    def start(self):
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="本地OpenAI兼容模拟服务")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    server = FakeOpenAIServer(latency=args.latency, port=args.port)
+    print(f"模拟服务已启动: {server.base_url}")
+    server._server.serve_forever()
@@ -0,0 +1,48 @@
+"""
+替代yutto的离线桩程序，用于基准测试
+
+只支持总结流程用到的参数（URL、--subtitle-only、--dir、--sessdata），
+把固定的字幕文件复制到输出目录，不访问网络。
+
+环境变量:
+    BENCH_SUBTITLE_FIXTURE: 作为下载结果的字幕文件，默认使用datas/下的第一个.srt文件
+    BENCH_YUTTO_DELAY: 模拟下载耗时（秒），默认0
+"""
+import os
+import sys
+import time
+import glob
+import shutil
+import argparse
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def default_fixture():
+    """返回默认的字幕样例文件"""
+    fixtures = sorted(glob.glob(os.path.join(PROJECT_DIR, "datas", "*.srt")))
+    if not fixtures:
+        raise FileNotFoundError("datas/目录下没有可用的字幕样例")
+    return fixtures[0]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="yutto")
+    parser.add_argument("url")
+    parser.add_argument("--subtitle-only", action="store_true")
+    parser.add_argument("--dir", "-d", default=".")
+    parser.add_argument("--sessdata", "-c")
+    args, _ = parser.parse_known_args(argv)
+
+    delay = float(os.environ.get("BENCH_YUTTO_DELAY", "0"))
+    if delay > 0:
+        time.sleep(delay)
+
+    fixture = os.environ.get("BENCH_SUBTITLE_FIXTURE") or default_fixture()
+    video_id = args.url.rstrip("/").split("/")[-1].split("?")[0]
+    target_dir = os.path.join(args.dir, video_id)
+    os.makedirs(target_dir, exist_ok=True)
+    shutil.copyfile(fixture, os.path.join(target_dir, os.path.basename(fixture)))
+    print(f"字幕已保存到 {target_dir}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""
+离线端到端基准测试
+
+使用本地的B站接口替代服务（或替代yutto的桩程序）和本地OpenAI兼容服务运行完整的总结流程，
+不访问B站和付费API。
+输出各阶段与端到端延迟、不同并发度下的吞吐量和峰值内存，并保存为JSON便于跨提交对比。
+
+用法:
+    python benchmarks/run_bench.py --videos 8 --levels 1,4,8 --llm-latency 0.5
+    python benchmarks/run_bench.py --compare benchmarks/results/旧结果.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager, redirect_stdout
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, PROJECT_DIR)
+
+from fake_openai_server import FakeOpenAIServer
+from fake_bilibili_server import FakeBilibiliServer
+
+def percentile(values, pct):
+    """计算百分位数（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+def describe(values):
+    """汇总一组耗时（秒）"""
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "max": max(values) if values else 0.0
+    }
+
+def peak_rss_mb():
+    """当前进程及已结束子进程的峰值常驻内存（MB）"""
+    # Linux上ru_maxrss的单位是KB，macOS上是字节
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    }
+
+def git_commit():
+    """当前提交的短哈希"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+@contextmanager
+def stage_timer(timings):
+    """在类级别包装各节点的_run，记录每个阶段的耗时"""
+    import nodes
+    lock = threading.Lock()
+    patched = []
+    for name in ("InputNode", "SubtitleExtractNode", "SubtitleProcessNode", "DuplicateCheckNode",
+                 "SummaryGenerationNode", "HTMLGenerationNode"):
+        cls = getattr(nodes, name, None)
+        if cls is None:
+            continue
+        original = cls.__dict__.get("_run")
+
+        def timed_run(self, shared, _name=name, _cls=cls, _original=original):
+            start = time.perf_counter()
+            try:
+                return super(_cls, self)._run(shared) if _original is None else _original(self, shared)
+            finally:
+                with lock:
+                    timings.setdefault(_name, []).append(time.perf_counter() - start)
+
+        cls._run = timed_run
+        patched.append((cls, original))
+    try:
+        yield
+    finally:
+        for cls, original in patched:
+            if original is None:
+                del cls._run
+            else:
+                cls._run = original
+
+@contextmanager
+def offline_environment(args, work_dir):
+    """准备B站接口替代服务、桩yutto、本地模型服务和独立的缓存目录"""
+    bin_dir = os.path.join(work_dir, "bin")
+    os.makedirs(bin_dir)
+    stub = os.path.join(bin_dir, "yutto")
+    with open(stub, "w", encoding="utf-8") as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.join(BENCH_DIR, "fake_yutto.py")}" "$@"\n')
+    os.chmod(stub, 0o755)
+
+    saved_env = dict(os.environ)
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+    os.environ["BILI_SUMMARY_CACHE_DIR"] = os.path.join(work_dir, "cache")
+    os.environ["BILI_LLM_CACHE"] = "0"
+    # 模拟服务的各视频字幕相同，关闭重复检测以测量完整的总结流程
+    os.environ["BILI_DEDUP"] = "0"
+    os.environ["BENCH_YUTTO_DELAY"] = str(args.yutto_delay)
+    if args.fixture:
+        os.environ["BENCH_SUBTITLE_FIXTURE"] = os.path.abspath(args.fixture)
+
+    bilibili = None
+    if args.fetcher == "api":
+        bilibili = FakeBilibiliServer(fixture=args.fixture, latency=args.api_latency).start()
+        os.environ["BILI_API_BASE"] = bilibili.base_url
+    else:
+        os.environ["BILI_SUBTITLE_FETCHER"] = "yutto"
+
+    servers = [
+        FakeOpenAIServer(latency=args.llm_latency, rate_limit_ratio=args.llm_429_ratio,
+                         retry_after=args.llm_retry_after, tail_ratio=args.llm_tail_ratio,
+                         tail_latency=args.llm_tail_latency).start()
+        for _ in range(max(1, args.llm_endpoints))
+    ]
+    if len(servers) > 1:
+        # 多个模拟服务组成接口池，流程不指定base_url，由路由器选择
+        os.environ["BILI_LLM_ENDPOINTS"] = json.dumps([
+            {"base_url": s.base_url, "model": "bench", "api_key": "bench", "name": f"mock{i + 1}"}
+            for i, s in enumerate(servers)
+        ])
+    try:
+        yield servers
+    finally:
+        for server in servers:
+            server.stop()
+        if bilibili is not None:
+            bilibili.stop()
+        os.environ.clear()
+        os.environ.update(saved_env)
+
+def run_benchmark(args):
+    """运行基准测试并返回结果"""
+    work_dir = tempfile.mkdtemp(prefix="bilibili_bench_")
+    timings = {}
+    concurrency = []
+    try:
+        with offline_environment(args, work_dir) as servers, stage_timer(timings):
+            from batch import run_batch
+
+            config = {
+                "sessdata": "bench",
+                "api_key": "bench",
+                "base_url": servers[0].base_url if len(servers) == 1 else None,
+                "output_dir": os.path.join(work_dir, "html")
+            }
+            counter = 0
+            for workers in args.levels:
+                # 每个视频使用新的ID，保证每次都真正走完下载和生成流程
+                video_urls = []
+                for _ in range(args.videos):
+                    counter += 1
+                    video_urls.append(f"https://www.bilibili.com/video/BV1Bch{counter:06d}")
+                requests_before = sum(server.request_count for server in servers)
+                print(f"并发 {workers}: 处理 {len(video_urls)} 个视频...")
+                # 默认隐藏流程本身的进度输出
+                with redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+                    report = run_batch(video_urls, max_workers=workers, **config)
+                concurrency.append({
+                    "workers": workers,
+                    "videos": report["total"],
+                    "failed": report["failed"],
+                    "elapsed": report["elapsed"],
+                    "videos_per_minute": report["videos_per_minute"],
+                    "llm_requests": sum(server.request_count for server in servers) - requests_before,
+                    "llm_retries": report["llm_limiter"]["retries"],
+                    "llm_throttle_seconds": report["llm_limiter"]["throttle_seconds"],
+                    "end_to_end": describe([r["elapsed"] for r in report["results"]])
+                })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "videos_per_level": args.videos,
+            "levels": args.levels,
+            "llm_latency": args.llm_latency,
+            "llm_429_ratio": args.llm_429_ratio,
+            "llm_endpoints": args.llm_endpoints,
+            "llm_tail_ratio": args.llm_tail_ratio,
+            "llm_tail_latency": args.llm_tail_latency,
+            "fetcher": args.fetcher,
+            "api_latency": args.api_latency,
+            "yutto_delay": args.yutto_delay,
+            "fixture": args.fixture
+        },
+        "stages": {name: describe(values) for name, values in timings.items()},
+        "concurrency": concurrency,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+def print_results(results):
+    """打印结果摘要"""
+    print("\n===== 各阶段耗时（秒） =====")
+    for name, stats in results["stages"].items():
+        print(f"{name:<24} 次数 {stats['count']:>4}  平均 {stats['mean']:.3f}  "
+              f"p50 {stats['p50']:.3f}  p95 {stats['p95']:.3f}")
+    print("\n===== 并发吞吐量 =====")
+    for level in results["concurrency"]:
+        print(f"并发 {level['workers']:>3}: {level['videos']} 个视频，失败 {level['failed']}，"
+              f"耗时 {level['elapsed']:.2f}s，{level['videos_per_minute']:.1f} 个视频/分钟，"
+              f"端到端p50 {level['end_to_end']['p50']:.3f}s，LLM重试 {level.get('llm_retries', 0)} 次")
+    rss = results["peak_rss_mb"]
+    print(f"\n峰值内存: 主进程 {rss['self']:.1f}MB，子进程 {rss['children']:.1f}MB")
+
+def compare_results(old, new):
+    """对比两次基准测试结果"""
+    print(f"\n===== 对比 {old['commit']} -> {new['commit']} =====")
+    for name, stats in new["stages"].items():
+        if name in old["stages"] and old["stages"][name]["p50"]:
+            before = old["stages"][name]["p50"]
+            change = (stats["p50"] - before) / before * 100
+            print(f"{name:<24} p50 {before:.3f}s -> {stats['p50']:.3f}s ({change:+.1f}%)")
+    old_levels = {level["workers"]: level for level in old["concurrency"]}
+    for level in new["concurrency"]:
+        before = old_levels.get(level["workers"])
+        if before and before["videos_per_minute"]:
+            change = (level["videos_per_minute"] - before["videos_per_minute"]) / before["videos_per_minute"] * 100
+            print(f"并发 {level['workers']:>3} 吞吐量 {before['videos_per_minute']:.1f} -> "
+                  f"{level['videos_per_minute']:.1f} 个视频/分钟 ({change:+.1f}%)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="哔哩哔哩视频总结器离线基准测试")
+    parser.add_argument("--videos", type=int, default=8, help="每个并发度下处理的视频数（默认8）")
+    parser.add_argument("--levels", default="1,4,8", help="逗号分隔的并发度列表（默认1,4,8）")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="模拟模型服务的响应延迟（秒）")
+    parser.add_argument("--llm-429-ratio", type=float, default=0.0, help="模拟模型服务返回429的请求比例")
+    parser.add_argument("--llm-retry-after", type=float, default=1.0, help="模拟的429回复中Retry-After的秒数")
+    parser.add_argument("--llm-endpoints", type=int, default=1, help="模拟模型服务的数量，大于1时通过接口池路由")
+    parser.add_argument("--llm-tail-ratio", type=float, default=0.0, help="模拟模型服务长尾请求的比例")
+    parser.add_argument("--llm-tail-latency", type=float, default=5.0, help="长尾请求的延迟（秒）")
+    parser.add_argument("--fetcher", choices=["api", "yutto"], default="api",
+                        help="字幕获取方式：进程内接口（默认）或yutto子进程")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="模拟B站接口每个请求的延迟（秒）")
+    parser.add_argument("--yutto-delay", type=float, default=0.0, help="模拟yutto下载的额外延迟（秒）")
+    parser.add_argument("--fixture", help="作为下载结果的字幕文件，默认使用datas/下的样例")
+    parser.add_argument("--output", help="结果JSON路径，默认为benchmarks/results/<提交>-<时间>.json")
+    parser.add_argument("--compare", help="与之前保存的结果JSON对比")
+    parser.add_argument("--verbose", action="store_true", help="显示流程本身的进度输出")
+    args = parser.parse_args(argv)
+    args.levels = [int(level) for level in args.levels.split(",") if level.strip()]
+
+    results = run_benchmark(args)
+    print_results(results)
+
+    output = args.output or os.path.join(
+        BENCH_DIR, "results", f"{results['commit']}-{time.strftime('%Y%m%d%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存到 {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare_results(json.load(f), results)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
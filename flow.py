@@ -3,6 +3,7 @@ from nodes import (
     InputNode, 
     SubtitleExtractNode, 
     SubtitleProcessNode,
+    DuplicateCheckNode,
     SummaryGenerationNode,
     HTMLGenerationNode,
     ErrorHandlingNode
@@ -14,6 +15,7 @@ def create_bilibili_summary_flow():
     input_node = InputNode()
     subtitle_extract_node = SubtitleExtractNode()
     subtitle_process_node = SubtitleProcessNode()
+    duplicate_check_node = DuplicateCheckNode()
     summary_generation_node = SummaryGenerationNode()
     html_generation_node = HTMLGenerationNode()
     error_handling_node = ErrorHandlingNode()
@@ -21,8 +23,12 @@ def create_bilibili_summary_flow():
     # 连接节点 - 使用普通路径连接
     input_node >> subtitle_extract_node
     subtitle_extract_node >> subtitle_process_node
-    subtitle_process_node >> summary_generation_node
+    subtitle_process_node >> duplicate_check_node
+    duplicate_check_node >> summary_generation_node
     summary_generation_node >> html_generation_node
+
+    # 字幕与已总结的视频几乎相同时复用其摘要，跳过摘要生成
+    duplicate_check_node - "duplicate" >> html_generation_node
     
     # 注意：在pocketflow 0.0.1版本中可能没有add_edge方法
     # 我们需要在节点的post方法中处理错误路径
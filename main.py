@@ -1,23 +1,199 @@
+import os
+import argparse
+import sys
 from flow import bilibili_summary_flow
+from utils.checkpoint import STAGES, checkpoint_enabled, get_checkpoint_store
 
-def main():
+def run_interactive():
     """启动B站视频总结器"""
     print("="*50)
     print("欢迎使用哔哩哔哩视频总结器!")
     print("本工具使用yutto获取B站视频字幕，然后生成视频内容摘要")
     print("="*50)
-    
-    # 初始化共享数据
-    shared = {}
-    
+
+    # 初始化共享数据，交互模式下流式显示摘要
+    shared = {"stream_summary": True}
+    if checkpoint_enabled():
+        shared["checkpoints"] = get_checkpoint_store()
+
     # 运行流程
     bilibili_summary_flow.run(shared)
-    
+
     # 如果成功生成了HTML文件，提示用户
     if "html_path" in shared:
         print(f"\n您可以打开以下文件查看完整摘要:")
         print(f"file://{shared['html_path']}")
         print("\n感谢使用哔哩哔哩视频总结器!")
 
+def build_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(description="哔哩哔哩视频总结器")
+    subparsers = parser.add_subparsers(dest="command")
+
+    # 批量模式
+    batch_parser = subparsers.add_parser("batch", help="从文件读取多个视频并发生成摘要")
+    batch_parser.add_argument("list_file", help="视频列表文件，每行一个BV号、av号或视频URL")
+    batch_parser.add_argument("--sessdata", help="B站SESSDATA，默认读取环境变量BILIBILI_SESSDATA")
+    batch_parser.add_argument("--api-key", help="OpenAI API密钥，默认读取环境变量OPENAI_API_KEY")
+    batch_parser.add_argument("--model", help="模型名称，默认使用gpt-3.5-turbo")
+    batch_parser.add_argument("--base-url", help="API基础URL，默认使用OpenAI官方API")
+    batch_parser.add_argument("--endpoints", help="LLM接口池配置（JSON文件），未指定--base-url时按延迟路由并对冲慢请求")
+    batch_parser.add_argument("--output-dir", help="HTML输出目录，默认为当前目录")
+    batch_parser.add_argument("--workers", type=int, default=4, help="同时处理的视频数量（默认4）")
+    batch_parser.add_argument("--no-llm-cache", action="store_true", help="不使用本地LLM回复缓存")
+    batch_parser.add_argument("--metrics-dir", help="记录各节点耗时与LLM用量，写入该目录的metrics.jsonl和metrics.prom")
+    batch_parser.add_argument("--rerun-from", choices=STAGES,
+                              help="从该阶段起忽略已保存的检查点重新运行（重新生成摘要时可配合--no-llm-cache）")
+    batch_parser.add_argument("--no-checkpoint", action="store_true", help="不读取也不保存阶段检查点")
+    batch_parser.add_argument("--no-dedup", action="store_true", help="不检测重复字幕，总是调用LLM生成摘要")
+
+    # 服务模式
+    serve_parser = subparsers.add_parser("serve", help="启动HTTP服务，接收总结请求")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认127.0.0.1）")
+    serve_parser.add_argument("--port", type=int, default=8000, help="监听端口（默认8000）")
+    serve_parser.add_argument("--sessdata", help="B站SESSDATA，默认读取环境变量BILIBILI_SESSDATA")
+    serve_parser.add_argument("--api-key", help="OpenAI API密钥，默认读取环境变量OPENAI_API_KEY")
+    serve_parser.add_argument("--output-dir", help="HTML输出目录，默认为当前目录")
+    serve_parser.add_argument("--endpoints", help="LLM接口池配置（JSON文件），请求未指定base_url时按延迟路由")
+    serve_parser.add_argument("--workers", type=int, default=4, help="同时运行的总结流程数量（默认4）")
+
+    # 构建归档
+    render_parser = subparsers.add_parser("render", help="根据保存的摘要数据增量构建输出目录中的HTML归档和分页索引")
+    render_parser.add_argument("output_dir", help="HTML输出目录")
+    render_parser.add_argument("--page-size", type=int, default=50, help="每个索引页的视频数量（默认50）")
+    render_parser.add_argument("--full", action="store_true", help="忽略归档清单，重新渲染全部页面")
+
+    # 导入本地字幕
+    ingest_parser = subparsers.add_parser("ingest", help="多进程解析本地字幕目录，写入按视频分行的语料文件")
+    ingest_parser.add_argument("directory", help="字幕根目录，默认按文件名分组，同名不同语言的字幕属于同一个视频")
+    ingest_parser.add_argument("-o", "--output", default="corpus.jsonl.gz", help="语料文件路径（默认corpus.jsonl.gz）")
+    ingest_parser.add_argument("--workers", type=int, help="进程数，默认为CPU核数")
+    ingest_parser.add_argument("--per-dir", action="store_true",
+                               help="同一目录下的字幕文件属于同一个视频（yutto下载目录，多P视频按文件名分P）")
+
+    # 全文搜索
+    search_parser = subparsers.add_parser("search", help="在已生成的摘要和字幕中搜索，结果定位到字幕时间点")
+    search_parser.add_argument("query", nargs="?", default="", help="查询文本")
+    search_parser.add_argument("--limit", type=int, default=10, help="返回的最大结果数（默认10）")
+    search_parser.add_argument("--index-archive", metavar="OUTPUT_DIR",
+                               help="先把该输出目录中已保存的摘要加入索引（字幕从检查点读取）")
+
+    # 字幕问答
+    ask_parser = subparsers.add_parser("ask", help="针对视频字幕提问，只把相关片段发送给LLM，回答标注时间点")
+    ask_parser.add_argument("video", help="BV号、av号或视频URL")
+    ask_parser.add_argument("question", nargs="?", help="问题，省略时进入连续提问模式")
+    ask_parser.add_argument("--sessdata", help="B站SESSDATA，没有已保存的字幕时用于下载，默认读取环境变量BILIBILI_SESSDATA")
+    ask_parser.add_argument("--api-key", help="OpenAI API密钥，默认读取环境变量OPENAI_API_KEY")
+    ask_parser.add_argument("--model", help="模型名称，默认使用gpt-3.5-turbo")
+    ask_parser.add_argument("--base-url", help="API基础URL，默认使用OpenAI官方API")
+    ask_parser.add_argument("--top-k", type=int, default=4, help="每个问题发送的字幕片段数量（默认4）")
+
+    return parser
+
+def run_ask(args):
+    """针对单个视频的字幕回答问题"""
+    from utils.download_subtitle import normalize_video_url, extract_video_id
+    from utils.qa import load_subtitle_data, get_video_index, answer_question, cite
+    video_url = normalize_video_url(args.video)
+    video_id = extract_video_id(video_url)
+    subtitle_data = load_subtitle_data(video_url, args.sessdata or os.environ.get("BILIBILI_SESSDATA"))
+    summary = get_checkpoint_store().latest(video_id, "summary") or {}
+    # 索引只在第一次提问前构建，之后的问题只检索相关片段
+    index = get_video_index(video_id, subtitle_data)
+
+    questions = [args.question] if args.question else None
+    while True:
+        if questions is not None:
+            if not questions:
+                return 0
+            question = questions.pop()
+        else:
+            question = input("\n请输入问题 (直接回车退出): ").strip()
+            if not question:
+                return 0
+        result = answer_question(question, index, video_url, title=summary.get("标题"),
+                                 model_name=args.model, base_url=args.base_url, api_key=args.api_key,
+                                 top_k=args.top_k)
+        print(f"\n{result['answer']}")
+        if result["sources"]:
+            print("\n参考片段: " + "，".join(cite(s["part"], s["start_ms"]) for s in result["sources"]))
+
+def run_search(args):
+    """搜索摘要和字幕并打印命中的时间点"""
+    from utils.search_index import get_search_index, index_archive, hit_link
+    from utils.timeline import format_timestamp
+    index = get_search_index()
+    if args.index_archive:
+        count = index_archive(args.index_archive, index)
+        print(f"已将 {count} 个视频加入搜索索引")
+    if not args.query:
+        return 0
+
+    hits = index.search(args.query, limit=args.limit)
+    if not hits:
+        print("没有找到匹配的内容")
+        return 1
+    for hit in hits:
+        if hit["kind"] == "subtitle":
+            where = format_timestamp(hit["start_ms"])[:8]
+            if hit["part"]:
+                where = f"P{hit['part']} {where}"
+        else:
+            where = "摘要"
+        print(f"[{hit['score']:.2f}] {hit['title']}  {where}")
+        print(f"    {hit['text']}")
+        print(f"    {hit_link(hit)}")
+    return 0
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if getattr(args, "no_llm_cache", False):
+        os.environ["BILI_LLM_CACHE"] = "0"
+
+    if getattr(args, "endpoints", None):
+        os.environ["BILI_LLM_ENDPOINTS"] = os.path.abspath(args.endpoints)
+
+    if getattr(args, "no_checkpoint", False):
+        os.environ["BILI_CHECKPOINT"] = "0"
+
+    if getattr(args, "no_dedup", False):
+        os.environ["BILI_DEDUP"] = "0"
+
+    if getattr(args, "metrics_dir", None):
+        from utils.metrics import enable_metrics
+        enable_metrics(args.metrics_dir)
+
+    if args.command == "batch":
+        import batch
+        return batch.main(args)
+
+    if args.command == "render":
+        import time
+        from utils.archive import build_archive, print_archive_stats
+        start = time.perf_counter()
+        stats = build_archive(args.output_dir, page_size=args.page_size, force=args.full)
+        print_archive_stats(stats, time.perf_counter() - start)
+        return 0
+
+    if args.command == "ingest":
+        from utils.ingest import ingest_directory, print_ingest_stats
+        stats = ingest_directory(args.directory, args.output, workers=args.workers, per_dir=args.per_dir)
+        print_ingest_stats(stats)
+        return 0 if stats["failed"] == 0 else 1
+
+    if args.command == "ask":
+        return run_ask(args)
+
+    if args.command == "search":
+        return run_search(args)
+
+    if args.command == "serve":
+        import server
+        return server.main(args)
+
+    run_interactive()
+    return 0
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -1,14 +1,88 @@
 from pocketflow import Node
-from utils.call_llm import call_llm, generate_summary
-from utils.download_subtitle import download_subtitle
-from utils.process_subtitle import process_subtitle_file
+from utils.call_llm import DEFAULT_MODEL, call_llm, llm_cache_url, summarize_subtitles, generate_course_summary
+from utils.download_subtitle import download_subtitle, extract_video_id
+from utils.process_subtitle import process_video_subtitles
 from utils.generate_html import generate_html
+from utils.metrics import metrics_enabled, run_instrumented
+from utils.checkpoint import stages_from
+from utils.search_index import search_index_enabled, get_search_index
+from utils.dedup import dedup_enabled, minhash_signature, get_duplicate_index
 import os
 import json
 
-class InputNode(Node):
+class InstrumentedNode(Node):
+    """记录各阶段耗时、CPU时间、输入输出字节数和LLM用量的节点基类，未启用指标时与Node相同"""
+    def _run(self, shared):
+        if not metrics_enabled():
+            return super()._run(shared)
+        return run_instrumented(self, shared)
+
+class CheckpointedNode(InstrumentedNode):
+    """
+    输出保存为检查点的节点基类
+
+    共享数据中有checkpoints（CheckpointStore）时，已有有效检查点的阶段直接载入输出并跳过，
+    成功完成的阶段保存检查点；rerun_from指定的阶段及之后的阶段总是重新运行。
+    子类通过stage指定写入共享数据的键，通过checkpoint_key返回输入键（None表示输入未知，不使用检查点）。
+    """
+    stage = None
+
+    def checkpoint_key(self, shared):
+        return ""
+
+    def checkpoint_valid(self, data):
+        return True
+
+    def _rerun(self, shared):
+        rerun_from = shared.get("rerun_from")
+        return bool(rerun_from) and self.stage in stages_from(rerun_from)
+
+    def _run(self, shared):
+        store = shared.get("checkpoints")
+        if store is None:
+            return super()._run(shared)
+
+        video_id = extract_video_id(shared["video_url"])
+        digests = shared.setdefault("checkpoint_digests", {})
+        key = self.checkpoint_key(shared)
+        if key is None:
+            return super()._run(shared)
+        if not self._rerun(shared):
+            record = store.load(video_id, self.stage, key)
+            if record is not None and self.checkpoint_valid(record["data"]):
+                print(f"使用已保存的检查点，跳过阶段: {self.stage}")
+                shared[self.stage] = record["data"]
+                digests[self.stage] = record["digest"]
+                return "default"
+
+        action = super()._run(shared)
+        if action == "default" and self.stage in shared:
+            try:
+                digests[self.stage] = store.save(video_id, self.stage, shared[self.stage], key)
+            except (OSError, TypeError, ValueError) as e:
+                # 检查点只是加速手段，保存失败不影响本次运行
+                print(f"检查点保存失败: {e}")
+                digests[self.stage] = None
+        return action
+
+class InputNode(InstrumentedNode):
     """接收用户输入的节点"""
-    def exec(self, _):
+    def prep(self, shared):
+        # 批量模式下输入已预先写入共享数据，无需交互
+        if shared.get("video_url"):
+            return {
+                "video_url": shared["video_url"],
+                "sessdata": shared.get("sessdata"),
+                "api_key": shared.get("api_key"),
+                "model_name": shared.get("model_name"),
+                "base_url": shared.get("base_url")
+            }
+        return None
+
+    def exec(self, preset):
+        if preset:
+            return preset
+
         # 获取视频URL和必选的SESSDATA
         video_url = input("请输入B站视频URL: ")
         sessdata = input("请输入B站SESSDATA (必选): ")
@@ -41,12 +115,20 @@ class InputNode(Node):
         shared["base_url"] = exec_res["base_url"]
         return "default"
 
-class SubtitleExtractNode(Node):
+class SubtitleExtractNode(CheckpointedNode):
     """使用yutto下载字幕的节点"""
+    stage = "subtitle_info"
+
+    def checkpoint_valid(self, subtitle_info):
+        # 字幕仓库淘汰了文件时需要重新下载
+        return all(os.path.exists(f) for f in subtitle_info.get("subtitle_files", []))
+
     def prep(self, shared):
         return {
             "video_url": shared["video_url"],
-            "sessdata": shared["sessdata"]
+            "sessdata": shared["sessdata"],
+            # 指定从该阶段重跑时忽略字幕仓库，重新下载
+            "force": self._rerun(shared)
         }
     
     def exec(self, input_data):
@@ -55,7 +137,8 @@ class SubtitleExtractNode(Node):
         try:
             subtitle_info = download_subtitle(
                 input_data["video_url"],
-                input_data["sessdata"]
+                input_data["sessdata"],
+                force=input_data.get("force", False)
             )
             print(f"字幕下载成功，共找到 {len(subtitle_info['subtitle_files'])} 个字幕文件")
             return subtitle_info
@@ -85,8 +168,13 @@ class SubtitleExtractNode(Node):
         shared["subtitle_info"] = exec_res
         return "default"
 
-class SubtitleProcessNode(Node):
+class SubtitleProcessNode(CheckpointedNode):
     """处理字幕内容的节点"""
+    stage = "subtitle_data"
+
+    def checkpoint_key(self, shared):
+        return shared.get("checkpoint_digests", {}).get("subtitle_info")
+
     def prep(self, shared):
         return shared["subtitle_info"]
     
@@ -94,9 +182,10 @@ class SubtitleProcessNode(Node):
         print("正在处理字幕内容...")
         
         try:
-            # 取第一个字幕文件进行处理
-            subtitle_file = subtitle_info["subtitle_files"][0]
-            subtitle_data = process_subtitle_file(subtitle_file)
+            # 按分P分组并选择字幕轨道，多P视频的各分P并行解析
+            subtitle_data = process_video_subtitles(subtitle_info["subtitle_files"])
+            if subtitle_data.get("parts"):
+                print(f"共 {len(subtitle_data['parts'])} 个分P")
             return subtitle_data
         except Exception as e:
             print(f"字幕处理失败: {str(e)}")
@@ -112,28 +201,122 @@ class SubtitleProcessNode(Node):
         shared["subtitle_data"] = exec_res
         return "default"
 
-class SummaryGenerationNode(Node):
+class DuplicateCheckNode(InstrumentedNode):
+    """检测字幕是否与已总结的视频几乎相同，相同时复用已有摘要，不再调用LLM"""
+    def prep(self, shared):
+        rerun_from = shared.get("rerun_from")
+        # 指定重新生成摘要时不复用
+        if not dedup_enabled() or (rerun_from and "summary" in stages_from(rerun_from)):
+            return None
+        subtitle_data = shared["subtitle_data"]
+        return {
+            "video_id": extract_video_id(shared["video_url"]),
+            "full_text": subtitle_data.get("full_text", ""),
+            "parts": len(subtitle_data.get("parts") or []),
+            "model_name": shared.get("model_name") or DEFAULT_MODEL
+        }
+
+    def exec(self, input_data):
+        if input_data is None:
+            return None
+        try:
+            signature = minhash_signature(input_data["full_text"])
+            if signature is None:
+                return None
+            match = get_duplicate_index().find(
+                signature,
+                model=input_data["model_name"],
+                parts=input_data["parts"],
+                exclude=input_data["video_id"]
+            )
+            return {"signature": signature, "match": match}
+        except Exception as e:
+            # 重复检测只是节省开销的手段，失败时照常生成摘要
+            print(f"重复检测失败: {str(e)}")
+            return None
+
+    def post(self, shared, prep_res, exec_res):
+        if exec_res is None:
+            return "default"
+        shared["subtitle_signature"] = exec_res["signature"]
+        match = exec_res["match"]
+        if match is None:
+            return "default"
+
+        shared["summary"] = match["summary"]
+        shared["duplicate_of"] = {
+            "video_id": match["video_id"],
+            "video_url": match["video_url"],
+            "similarity": match["similarity"]
+        }
+        print(f"字幕与已总结的视频 {match['video_url']} 相似度 {match['similarity']:.0%}，复用其摘要")
+        return "duplicate"
+
+def print_summary_event(event):
+    """流式生成摘要时，逐字段打印已完成的内容"""
+    if event[0] == "item":
+        _, field, index, value = event
+        if field == "关键点":
+            if index == 0:
+                print("关键点:")
+            print(f"  {index+1}. {value}")
+        return
+
+    _, field, value = event
+    if field == "详细摘要":
+        print(f"详细摘要: {str(value)[:100]}...")
+    elif field != "关键点":
+        print(f"{field}: {value}")
+
+class SummaryGenerationNode(CheckpointedNode):
     """生成摘要的节点"""
+    stage = "summary"
+
+    def checkpoint_key(self, shared):
+        # 换用其他模型、API地址或接口池时重新生成摘要
+        upstream = shared.get("checkpoint_digests", {}).get("subtitle_data")
+        if upstream is None:
+            return None
+        return "|".join([upstream, shared.get("model_name") or DEFAULT_MODEL, llm_cache_url(shared.get("base_url")) or ""])
+
     def prep(self, shared):
+        # 交互模式下流式打印摘要；也可通过on_summary_event传入自定义回调（如Web前端推送）
+        on_event = shared.get("on_summary_event")
+        if on_event is None and shared.get("stream_summary"):
+            on_event = print_summary_event
         return {
             "subtitle_data": shared["subtitle_data"],
             "video_url": shared["video_url"],
             "model_name": shared["model_name"],
             "base_url": shared["base_url"],
-            "api_key": shared["api_key"]
+            "api_key": shared["api_key"],
+            "on_event": on_event
         }
     
     def exec(self, input_data):
         print("正在生成视频摘要，这可能需要一些时间...")
         
         try:
-            summary = generate_summary(
-                input_data["subtitle_data"]["full_text"],
-                input_data["video_url"],
-                input_data["model_name"],
-                input_data["base_url"],
-                input_data["api_key"]
-            )
+            subtitle_data = input_data["subtitle_data"]
+            if subtitle_data.get("parts"):
+                # 多P视频并行总结各分P，再合并为合集摘要
+                summary = generate_course_summary(
+                    subtitle_data["parts"],
+                    input_data["video_url"],
+                    input_data["model_name"],
+                    input_data["base_url"],
+                    input_data["api_key"],
+                    on_event=input_data["on_event"]
+                )
+            else:
+                summary = summarize_subtitles(
+                    subtitle_data,
+                    input_data["video_url"],
+                    input_data["model_name"],
+                    input_data["base_url"],
+                    input_data["api_key"],
+                    on_event=input_data["on_event"]
+                )
             return summary
         except Exception as e:
             print(f"摘要生成失败: {str(e)}")
@@ -147,7 +330,11 @@ class SummaryGenerationNode(Node):
         
         # 存储摘要结果
         shared["summary"] = exec_res
-        
+
+        # 流式模式下各字段已经打印过
+        if prep_res["on_event"] is not None:
+            return "default"
+
         # 打印摘要预览
         print("\n===== 摘要预览 =====")
         print(f"标题: {exec_res['标题']}")
@@ -161,23 +348,27 @@ class SummaryGenerationNode(Node):
         
         return "default"
 
-class HTMLGenerationNode(Node):
+class HTMLGenerationNode(InstrumentedNode):
     """生成HTML页面的节点"""
     def prep(self, shared):
         return {
             "summary": shared["summary"],
             "video_url": shared["video_url"],
-            "subtitle_data": shared.get("subtitle_data")
+            "subtitle_data": shared.get("subtitle_data"),
+            "output_dir": shared.get("output_dir"),
+            "model_name": shared.get("model_name") or DEFAULT_MODEL
         }
-    
+
     def exec(self, input_data):
         print("正在生成HTML页面...")
-        
+
         try:
             html_path = generate_html(
                 input_data["summary"],
                 input_data["video_url"],
-                input_data.get("subtitle_data")
+                input_data.get("subtitle_data"),
+                output_dir=input_data.get("output_dir"),
+                model_name=input_data.get("model_name")
             )
             return html_path
         except Exception as e:
@@ -193,9 +384,36 @@ class HTMLGenerationNode(Node):
         # 存储HTML路径
         shared["html_path"] = exec_res
         print(f"\n✅ 摘要已生成! HTML文件路径: {exec_res}")
+
+        # 更新全文搜索索引，失败不影响已生成的摘要
+        if search_index_enabled():
+            try:
+                get_search_index().add_video(
+                    extract_video_id(prep_res["video_url"]),
+                    prep_res["video_url"],
+                    prep_res["summary"],
+                    prep_res.get("subtitle_data"),
+                    html_path=exec_res
+                )
+            except Exception as e:
+                print(f"更新搜索索引失败: {str(e)}")
+
+        # 记录字幕签名和摘要，之后几乎相同的字幕可以直接复用
+        if shared.get("subtitle_signature") and not shared.get("duplicate_of"):
+            try:
+                get_duplicate_index().add(
+                    extract_video_id(prep_res["video_url"]),
+                    prep_res["video_url"],
+                    shared["subtitle_signature"],
+                    prep_res["summary"],
+                    model=prep_res["model_name"],
+                    parts=len((prep_res.get("subtitle_data") or {}).get("parts") or [])
+                )
+            except Exception as e:
+                print(f"记录字幕签名失败: {str(e)}")
         return "default"
 
-class ErrorHandlingNode(Node):
+class ErrorHandlingNode(InstrumentedNode):
     """错误处理节点"""
     def prep(self, shared):
         return shared.get("error", "未知错误")
@@ -0,0 +1,263 @@
+import os
+import json
+import hashlib
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from batch import summarize_video
+from utils.call_llm import DEFAULT_MODEL
+from utils.download_subtitle import normalize_video_url, extract_video_id
+from utils.generate_html import STYLE_CSS, STYLE_PATH
+from utils.archive import build_archive
+from utils.rate_limit import limiter_stats
+from utils.llm_router import get_router
+
+# 请求体的最大字节数
+MAX_BODY_BYTES = 1 << 20
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 502: "Bad Gateway"}
+
+class HTTPError(Exception):
+    """返回给客户端的HTTP错误"""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class SummaryServer:
+    """
+    基于asyncio的HTTP服务，接收总结任务并在线程池中运行总结流程
+
+    同一视频ID和模型的并发请求会合并到同一个进行中的任务上，只下载一次字幕、调用一次LLM。
+
+    接口:
+        POST /summarize  请求体为JSON: {"url", "model", "base_url", "api_key", "sessdata", "format": "json"|"html"}，
+                         指定base_url时必须同时提供api_key
+        GET  /static/bilibili_summary.css  HTML页面引用的共享样式表
+        GET  /stats      返回请求数、实际执行的任务数、被合并的请求数、进行中的任务数、LLM限流统计和接口池各接口的统计
+        GET  /healthz    健康检查
+
+    参数:
+        host (str): 监听地址
+        port (int): 监听端口
+        sessdata (str): 默认的B站SESSDATA，请求中可覆盖
+        api_key (str): 默认的OpenAI API密钥，请求中可覆盖
+        output_dir (str): HTML输出目录
+        max_workers (int): 同时运行的总结流程数量上限
+    """
+
+    def __init__(self, host="127.0.0.1", port=8000, sessdata=None, api_key=None, output_dir=None, max_workers=4):
+        self.host = host
+        self.port = port
+        self.sessdata = sessdata
+        self.api_key = api_key
+        self.output_dir = output_dir
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self._in_flight = {}
+        self.stats = {"requests": 0, "jobs": 0, "coalesced": 0}
+        self._server = None
+
+    async def start(self):
+        """开始监听，端口为0时自动分配"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        """启动并持续运行服务"""
+        if self._server is None:
+            await self.start()
+        print(f"总结服务已启动: http://{self.host}:{self.port}")
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """停止服务并等待进行中的流程结束"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self.executor.shutdown(wait=True)
+
+    async def summarize(self, video_url, model_name=None, base_url=None, api_key=None, sessdata=None):
+        """
+        获取视频摘要，视频ID、模型、接口地址和凭据都相同的并发调用共享同一个任务
+
+        返回:
+            dict: summarize_video的结果
+        """
+        if base_url and not api_key:
+            raise ValueError("指定base_url时必须同时提供api_key")
+        video_url = normalize_video_url(video_url)
+        key = (extract_video_id(video_url) or video_url, model_name or DEFAULT_MODEL, base_url or None,
+               _credential_id(api_key), _credential_id(sessdata))
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["jobs"] += 1
+            config = {
+                "sessdata": sessdata or self.sessdata,
+                "api_key": api_key or self.api_key,
+                "model_name": model_name,
+                "base_url": base_url,
+                "output_dir": self.output_dir
+            }
+            loop = asyncio.get_running_loop()
+            task = loop.create_task(self._run_job(key, video_url, config))
+            self._in_flight[key] = task
+        # shield避免某个客户端断开时取消其他请求共享的任务
+        return await asyncio.shield(task)
+
+    async def _run_job(self, key, video_url, config):
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.executor, summarize_video, video_url, config)
+            if result["success"]:
+                # 在后台增量更新归档索引，不延迟本次请求的响应
+                self.executor.submit(self._update_archive)
+            return result
+        finally:
+            self._in_flight.pop(key, None)
+
+    def _update_archive(self):
+        try:
+            build_archive(self.output_dir or os.getcwd())
+        except Exception as e:
+            print(f"归档更新失败: {e}")
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            try:
+                method, path, body = await self._read_request(reader)
+                status, content_type, payload = await self._dispatch(method, path, body)
+            except HTTPError as e:
+                status, content_type = e.status, "application/json"
+                payload = json.dumps({"error": e.message}, ensure_ascii=False).encode("utf-8")
+            except Exception as e:
+                status, content_type = 500, "application/json"
+                payload = json.dumps({"error": str(e)}, ensure_ascii=False).encode("utf-8")
+            head = (
+                f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                "Connection: close\r\n\r\n"
+            )
+            writer.write(head.encode("latin-1") + payload)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """读取请求行、请求头和请求体"""
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise HTTPError(400, "无效的请求行")
+        method, path = parts[0].upper(), parts[1].split("?", 1)[0]
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", "0") or 0)
+        except ValueError:
+            raise HTTPError(400, "无效的Content-Length")
+        if length < 0:
+            raise HTTPError(400, "无效的Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "请求体过大")
+        body = await reader.readexactly(length) if length else b""
+        return method, path, body
+
+    async def _dispatch(self, method, path, body):
+        """按路径分发请求，返回(状态码, Content-Type, 响应体)"""
+        if path == "/healthz":
+            return 200, "application/json", b'{"status": "ok"}'
+        if path == "/" + STYLE_PATH:
+            return 200, "text/css; charset=utf-8", STYLE_CSS.encode("utf-8")
+        if path == "/stats":
+            router = get_router()
+            stats = dict(self.stats, in_flight=len(self._in_flight), llm=limiter_stats(),
+                         endpoints=router.stats() if router is not None else None)
+            return 200, "application/json", json.dumps(stats).encode("utf-8")
+        if path != "/summarize":
+            raise HTTPError(404, "未知的接口")
+        if method != "POST":
+            raise HTTPError(405, "只支持POST请求")
+
+        try:
+            params = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "请求体不是有效的JSON")
+        if not isinstance(params, dict) or not params.get("url"):
+            raise HTTPError(400, "缺少视频URL")
+        if not isinstance(params["url"], str):
+            raise HTTPError(400, "视频URL必须是字符串")
+        output_format = params.get("format", "json")
+        if output_format not in ("json", "html"):
+            raise HTTPError(400, "format只支持json或html")
+        try:
+            video_url = normalize_video_url(params["url"])
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        for name in ("model", "base_url", "api_key", "sessdata"):
+            if params.get(name) is not None and not isinstance(params[name], str):
+                raise HTTPError(400, f"{name}必须是字符串")
+        # 请求指定的接口地址不能使用服务端的API密钥，否则密钥会被发送到请求方控制的主机
+        if params.get("base_url") and not params.get("api_key"):
+            raise HTTPError(400, "指定base_url时必须同时提供api_key")
+
+        self.stats["requests"] += 1
+        result = await self.summarize(
+            video_url,
+            model_name=params.get("model"),
+            base_url=params.get("base_url"),
+            api_key=params.get("api_key"),
+            sessdata=params.get("sessdata")
+        )
+        if not result["success"]:
+            raise HTTPError(502, result["error"])
+
+        if output_format == "html":
+            loop = asyncio.get_running_loop()
+            html = await loop.run_in_executor(None, _read_file, result["html_path"])
+            return 200, "text/html; charset=utf-8", html
+        payload = {
+            "video_url": result["video_url"],
+            "video_id": extract_video_id(result["video_url"]),
+            "summary": result["summary"],
+            "html_path": result["html_path"]
+        }
+        return 200, "application/json", json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+def _credential_id(secret):
+    """凭据的摘要，用于区分任务而不在内存中的任务表里保存凭据本身"""
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()[:16] if secret else None
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def main(args):
+    """服务模式入口"""
+    server = SummaryServer(
+        host=args.host,
+        port=args.port,
+        sessdata=args.sessdata or os.environ.get("BILIBILI_SESSDATA"),
+        api_key=args.api_key,
+        output_dir=args.output_dir,
+        max_workers=args.workers
+    )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("\n总结服务已停止")
+    return 0
@@ -0,0 +1,69 @@
+import os
+import sys
+import json
+import http.client
+import pytest
+from utils.bilibili_api import BilibiliAPIError, BilibiliClient, fetch_subtitles, sign_wbi
+from utils.process_subtitle import bcc_to_cues
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from fake_bilibili_server import FakeBilibiliServer
+
+def test_sign_wbi_matches_reference_vector():
+    # 公开文档中的示例：固定的密钥、参数和时间戳
+    signed = sign_wbi({'foo': '114', 'bar': '514', 'zab': 1919810},
+                      '7cd084941338484aae1ad9425b84077c', '4932caff0ff746eab6f01bf08b70ac45', 1702204169)
+    assert signed['wts'] == '1702204169'
+    assert signed['w_rid'] == '8f6f2b5b3d485fe1886cec6a0be8c5d4'
+
+def test_fetch_multi_part_subtitles():
+    with FakeBilibiliServer(pages=2, languages=('zh-CN', 'ai-zh')) as server:
+        client = BilibiliClient(api_base=server.base_url)
+        subtitles = fetch_subtitles('BV1xx411c7mD', client=client)
+        assert list(subtitles) == ['P001 第1集_zh-CN.json', 'P001 第1集_ai-zh.json',
+                                   'P002 第2集_zh-CN.json', 'P002 第2集_ai-zh.json']
+        cues = list(bcc_to_cues(json.loads(subtitles['P001 第1集_zh-CN.json'])))
+        assert cues and cues[0].text
+
+        # 第二个视频复用WBI密钥，不再请求nav接口
+        fetch_subtitles('BV1yy411c7mD', client=client)
+        assert server.request_counts['nav'] == 1
+        assert server.request_counts['player'] == 4
+
+def test_av_id_is_sent_as_aid():
+    with FakeBilibiliServer() as server:
+        client = BilibiliClient(api_base=server.base_url)
+        info = client.get_video_info('av170001')
+        assert info['bvid'] == 'BV1fake170001'
+        assert list(fetch_subtitles('av170001', client=client)) == ['av170001_ai-zh.json']
+
+def test_unsigned_track_request_is_rejected():
+    with FakeBilibiliServer() as server:
+        client = BilibiliClient(api_base=server.base_url)
+        with pytest.raises(BilibiliAPIError):
+            client.get_json('/x/player/wbi/v2', {'bvid': 'BV1xx411c7mD', 'cid': 100001})
+        with pytest.raises(BilibiliAPIError):
+            client.get_json('/x/player/wbi/v2', {'bvid': 'BV1xx411c7mD', 'cid': 100001,
+                                                 'wts': 1702204169, 'w_rid': '0' * 32})
+
+def test_dropped_connection_is_retried_once():
+    with FakeBilibiliServer(drop_requests=1) as server:
+        client = BilibiliClient(api_base=server.base_url)
+        assert fetch_subtitles('BV1xx411c7mD', client=client)
+        assert server.request_counts['dropped'] == 1
+
+    with FakeBilibiliServer(drop_requests=2) as server:
+        client = BilibiliClient(api_base=server.base_url)
+        with pytest.raises((http.client.HTTPException, OSError)):
+            fetch_subtitles('BV1xx411c7mD', client=client)
+
+def test_video_without_subtitles():
+    with FakeBilibiliServer(languages=()) as server:
+        client = BilibiliClient(api_base=server.base_url)
+        with pytest.raises(BilibiliAPIError, match='没有可用的字幕'):
+            fetch_subtitles('BV1xx411c7mD', client=client)
+
+def test_empty_subtitle_url():
+    client = BilibiliClient(api_base='http://127.0.0.1:9')
+    with pytest.raises(BilibiliAPIError, match='字幕地址为空'):
+        client.fetch_subtitle('')
@@ -0,0 +1,71 @@
+import pytest
+from utils.cue_file import write_cue_file, CueFile
+from utils.timeline import format_timestamp
+
+def _segment(start_ms, end_ms, text):
+    return {
+        'start_time': format_timestamp(start_ms),
+        'end_time': format_timestamp(end_ms),
+        'start_ms': start_ms,
+        'end_ms': end_ms,
+        'text': text
+    }
+
+def _part(segments, title=None):
+    part = {
+        'subtitle_file': f'{title or "video"}.srt',
+        'format': 'srt',
+        'subtitles': segments,
+        'full_text': ' '.join(s['text'] for s in segments)
+    }
+    if title is not None:
+        part['title'] = title
+    return part
+
+def _multi_part():
+    parts = [
+        _part([_segment(0, 900, '第一集开头'), _segment(1000, 2000, '量子'), _segment(5000, 6000, '第一集结尾')], 'P01 第一集'),
+        _part([_segment(0, 800, 'second part'), _segment(1000, 2500, '纠缠'), _segment(3000, 4000, '结束')], 'P02 第二集')
+    ]
+    return {
+        'subtitle_file': parts[0]['subtitle_file'],
+        'format': 'srt',
+        'parts': parts,
+        'subtitles': [s for part in parts for s in part['subtitles']],
+        'full_text': ' '.join(part['full_text'] for part in parts)
+    }
+
+def test_single_part_round_trip(tmp_path):
+    data = _part([_segment(0, 1500, '你好 world'), _segment(1200, 3000, '重叠的字幕'), _segment(8000, 9000, '')])
+    path = str(tmp_path / 'single.bcue')
+    assert write_cue_file(path, data) == 3
+    with CueFile(path) as cues:
+        assert cues.to_subtitle_data() == data
+        assert cues.find(1300) == 1
+        assert cues.find(1100) == 0
+        assert cues.at(2000) == '重叠的字幕'
+        assert cues.range(1000, 8500) == [0, 1, 2]
+        assert cues.find(5000) is None
+
+def test_multi_part_round_trip(tmp_path):
+    data = _multi_part()
+    path = str(tmp_path / 'multi.bcue')
+    write_cue_file(path, data)
+    with CueFile(path) as cues:
+        assert cues.to_subtitle_data() == data
+
+def test_multi_part_lookups_stay_within_part(tmp_path):
+    path = str(tmp_path / 'multi.bcue')
+    write_cue_file(path, _multi_part())
+    with CueFile(path) as cues:
+        assert cues.find(500, part=1) == 0
+        assert cues.find(500, part=2) == 3
+        assert cues.find(5500, part=1) == 2
+        assert cues.find(5500, part=2) is None
+        assert cues.at(1500, part=2) == '纠缠'
+        assert cues.range(0, 2500, part=1) == [0, 1]
+        assert cues.range(0, 2500, part=2) == [3, 4]
+        with pytest.raises(ValueError):
+            cues.find(500)
+        with pytest.raises(ValueError):
+            cues.find(500, part=3)
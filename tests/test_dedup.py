@@ -0,0 +1,41 @@
+from utils.dedup import DuplicateIndex, minhash_signature, signature_similarity
+
+TEXT = '，'.join(f'第{i}句字幕讲的是缓存淘汰策略的第{i}个细节' for i in range(200))
+# 少量字幕不同的同一视频（如重新上传时修正了个别错字）
+NEAR_DUPLICATE = TEXT.replace('第7句', '第七句').replace('第150个', '第一百五十个')
+OTHER = '，'.join(f'这一段介绍的是数据库索引在第{i}种查询中的用法' for i in range(200))
+
+def test_signature_similarity():
+    a = minhash_signature(TEXT)
+    assert signature_similarity(a, minhash_signature(TEXT)) == 1.0
+    assert signature_similarity(a, minhash_signature(NEAR_DUPLICATE)) > 0.9
+    assert signature_similarity(a, minhash_signature(OTHER)) < 0.2
+    assert minhash_signature('，。 ') is None
+
+def test_find_near_duplicate(tmp_path):
+    index = DuplicateIndex(str(tmp_path / 'dedup.sqlite3'))
+    index.add('BV1', 'url1', minhash_signature(TEXT), {'summary': 'a'}, model='m1')
+
+    match = index.find(minhash_signature(NEAR_DUPLICATE), model='m1', exclude='BV2')
+    assert match['video_id'] == 'BV1'
+    assert match['summary'] == {'summary': 'a'}
+    assert index.find(minhash_signature(OTHER), model='m1') is None
+    assert index.stats() == {'videos': 1, 'hits': 1, 'misses': 1}
+
+def test_find_filters_model_parts_and_self(tmp_path):
+    index = DuplicateIndex(str(tmp_path / 'dedup.sqlite3'))
+    signature = minhash_signature(TEXT)
+    index.add('BV1', 'url1', signature, {'summary': 'a'}, model='m1', parts=2)
+
+    assert index.find(signature, model='m2', parts=2) is None
+    assert index.find(signature, model='m1', parts=0) is None
+    assert index.find(signature, model='m1', parts=2, exclude='BV1') is None
+    assert index.find(signature, parts=2)['video_id'] == 'BV1'
+
+def test_add_replaces_existing_video(tmp_path):
+    index = DuplicateIndex(str(tmp_path / 'dedup.sqlite3'))
+    index.add('BV1', 'url1', minhash_signature(TEXT), {'summary': 'a'})
+    index.add('BV1', 'url1', minhash_signature(OTHER), {'summary': 'b'})
+    assert index.stats()['videos'] == 1
+    assert index.find(minhash_signature(TEXT)) is None
+    assert index.find(minhash_signature(OTHER))['summary'] == {'summary': 'b'}
@@ -0,0 +1,51 @@
+import os
+from utils.ingest import find_videos, ingest_directory, iter_corpus
+from utils.subtitle_tracks import group_parts
+
+SRT = '1\n00:00:01,000 --> 00:00:02,000\n{}\n'
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(SRT.format(text))
+    return path
+
+def test_numbered_files_are_separate_videos(tmp_path):
+    files = [_write(str(tmp_path / f'lesson_{i}.srt'), f'第{i}课') for i in (1, 2, 3)]
+    assert [group['title'] for group in group_parts(files, language_tags_only=True)] == \
+        ['lesson_1', 'lesson_2', 'lesson_3']
+
+def test_language_tracks_are_one_video(tmp_path):
+    _write(str(tmp_path / '视频A_中文.srt'), '你好')
+    _write(str(tmp_path / '视频A_en-US.srt'), 'hello')
+    _write(str(tmp_path / 'lesson_1.srt'), '第1课')
+    _write(str(tmp_path / 'lesson_2.srt'), '第2课')
+    videos = find_videos(str(tmp_path))
+    assert [(video_id, len(files)) for video_id, files, _ in videos] == \
+        [('lesson_1', 1), ('lesson_2', 1), ('视频A', 1)]
+    # 字节数只统计实际解析的轨道
+    files = videos[2][1]
+    assert videos[2][2] == os.path.getsize(files[0])
+
+def test_per_dir_selects_one_track_per_part(tmp_path):
+    video_dir = str(tmp_path / 'BV1xx411c7mD')
+    _write(os.path.join(video_dir, 'P001 上集_zh-CN.srt'), '上')
+    _write(os.path.join(video_dir, 'P001 上集_ai-zh.srt'), '上')
+    _write(os.path.join(video_dir, 'P002 下集_zh-CN.srt'), '下')
+    videos = find_videos(str(tmp_path), per_dir=True)
+    assert [(video_id, [os.path.basename(f) for f in files]) for video_id, files, _ in videos] == \
+        [('BV1xx411c7mD', ['P001 上集_zh-CN.srt', 'P002 下集_zh-CN.srt'])]
+
+def test_ingest_directory_round_trip(tmp_path):
+    root = tmp_path / 'subs'
+    _write(str(root / 'lesson_1.srt'), '第1课')
+    _write(str(root / 'lesson_2.srt'), '第2课')
+    (root / 'broken.bcc').write_text('{not json', encoding='utf-8')
+    output = str(tmp_path / 'corpus.jsonl.gz')
+
+    stats = ingest_directory(str(root), output, workers=1)
+    assert (stats['videos'], stats['files'], stats['failed']) == (2, 3, 1)
+    records = list(iter_corpus(output))
+    assert [(r['video_id'], r['subtitle_data']['full_text']) for r in records] == \
+        [('lesson_1', '第1课'), ('lesson_2', '第2课')]
+    assert [video_id for video_id, _ in stats['errors']] == ['broken']
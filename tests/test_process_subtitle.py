@@ -0,0 +1,102 @@
+import json
+import pytest
+from utils.process_subtitle import (
+    iter_srt, parse_srt, parse_ass, parse_bcc, detect_subtitle_format, combine_subtitles,
+    process_subtitle_file, process_video_subtitles
+)
+
+SRT = (
+    '1\n00:00:01,000 --> 00:00:02,500\n第一句\n\n'
+    '2\n00:00:03,000 --> 00:00:04,000\n第二句\n第二行\n \n'
+    '00:00:10,5 --> 00:00:11,000\n没有序号\n\t\n'
+    '4\n00:00:12,000 --> 00:00:13,000\n\n'
+    '5\n00:00:20,000 --> 00:00:21,000\nlast line'
+)
+
+ASS = """[Script Info]
+Title: test
+
+[V4+ Styles]
+Format: Name, Fontname
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+Dialogue: 0,0:00:05.00,0:00:06.00,Default,,0,0,0,,第二条
+Dialogue: 0,0:00:01.50,0:00:02.00,Default,,0,0,0,,{\\b1}第一条{\\b0}\\N换行, 逗号
+Dialogue: 0,0:00:07.00,0:00:08.00,Default,,0,0,0,,{\\p1}m 0 0 l 100 0{\\p0}
+Comment: 0,0:00:09.00,0:00:10.00,Default,,0,0,0,,注释
+"""
+
+def _write(tmp_path, name, content, encoding='utf-8'):
+    path = tmp_path / name
+    path.write_text(content, encoding=encoding, newline='')
+    return str(path)
+
+def _cues(cues):
+    return [(c.index, c.start_ms, c.end_ms, c.text) for c in cues]
+
+EXPECTED_SRT = [
+    (1, 1000, 2500, '第一句'),
+    (2, 3000, 4000, '第二句 第二行'),
+    (3, 10500, 11000, '没有序号'),
+    (5, 20000, 21000, 'last line')
+]
+
+def test_parse_srt(tmp_path):
+    path = _write(tmp_path, 'a.srt', SRT)
+    assert _cues(parse_srt(path)) == EXPECTED_SRT
+
+def test_parse_srt_crlf_and_bom(tmp_path):
+    path = _write(tmp_path, 'a.srt', SRT.replace('\n', '\r\n'), encoding='utf-8-sig')
+    assert _cues(parse_srt(path)) == EXPECTED_SRT
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7, 64])
+def test_iter_srt_chunks_split_on_whitespace_blank_lines(tmp_path, chunk_size):
+    path = _write(tmp_path, 'a.srt', SRT)
+    assert _cues(iter_srt(path, chunk_size)) == EXPECTED_SRT
+
+def test_parse_ass(tmp_path):
+    path = _write(tmp_path, 'a.ass', ASS)
+    assert _cues(parse_ass(path)) == [(2, 1500, 2000, '第一条 换行, 逗号'), (1, 5000, 6000, '第二条')]
+
+def test_parse_bcc(tmp_path):
+    body = [{'from': 3.0, 'to': 4.25, 'content': '后'}, {'from': 0.5, 'to': 1.0, 'content': ' 前 '},
+            {'from': 5, 'to': 6, 'content': ''}, {'to': 7, 'content': '缺少开始时间'}]
+    path = _write(tmp_path, 'a.json', json.dumps({'body': body}, ensure_ascii=False))
+    assert _cues(parse_bcc(path)) == [(2, 500, 1000, '前'), (1, 3000, 4250, '后')]
+
+def test_detect_subtitle_format(tmp_path):
+    assert detect_subtitle_format(_write(tmp_path, 'a.txt', SRT)) == 'srt'
+    assert detect_subtitle_format(_write(tmp_path, 'b.txt', ASS)) == 'ass'
+    assert detect_subtitle_format(_write(tmp_path, 'c.txt', '{"body": []}')) == 'bcc'
+    # 内容无法判断时参考扩展名
+    assert detect_subtitle_format(_write(tmp_path, 'd.srt', '')) == 'srt'
+    with pytest.raises(ValueError):
+        detect_subtitle_format(_write(tmp_path, 'e.txt', 'hello'))
+
+def test_combine_subtitles_merges_small_gaps(tmp_path):
+    segments = combine_subtitles(parse_srt(_write(tmp_path, 'a.srt', SRT)), max_gap_seconds=2)
+    assert [(s['start_ms'], s['end_ms'], s['text']) for s in segments] == [
+        (1000, 4000, '第一句 第二句 第二行'),
+        (10500, 11000, '没有序号'),
+        (20000, 21000, 'last line')
+    ]
+    assert segments[0]['start_time'] == '00:00:01,000'
+
+def test_process_subtitle_file(tmp_path):
+    data = process_subtitle_file(_write(tmp_path, 'a.srt', SRT))
+    assert data['format'] == 'srt'
+    assert data['full_text'] == '第一句 第二句 第二行 没有序号 last line'
+
+def test_process_video_subtitles_groups_parts_and_selects_tracks(tmp_path):
+    _write(tmp_path, 'P002 下集_zh-CN.srt', SRT)
+    _write(tmp_path, 'P001 上集_ai-zh.srt', SRT)
+    _write(tmp_path, 'P001 上集_zh-CN.srt', '1\n00:00:01,000 --> 00:00:02,000\n人工字幕\n')
+    files = sorted(str(p) for p in tmp_path.iterdir())
+    data = process_video_subtitles(files, max_workers=1)
+    assert [part['title'] for part in data['parts']] == ['P001 上集', 'P002 下集']
+    # 语言相同时人工字幕优先于AI字幕
+    assert data['parts'][0]['subtitle_file'].endswith('P001 上集_zh-CN.srt')
+    assert data['parts'][0]['full_text'] == '人工字幕'
+    # 各分P分别合并后再拼接：上集1段，下集3段
+    assert len(data['subtitles']) == 1 + 3
@@ -0,0 +1,58 @@
+import os
+import time
+from utils.subtitle_store import STALE_SECONDS, SubtitleStore
+
+def test_put_data_and_get(tmp_path):
+    store = SubtitleStore(str(tmp_path))
+    saved = store.put_data('BV1xx411c7mD', 'https://www.bilibili.com/video/BV1xx411c7mD',
+                           {'a_zh-CN.json': b'{"body": []}', 'a_en-US.json': b'{}'})
+    assert [t['language'] for t in saved['tracks']] == ['zh-CN', 'en-US']
+
+    cached = store.get('BV1xx411c7mD')
+    assert cached['total_bytes'] == len(b'{"body": []}') + len(b'{}')
+    with open(cached['tracks'][0]['file'], 'rb') as f:
+        assert f.read() == b'{"body": []}'
+    assert store.get('BV1yy411c7mD') is None
+
+def test_put_moves_files(tmp_path):
+    store = SubtitleStore(str(tmp_path / 'store'))
+    src = tmp_path / 'a_ai-zh.srt'
+    src.write_bytes(b'1\n00:00:01,000 --> 00:00:02,000\n\xe4\xbd\xa0\xe5\xa5\xbd\n')
+    saved = store.put('av170001', 'https://www.bilibili.com/video/av170001', [str(src)])
+    assert not src.exists()
+    assert os.path.isfile(saved['tracks'][0]['file'])
+    assert saved['tracks'][0]['language'] == 'ai-zh'
+
+def test_truncated_file_is_a_miss(tmp_path):
+    store = SubtitleStore(str(tmp_path))
+    saved = store.put_data('BV1xx411c7mD', 'url', {'a.json': b'0123456789'})
+    with open(saved['tracks'][0]['file'], 'wb') as f:
+        f.write(b'01234')
+    assert store.get('BV1xx411c7mD') is None
+
+def test_evicts_least_recently_used(tmp_path):
+    store = SubtitleStore(str(tmp_path), max_bytes=25)
+    store.put_data('BV1', 'url', {'a.json': b'x' * 10})
+    store.put_data('BV2', 'url', {'a.json': b'x' * 10})
+    # 访问BV1后，BV2成为最久未访问的视频
+    assert store.get('BV1')
+    store.put_data('BV3', 'url', {'a.json': b'x' * 10})
+    assert store.get('BV1') and store.get('BV3')
+    assert store.get('BV2') is None
+
+def test_in_progress_writes_survive_eviction(tmp_path):
+    store = SubtitleStore(str(tmp_path), max_bytes=1)
+    staging = tmp_path / '.BV9.1.1.tmp'
+    staging.mkdir()
+    fresh = tmp_path / 'BV8'
+    fresh.mkdir()
+    stale = tmp_path / '.BV7.1.1.tmp'
+    stale.mkdir()
+    old = time.time() - STALE_SECONDS - 10
+    os.utime(stale, (old, old))
+
+    store.put_data('BV1', 'url', {'a.json': b'x' * 10})
+    # 新写入的视频超出上限也会保留
+    assert store.get('BV1')
+    assert staging.is_dir() and fresh.is_dir()
+    assert not stale.exists()
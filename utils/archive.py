@@ -0,0 +1,282 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from utils.generate_html import (
+    PAGE_TEMPLATE, PART_TEMPLATE, STYLE_PATH, DATA_DIR,
+    CompiledTemplate, render_html, write_style, _write_file, _text
+)
+
+# 归档清单，记录每个视频的摘要哈希、索引信息和各索引页的哈希
+MANIFEST_NAME = "archive.json"
+
+DEFAULT_PAGE_SIZE = 50
+
+# 索引中核心内容的最大字数
+CORE_PREVIEW_CHARS = 120
+
+# 页面渲染逻辑变化（而非模板文本变化）时递增，使所有页面重新渲染
+ARCHIVE_VERSION = 1
+
+INDEX_TEMPLATE = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>摘要归档 - 哔哩哔哩视频总结器</title>
+    <link rel="stylesheet" href="{{css_href}}">
+</head>
+<body>
+    <div class="container">
+        <header>
+            <div class="logo">哔哩哔哩视频总结器</div>
+            <h1>摘要归档</h1>
+            <div class="video-info">{{page_info}}</div>
+        </header>
+
+        <main>
+            {{items}}
+        </main>
+
+        <nav class="pagination">
+            <span>{{newer}}</span>
+            <span>{{older}}</span>
+        </nav>
+    </div>
+</body>
+</html>
+"""
+
+INDEX_ITEM_TEMPLATE = """
+            <article class="card">
+                <h2 class="archive-title"><a href="{{href}}">{{title}}</a></h2>
+                <div class="archive-meta">{{date}} · {{model}}</div>
+                <div class="core-content">{{core}}</div>
+            </article>
+"""
+
+_index = CompiledTemplate(INDEX_TEMPLATE)
+_index_item = CompiledTemplate(INDEX_ITEM_TEMPLATE)
+
+# 同一进程内的构建串行执行（服务模式下多个任务可能同时完成）
+_build_lock = threading.Lock()
+
+def template_fingerprint():
+    """摘要页面模板的哈希，模板变化时所有页面都需要重新渲染"""
+    text = f"{ARCHIVE_VERSION}\0{PAGE_TEMPLATE}\0{PART_TEMPLATE}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def page_filename(video_id):
+    """视频摘要页面的文件名，与generate_html生成的文件名一致"""
+    return f"bilibili_summary_{video_id}.html"
+
+def index_filename(page, page_count):
+    """
+    索引页的文件名
+
+    最新的一页固定为index.html，较早的页按从旧到新编号为index-1.html、index-2.html……
+    新增视频只会进入最新一页，已写满的旧页内容不再变化。
+    """
+    return "index.html" if page == page_count else f"index-{page}.html"
+
+def _record_hash(record):
+    canonical = json.dumps(record, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def _preview(text):
+    text = " ".join(str(text or "").split())
+    if len(text) > CORE_PREVIEW_CHARS:
+        return text[:CORE_PREVIEW_CHARS] + "…"
+    return text
+
+def _load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+def _save_manifest(output_dir, manifest):
+    """先写临时文件再替换，中途失败不会留下损坏的清单"""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    _write_file(tmp_path, json.dumps(manifest, ensure_ascii=False, separators=(",", ":")))
+    os.replace(tmp_path, path)
+
+def _render_index_page(chunk, page, page_count, total):
+    items = "".join(
+        _index_item.render({
+            "href": _text(page_filename(video_id)),
+            "title": _text(entry["title"], "视频摘要"),
+            "date": _text(entry["date"][:10]),
+            "model": _text(entry["model"], "未知模型"),
+            "core": _text(entry["core"], "暂无内容")
+        })
+        for video_id, entry in reversed(chunk)
+    )
+    if not items:
+        items = '<section class="card"><div class="core-content">暂无摘要</div></section>'
+    # 只有最新一页显示总数，旧页的内容在新增视频时保持不变
+    if page == page_count:
+        page_info = f"共 {total} 个视频 · 第 {page} 页"
+    else:
+        page_info = f"第 {page} 页"
+    newer = ""
+    if page < page_count:
+        newer = f'<a href="{index_filename(page + 1, page_count)}">← 较新</a>'
+    older = ""
+    if page > 1:
+        older = f'<a href="{index_filename(page - 1, page_count)}">较早 →</a>'
+    return _index.render({
+        "css_href": _text(STYLE_PATH),
+        "page_info": page_info,
+        "items": items,
+        "newer": newer,
+        "older": older
+    })
+
+def build_archive(output_dir, page_size=DEFAULT_PAGE_SIZE, force=False):
+    """
+    增量构建静态归档：重新渲染摘要或模板有变化的页面，并更新分页索引
+
+    摘要数据来自输出目录的data/，归档清单archive.json记录每个数据文件的修改时间、大小和内容哈希。
+    数据文件未变化时不会读取，内容哈希未变化时不会重写页面，索引页只在内容变化时写入，
+    因此在大量视频的归档中新增一个视频只会写入该视频的页面、最新的索引页和清单。
+
+    参数:
+        output_dir (str): 输出目录
+        page_size (int): 每个索引页最多包含的视频数量
+        force (bool): 是否忽略清单重新渲染全部页面
+
+    返回:
+        dict: 构建统计，包含videos、rendered、removed、index_pages、indexes_written
+    """
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    page_size = max(1, int(page_size))
+    with _build_lock:
+        return _build_archive(output_dir, page_size, force)
+
+def _build_archive(output_dir, page_size, force):
+    manifest = _load_manifest(output_dir)
+    template_hash = template_fingerprint()
+    rerender_all = force or manifest.get("template") != template_hash
+    old_entries = manifest.get("entries") or {}
+    existing = set(os.listdir(output_dir))
+    stats = {"videos": 0, "rendered": 0, "removed": 0, "index_pages": 0, "indexes_written": 0}
+
+    write_style(output_dir)
+
+    entries = {}
+    added = []
+    data_dir = os.path.join(output_dir, DATA_DIR)
+    scanned = []
+    if os.path.isdir(data_dir):
+        with os.scandir(data_dir) as it:
+            scanned = [item for item in it if item.name.endswith(".json") and item.is_file()]
+
+    for item in scanned:
+        video_id = item.name[:-len(".json")]
+        st = item.stat()
+        stamp = [st.st_mtime_ns, st.st_size]
+        entry = old_entries.get(video_id)
+        page_present = page_filename(video_id) in existing
+
+        # 数据文件未变化：直接沿用清单中的记录，不读取文件
+        if entry and entry.get("stamp") == stamp and page_present and not rerender_all:
+            entries[video_id] = entry
+            continue
+
+        with open(item.path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+        digest = _record_hash(record)
+        # 文件被重写但内容相同（例如命中LLM缓存后重新生成）
+        if entry and entry.get("hash") == digest and page_present and not rerender_all:
+            entries[video_id] = dict(entry, stamp=stamp)
+            continue
+
+        summary = record.get("summary") or {}
+        # 旧版本的数据没有记录生成时间，使用数据文件的修改时间
+        generated_at = record.get("generated_at") or datetime.fromtimestamp(st.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
+        _write_file(
+            os.path.join(output_dir, page_filename(video_id)),
+            render_html(summary, record["video_url"], STYLE_PATH, generated_at)
+        )
+        stats["rendered"] += 1
+
+        new_entry = {
+            "stamp": stamp,
+            "hash": digest,
+            "title": summary.get("标题") or "",
+            "core": _preview(summary.get("核心内容")),
+            "date": generated_at,
+            "model": record.get("model") or "",
+            "seq": entry.get("seq") if entry else None
+        }
+        if new_entry["seq"] is None:
+            added.append((video_id, new_entry))
+        else:
+            entries[video_id] = new_entry
+
+    # 新视频按生成时间追加到归档末尾，已有视频的位置保持不变
+    next_seq = manifest.get("next_seq", 0)
+    for video_id, entry in sorted(added, key=lambda item: (item[1]["date"], item[0])):
+        entry["seq"] = next_seq
+        next_seq += 1
+        entries[video_id] = entry
+
+    # 数据文件已删除的视频同时删除页面
+    for video_id in old_entries:
+        if video_id not in entries:
+            try:
+                os.remove(os.path.join(output_dir, page_filename(video_id)))
+            except OSError:
+                pass
+            stats["removed"] += 1
+
+    # 视频按加入归档的序号固定分页，删除视频只影响所在的一页
+    page_count = max(1, -(-next_seq // page_size))
+    chunks = [[] for _ in range(page_count)]
+    for video_id, entry in sorted(entries.items(), key=lambda item: item[1]["seq"]):
+        chunks[entry["seq"] // page_size].append((video_id, entry))
+    old_indexes = manifest.get("indexes") or {}
+    indexes = {}
+    for page, chunk in enumerate(chunks, 1):
+        filename = index_filename(page, page_count)
+        content = _render_index_page(chunk, page, page_count, len(entries))
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        indexes[filename] = digest
+        if old_indexes.get(filename) == digest and filename in existing and not force:
+            continue
+        _write_file(os.path.join(output_dir, filename), content)
+        stats["indexes_written"] += 1
+    for filename in old_indexes:
+        if filename not in indexes:
+            try:
+                os.remove(os.path.join(output_dir, filename))
+            except OSError:
+                pass
+
+    new_manifest = {
+        "template": template_hash,
+        "page_size": page_size,
+        "next_seq": next_seq,
+        "entries": entries,
+        "indexes": indexes
+    }
+    if new_manifest != manifest:
+        _save_manifest(output_dir, new_manifest)
+
+    stats["videos"] = len(entries)
+    stats["index_pages"] = page_count
+    return stats
+
+def print_archive_stats(stats, elapsed=None):
+    """打印归档构建统计"""
+    line = (f"归档共 {stats['videos']} 个视频：重新渲染 {stats['rendered']} 个页面，"
+            f"删除 {stats['removed']} 个，更新 {stats['indexes_written']}/{stats['index_pages']} 个索引页")
+    if elapsed is not None:
+        line += f"，耗时 {elapsed:.2f}s"
+    print(line)
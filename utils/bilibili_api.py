@@ -0,0 +1,281 @@
+import os
+import re
+import gzip
+import json
+import time
+import hashlib
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlencode, quote
+
+# B站接口地址，可通过环境变量BILI_API_BASE指向本地的替代服务（测试用）
+DEFAULT_API_BASE = "https://api.bilibili.com"
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+
+# WBI签名使用的混淆表，由img_key和sub_key重排得到mixin_key
+_MIXIN_KEY_ENC_TAB = [
+    46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49,
+    33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13, 37, 48, 7, 16, 24, 55, 40,
+    61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11,
+    36, 20, 34, 44, 52
+]
+
+# WBI密钥每天轮换，缓存一小时
+WBI_KEY_TTL = 3600
+
+class BilibiliAPIError(Exception):
+    """B站接口返回错误或没有可用字幕"""
+
+def get_api_base(api_base=None):
+    """返回接口地址，未指定时读取环境变量BILI_API_BASE"""
+    return (api_base or os.environ.get("BILI_API_BASE") or DEFAULT_API_BASE).rstrip("/")
+
+def _mixin_key(img_key, sub_key):
+    raw = img_key + sub_key
+    return "".join(raw[i] for i in _MIXIN_KEY_ENC_TAB)[:32]
+
+def sign_wbi(params, img_key, sub_key, timestamp=None):
+    """
+    为请求参数添加WBI签名（wts和w_rid）
+
+    参数:
+        params (dict): 请求参数
+        img_key (str): nav接口返回的img_key
+        sub_key (str): nav接口返回的sub_key
+        timestamp (int): 签名时间戳，默认当前时间
+
+    返回:
+        dict: 添加了签名的新参数
+    """
+    signed = dict(params, wts=int(timestamp if timestamp is not None else time.time()))
+    # 参数按键排序，值中过滤掉!'()*字符
+    signed = {k: re.sub(r"[!'()*]", "", str(v)) for k, v in sorted(signed.items())}
+    query = urlencode(signed, quote_via=quote)
+    signed["w_rid"] = hashlib.md5((query + _mixin_key(img_key, sub_key)).encode("utf-8")).hexdigest()
+    return signed
+
+class BilibiliClient:
+    """
+    进程内的B站接口客户端
+
+    每个线程为每个主机保持一个长连接，多次请求复用TCP/TLS连接；
+    并行获取分P使用客户端自己的长期线程池，线程和其中的连接在多个视频之间复用。
+    请求自动携带SESSDATA cookie，回复在内存中解析，不经过临时文件。
+
+    参数:
+        sessdata (str): B站的SESSDATA cookie
+        api_base (str): 接口地址，默认读取环境变量BILI_API_BASE，否则为https://api.bilibili.com
+        timeout (float): 单次请求的超时秒数
+        max_workers (int): 同时获取的分P数量上限
+    """
+
+    def __init__(self, sessdata=None, api_base=None, timeout=15, max_workers=8):
+        self.sessdata = sessdata
+        self.api_base = get_api_base(api_base)
+        self.timeout = timeout
+        self.max_workers = max(1, max_workers)
+        self._local = threading.local()
+        self._wbi_keys = None
+        self._wbi_lock = threading.Lock()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self):
+        """并行获取分P的线程池，首次使用时创建"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bilibili-api")
+            return self._executor
+
+    def _connection(self, scheme, netloc):
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        conn = connections.get((scheme, netloc))
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            conn = connections[(scheme, netloc)] = conn_class(netloc, timeout=self.timeout)
+        return conn
+
+    def _drop_connection(self, scheme, netloc):
+        conn = self._local.connections.pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+
+    def request(self, url, params=None):
+        """
+        发送GET请求并返回回复内容
+
+        参数:
+            url (str): 完整URL，或以//开头的协议相对URL
+            params (dict): 查询参数
+
+        返回:
+            bytes: 回复内容（已解压）
+        """
+        if url.startswith("//"):
+            url = f"{urlsplit(self.api_base).scheme}:{url}"
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        query = "&".join(q for q in (parts.query, urlencode(params or {})) if q)
+        if query:
+            path = f"{path}?{query}"
+
+        headers = {
+            "User-Agent": USER_AGENT,
+            "Referer": "https://www.bilibili.com/",
+            "Accept-Encoding": "gzip"
+        }
+        if self.sessdata:
+            headers["Cookie"] = f"SESSDATA={self.sessdata}"
+
+        # 复用的长连接可能已被服务端关闭，失败时重建连接重试一次
+        for attempt in range(2):
+            conn = self._connection(parts.scheme, parts.netloc)
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                self._drop_connection(parts.scheme, parts.netloc)
+                if attempt:
+                    raise
+                continue
+            if response.getheader("Connection", "").lower() == "close":
+                self._drop_connection(parts.scheme, parts.netloc)
+            if response.status != 200:
+                raise BilibiliAPIError(f"请求失败: HTTP {response.status} {url}")
+            if response.getheader("Content-Encoding", "").lower() == "gzip":
+                data = gzip.decompress(data)
+            return data
+
+    def get_json(self, path, params=None):
+        """请求B站接口，返回data字段，code不为0时抛出BilibiliAPIError"""
+        url = path if path.startswith(("http://", "https://", "//")) else self.api_base + path
+        payload = json.loads(self.request(url, params))
+        if payload.get("code", 0) != 0:
+            raise BilibiliAPIError(f"接口返回错误({payload.get('code')}): {payload.get('message', '')}")
+        return payload.get("data") or {}
+
+    def _get_wbi_keys(self):
+        with self._wbi_lock:
+            if self._wbi_keys is None or time.time() - self._wbi_keys[2] > WBI_KEY_TTL:
+                # 未登录时nav接口也会返回wbi_img，只是code为-101
+                payload = json.loads(self.request(self.api_base + "/x/web-interface/nav"))
+                wbi_img = (payload.get("data") or {}).get("wbi_img") or {}
+                img_key = wbi_img.get("img_url", "").rsplit("/", 1)[-1].split(".")[0]
+                sub_key = wbi_img.get("sub_url", "").rsplit("/", 1)[-1].split(".")[0]
+                if not img_key or not sub_key:
+                    raise BilibiliAPIError("无法获取WBI签名密钥")
+                self._wbi_keys = (img_key, sub_key, time.time())
+            return self._wbi_keys[:2]
+
+    def get_video_info(self, video_id):
+        """
+        查询视频信息
+
+        参数:
+            video_id (str): BV号或av号（av170001，也可以只有数字）
+
+        返回:
+            dict: 包含title、bvid、aid和pages（每个分P的cid、page、part）
+        """
+        if video_id.startswith("BV"):
+            params = {"bvid": video_id}
+        else:
+            params = {"aid": video_id[2:] if video_id.lower().startswith("av") else video_id}
+        data = self.get_json("/x/web-interface/view", params)
+        pages = data.get("pages") or [{"cid": data.get("cid"), "page": 1, "part": data.get("title", "")}]
+        return {
+            "title": data.get("title", ""),
+            "bvid": data.get("bvid", video_id),
+            "aid": data.get("aid"),
+            "pages": pages
+        }
+
+    def list_subtitles(self, bvid, cid):
+        """
+        列出某个分P的字幕轨道
+
+        返回:
+            list: 字幕轨道列表，每项包含lan、lan_doc和subtitle_url
+        """
+        img_key, sub_key = self._get_wbi_keys()
+        params = sign_wbi({"bvid": bvid, "cid": cid}, img_key, sub_key)
+        data = self.get_json("/x/player/wbi/v2", params)
+        return (data.get("subtitle") or {}).get("subtitles") or []
+
+    def fetch_subtitle(self, subtitle_url):
+        """下载字幕JSON（BCC格式），返回原始内容"""
+        if not subtitle_url:
+            raise BilibiliAPIError("字幕地址为空，可能需要有效的SESSDATA")
+        return self.request(subtitle_url)
+
+# 分P标题中不能出现在文件名里的字符；下划线用于分隔语言，同样替换掉
+_UNSAFE_NAME_RE = re.compile(r'[\\/:*?"<>|_\s]+')
+
+def part_file_prefix(page, part_title):
+    """多P视频中某个分P的字幕文件名前缀，例如P001 标题"""
+    title = _UNSAFE_NAME_RE.sub(" ", part_title or "").strip()
+    return f"P{int(page):03d} {title}".strip()
+
+def _fetch_page_subtitles(client, bvid, page, prefix):
+    subtitles = {}
+    for track in client.list_subtitles(bvid, page["cid"]):
+        name = f"{prefix}_{track.get('lan') or len(subtitles)}.json"
+        subtitles[name] = client.fetch_subtitle(track.get("subtitle_url"))
+    return subtitles
+
+def fetch_subtitles(video_id, sessdata=None, api_base=None, client=None):
+    """
+    通过B站接口获取视频所有分P的全部字幕轨道，各分P并行获取
+
+    参数:
+        video_id (str): BV号或av号
+        sessdata (str, optional): B站的SESSDATA cookie
+        api_base (str, optional): 接口地址
+        client (BilibiliClient, optional): 复用的客户端，分P在它的线程池中并行获取
+
+    返回:
+        dict: 文件名到字幕JSON内容（bytes）的映射，按分P顺序排列。单P视频的文件名形如
+        "<视频ID>_<语言>.json"，多P视频形如"P001 分P标题_<语言>.json"
+    """
+    client = client or get_bilibili_client(sessdata, api_base)
+    info = client.get_video_info(video_id)
+    pages = info["pages"]
+    if len(pages) == 1:
+        prefixes = [video_id]
+    else:
+        prefixes = [part_file_prefix(page.get("page", i + 1), page.get("part")) for i, page in enumerate(pages)]
+
+    if len(pages) == 1:
+        # 单P视频直接在当前线程获取，不必切换线程
+        results = [_fetch_page_subtitles(client, info["bvid"], pages[0], prefixes[0])]
+    else:
+        results = list(client.executor.map(
+            lambda item: _fetch_page_subtitles(client, info["bvid"], item[0], item[1]),
+            zip(pages, prefixes)
+        ))
+
+    subtitles = {}
+    for page_subtitles in results:
+        subtitles.update(page_subtitles)
+    if not subtitles:
+        raise BilibiliAPIError("该视频没有可用的字幕")
+    return subtitles
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_bilibili_client(sessdata=None, api_base=None):
+    """按(SESSDATA, 接口地址)获取进程内共享的客户端，复用连接和WBI密钥"""
+    key = (sessdata, get_api_base(api_base))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = BilibiliClient(sessdata, key[1])
+        return client
@@ -1,55 +1,271 @@
-import os
+import re
 import json
-import openai
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from utils.llm_cache import get_llm_cache, cache_enabled
+from utils.llm_client import get_client
+from utils.metrics import record_llm_usage, record_llm_throttle
+from utils.rate_limit import get_limiter
+from utils.llm_router import get_router
+from utils.token_budget import (
+    estimate_tokens, get_context_window, prompt_budget, pack_segments, truncate_to_tokens,
+    OUTPUT_RESERVE_TOKENS
+)
+from utils.stream_json import JSONObjectStreamParser
 
-def call_llm(prompt, model_name=None, base_url=None, api_key=None):
+DEFAULT_MODEL = "gpt-3.5-turbo"
+DEFAULT_TEMPERATURE = 0.7
+
+# 经接口池路由的回复在缓存中使用的地址前缀，后接接口池的标识
+ROUTER_CACHE_URL = "router"
+
+class LLMCallError(Exception):
+    """LLM调用失败（已按限流策略重试），原始异常保存在__cause__中"""
+
+def _route(base_url):
+    """返回(路由器, 缓存地址)：未指定base_url且配置了接口池时经接口池路由"""
+    router = get_router() if base_url is None else None
+    if router is None:
+        return None, base_url
+    # 缓存地址包含接口池的标识，换用其他接口或模型后不会复用旧接口池的回复
+    return router, f"{ROUTER_CACHE_URL}:{router.identity}"
+
+def llm_cache_url(base_url=None):
+    """回复缓存和摘要检查点中区分接口的地址"""
+    return _route(base_url)[1]
+
+def call_llm(prompt, model_name=None, base_url=None, api_key=None, temperature=DEFAULT_TEMPERATURE,
+             use_cache=True):
     """
     调用大语言模型进行文本生成
     
     Args:
         prompt: 输入提示文本
         model_name: 模型名称，如果为None则使用默认模型
-        base_url: API基础URL，如果为None则使用默认URL
+        base_url: API基础URL，如果为None则使用默认URL；为None且设置了BILI_LLM_ENDPOINTS时由接口池路由
         api_key: OpenAI API密钥，如果为None则从环境变量获取
+        temperature: 采样温度
+        use_cache: 是否使用本地LLM缓存，设置环境变量BILI_LLM_CACHE=0可全局绕过
     
     Returns:
         返回模型生成的回复内容
     """
+    # 设置模型名称（如果未提供则使用默认值）
+    model = model_name or DEFAULT_MODEL
+    # 经接口池路由的回复单独缓存，不与单一接口的回复混用
+    router, cache_url = _route(base_url)
+
+    # 相同的模型、地址、温度和提示直接返回缓存的回复
+    cache = get_llm_cache() if use_cache and cache_enabled() else None
+    if cache is not None:
+        cached = cache.get(model, cache_url, temperature, prompt)
+        if cached is not None:
+            return cached
+
+    messages = [{"role": "user", "content": prompt}]
     try:
-        # 设置OpenAI客户端参数
-        client_kwargs = {}
-        
-        # 设置API密钥
-        if api_key:
-            client_kwargs["api_key"] = api_key
+        if router is not None:
+            # 发往延迟最低的接口，慢请求向次优接口对冲
+            response, _ = router.complete(messages, temperature, model_name)
         else:
-            api_key_env = os.environ.get("OPENAI_API_KEY")
-            if not api_key_env:
-                raise ValueError("未设置OPENAI_API_KEY环境变量或未提供api_key参数")
-            client_kwargs["api_key"] = api_key_env
-        
-        # 设置base_url（如果提供）
-        if base_url:
-            client_kwargs["base_url"] = base_url
-            
-        # 创建客户端
-        client = openai.OpenAI(**client_kwargs)
-        
-        # 设置模型名称（如果未提供则使用默认值）
-        model = model_name or "gpt-3.5-turbo"
-        
-        # 发送请求
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-        )
+            # 复用按(api_key, base_url)共享的客户端及其连接池
+            client = get_client(api_key, base_url)
+
+            # 发送请求，按(base_url, model)限流，可重试的错误自动退避重试
+            response = get_limiter(base_url, model).call(lambda: client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+            ))
         
-        return response.choices[0].message.content
+        content = response.choices[0].message.content
+    except Exception as e:
+        raise LLMCallError(f"调用LLM失败: {str(e)}") from e
+
+    # 指标未启用时为空操作
+    record_llm_usage(getattr(response, "usage", None))
+
+    if cache is not None and content:
+        cache.set(model, cache_url, temperature, prompt, content)
+    return content
+
+def call_llm_stream(prompt, model_name=None, base_url=None, api_key=None, temperature=DEFAULT_TEMPERATURE,
+                    use_cache=True):
+    """
+    以流式方式调用大语言模型，逐段返回生成的文本
+
+    Args:
+        prompt: 输入提示文本
+        model_name: 模型名称，如果为None则使用默认模型
+        base_url: API基础URL，如果为None则使用默认URL
+        api_key: OpenAI API密钥，如果为None则从环境变量获取
+        temperature: 采样温度
+        use_cache: 是否使用本地LLM缓存，命中时一次性返回缓存的完整回复
+
+    Returns:
+        生成器，逐段产出回复文本
+    """
+    model = model_name or DEFAULT_MODEL
+    router, cache_url = _route(base_url)
+
+    cache = get_llm_cache() if use_cache and cache_enabled() else None
+    if cache is not None:
+        cached = cache.get(model, cache_url, temperature, prompt)
+        if cached is not None:
+            yield cached
+            return
+
+    parts = []
+    usage = None
+    attempt = 0
+    try:
+        if router is not None:
+            # 流式输出无法对冲（两路输出不能合并），只发往当前延迟最低的接口
+            endpoint = router.ranked(model_name)[0]
+            base_url, model, api_key = endpoint.base_url, endpoint.model, endpoint.api_key
+        limiter = get_limiter(base_url, model)
+        client = get_client(api_key, base_url)
+        while True:
+            waited = limiter.acquire()
+            try:
+                stream = client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=temperature,
+                    stream=True,
+                )
+                for chunk in stream:
+                    # 部分兼容服务会在最后一个分块中返回用量
+                    usage = getattr(chunk, "usage", None) or usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+            except Exception as e:
+                # 已经输出了部分内容时无法透明重试，只记录失败
+                delay = limiter.failure(e, limiter.max_retries if parts else attempt)
+                record_llm_throttle(waited + (delay or 0), 1 if delay is not None else 0)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # 调用方中途关闭生成器（GeneratorExit）或被中断：释放可能持有的熔断探测名额，
+                # 否则熔断器会一直停在探测中，之后的请求全部被拒绝
+                limiter.abandon()
+                raise
+            record_llm_throttle(waited, 0)
+            limiter.success()
+            break
     except Exception as e:
-        raise Exception(f"调用LLM失败: {str(e)}")
+        raise LLMCallError(f"调用LLM失败: {str(e)}") from e
+
+    record_llm_usage(usage)
+
+    # 只缓存完整读取的回复
+    if cache is not None and parts:
+        cache.set(model_name or DEFAULT_MODEL, cache_url, temperature, prompt, "".join(parts))
+
+SUMMARY_FIELDS = ["标题", "核心内容", "关键点", "详细摘要", "结论"]
+
+SUMMARY_FORMAT = """{
+  "标题": "一个简短但信息丰富的标题",
+  "核心内容": "视频的核心要点（一句话）",
+  "关键点": ["关键点1", "关键点2", "关键点3", ...],
+  "详细摘要": "一个由多个段落组成的详细摘要，捕捉视频的主要内容，不超过800字",
+  "结论": "视频总结或结论"
+}"""
+
+def parse_summary_response(response, required_fields=SUMMARY_FIELDS):
+    """
+    将LLM回复解析为摘要JSON
+
+    Args:
+        response: LLM返回的文本
+        required_fields: 摘要必须包含的字段
 
-def generate_summary(subtitle_text, video_url, model_name=None, base_url=None, api_key=None):
+    Returns:
+        解析后的摘要数据
+    """
+    try:
+        summary_data = json.loads(response)
+    except json.JSONDecodeError:
+        # 如果解析失败，尝试提取JSON部分
+        match = re.search(r'({[\s\S]*})', response)
+        if not match:
+            raise ValueError("LLM返回的内容不是有效的JSON格式")
+        try:
+            summary_data = json.loads(match.group(1))
+        except json.JSONDecodeError:
+            raise ValueError("LLM返回的内容不是有效的JSON格式")
+
+    # 验证JSON数据包含所有需要的字段
+    for field in required_fields:
+        if field not in summary_data:
+            raise ValueError(f"返回的摘要数据缺少必要字段: {field}")
+
+    return summary_data
+
+def _call_llm_for_summary(prompt, model_name=None, base_url=None, api_key=None, on_event=None, budget=None):
+    """
+    调用LLM并解析摘要JSON，无法解析的回复会从缓存中移除，避免重跑时复用
+
+    提供on_event时使用流式输出，每个字段（以及关键点中的每一项）生成完毕即回调一次，
+    事件格式见utils.stream_json.JSONObjectStreamParser。budget为本次提示的正文预算，仅用于日志。
+    """
+    model = model_name or DEFAULT_MODEL
+    print(f"提示预算: 模型 {model}，上下文 {get_context_window(model)} tokens，预留输出 {OUTPUT_RESERVE_TOKENS}，"
+          f"正文预算 {budget if budget is not None else '-'}，本次提示约 {estimate_tokens(prompt, model)} tokens")
+    if on_event is None:
+        response = call_llm(prompt, model_name, base_url, api_key)
+    else:
+        parser = JSONObjectStreamParser()
+        for delta in call_llm_stream(prompt, model_name, base_url, api_key):
+            for event in parser.feed(delta):
+                on_event(event)
+        response = parser.buffer
+    try:
+        return parse_summary_response(response)
+    except ValueError:
+        if cache_enabled():
+            get_llm_cache().invalidate(model_name or DEFAULT_MODEL, llm_cache_url(base_url), DEFAULT_TEMPERATURE, prompt)
+        raise
+
+def _summary_prompt(subtitle_text, video_url):
+    """单次摘要的提示文本"""
+    return f"""
+我需要你为一个视频生成一个全面的中文摘要。我会给你字幕文本。
+
+视频URL: {video_url}
+
+字幕内容:
+{subtitle_text}
+
+请提供以下格式的摘要（用JSON格式输出）:
+{SUMMARY_FORMAT}
+
+请确保你的回答是完全有效的JSON格式。不要添加任何前后缀，如```json或类似标记。
+"""
+
+def subtitle_token_budget(video_url, model_name=None):
+    """
+    单次摘要提示中可用于字幕的tokens，即模型上下文减去输出预留和提示模板
+
+    Args:
+        video_url: 视频URL
+        model_name: 模型名称，如果为None则使用默认模型
+
+    Returns:
+        可用的tokens
+    """
+    return prompt_budget(model_name or DEFAULT_MODEL, _summary_prompt("", video_url))
+
+def generate_summary(subtitle_text, video_url, model_name=None, base_url=None, api_key=None, on_event=None,
+                     segments=None):
     """
     根据字幕内容生成视频摘要
     
@@ -59,62 +275,291 @@ def generate_summary(subtitle_text, video_url, model_name=None, base_url=None, a
         model_name: 模型名称，如果为None则使用默认模型
         base_url: API基础URL，如果为None则使用默认URL
         api_key: OpenAI API密钥，如果为None则从环境变量获取
+        on_event: 可选的回调函数，提供时以流式方式生成，每个字段完成即回调
+        segments: 可选的字幕段落列表，超出模型预算时按完整段落截取，否则按行截取
     
     Returns:
         返回生成的摘要数据
     """
-    # 构建提示文本
-    prompt = f"""
-我需要你为一个视频生成一个全面的中文摘要。我会给你字幕文本。
+    # 按模型的上下文窗口装入尽可能多的完整字幕段落
+    model = model_name or DEFAULT_MODEL
+    budget = subtitle_token_budget(video_url, model)
+    if estimate_tokens(subtitle_text, model) > budget:
+        if segments is not None:
+            texts, separator = [segment["text"] for segment in segments], " "
+        else:
+            texts, separator = subtitle_text.splitlines(), "\n"
+        subtitle_text, packed, used = pack_segments(texts, budget, model, separator)
+        print(f"字幕超出模型 {model} 的提示预算，使用前 {packed}/{len(texts)} 段（约 {used} tokens）")
+
+    prompt = _summary_prompt(subtitle_text, video_url)
+    
+    # 调用LLM
+    try:
+        return _call_llm_for_summary(prompt, model_name, base_url, api_key, on_event, budget)
+    except Exception as e:
+        raise Exception(f"生成摘要失败: {str(e)}")
+
+def split_segments(segments, max_tokens, model_name=None):
+    """
+    将带时间戳的字幕段落切分为不超过max_tokens的窗口
+
+    Args:
+        segments: combine_subtitles返回的字幕段落列表
+        max_tokens: 每个窗口的最大tokens
+        model_name: 用于估算tokens的模型名称
+
+    Returns:
+        窗口文本列表，每行以段落开始时间为前缀
+    """
+    model = model_name or DEFAULT_MODEL
+    windows = []
+    lines = []
+    size = 0
+    for segment in segments:
+        line = f"[{segment['start_time'][:8]}] {segment['text']}"
+        tokens = estimate_tokens(line, model)
+        # 单个段落本身超长时按tokens硬切
+        while tokens > max_tokens:
+            if lines:
+                windows.append("\n".join(lines))
+                lines, size = [], 0
+            head = truncate_to_tokens(line, max_tokens, model) or line[:1]
+            windows.append(head)
+            line = line[len(head):]
+            tokens = estimate_tokens(line, model)
+        if lines and size + tokens + 1 > max_tokens:
+            windows.append("\n".join(lines))
+            lines, size = [], 0
+        lines.append(line)
+        size += tokens + 1
+    if lines:
+        windows.append("\n".join(lines))
+    return windows
+
+def _window_prompt(window_text, index, total, video_url):
+    """map阶段的提示文本"""
+    return f"""
+我需要你为一个长视频的其中一个片段生成中文摘要。这是第{index}/{total}个片段，字幕每行开头是该段的时间戳。
 
 视频URL: {video_url}
 
-字幕内容:
-{subtitle_text[:15000] if len(subtitle_text) > 15000 else subtitle_text}
+片段字幕内容:
+{window_text}
+
+请提供以下格式的片段摘要（用JSON格式输出），关键点请保留对应的时间戳:
+{SUMMARY_FORMAT}
+
+请确保你的回答是完全有效的JSON格式。不要添加任何前后缀，如```json或类似标记。
+"""
+
+def _summarize_window(window_text, index, total, video_url, model_name, base_url, api_key, budget=None):
+    """map阶段：总结视频的一个片段"""
+    prompt = _window_prompt(window_text, index, total, video_url)
+    return _call_llm_for_summary(prompt, model_name, base_url, api_key, budget=budget)
+
+def _reduce_prompt(partials_text, video_url):
+    """reduce阶段的提示文本"""
+    return f"""
+我需要你为一个视频生成一个全面的中文摘要。视频较长，已经按时间顺序分成多个片段分别总结，下面是各片段的摘要。
+请将它们整合为一个完整、连贯的视频摘要，去除重复内容，保持原有的时间顺序。
+
+视频URL: {video_url}
+
+各片段摘要:
+{partials_text}
 
 请提供以下格式的摘要（用JSON格式输出）:
-{{
-  "标题": "一个简短但信息丰富的标题",
-  "核心内容": "视频的核心要点（一句话）",
-  "关键点": ["关键点1", "关键点2", "关键点3", ...],
-  "详细摘要": "一个由多个段落组成的详细摘要，捕捉视频的主要内容，不超过800字",
-  "结论": "视频总结或结论"
-}}
+{SUMMARY_FORMAT}
 
 请确保你的回答是完全有效的JSON格式。不要添加任何前后缀，如```json或类似标记。
 """
-    
-    # 调用LLM
+
+def _format_partial(index, partial):
+    """reduce提示中的单个片段摘要"""
+    return f"片段{index + 1}:\n{json.dumps(partial, ensure_ascii=False)}"
+
+def _reduce_summaries(partials, video_url, model_name, base_url, api_key, on_event=None, budget=None):
+    """reduce阶段：将多个片段摘要合并为完整摘要"""
+    partials_text = "\n\n".join(_format_partial(i, p) for i, p in enumerate(partials))
+    prompt = _reduce_prompt(partials_text, video_url)
+    return _call_llm_for_summary(prompt, model_name, base_url, api_key, on_event, budget)
+
+def generate_summary_map_reduce(segments, video_url, model_name=None, base_url=None, api_key=None,
+                                max_tokens=None, max_workers=8, on_event=None):
+    """
+    使用map-reduce模式为长视频生成摘要：先并行总结各个字幕窗口，再合并为完整摘要
+
+    Args:
+        segments: combine_subtitles返回的字幕段落列表
+        video_url: 视频URL
+        model_name: 模型名称，如果为None则使用默认模型
+        base_url: API基础URL，如果为None则使用默认URL
+        api_key: OpenAI API密钥，如果为None则从环境变量获取
+        max_tokens: 每个窗口及每组片段摘要的最大tokens，默认按模型上下文窗口计算
+        max_workers: map阶段的最大并发请求数
+        on_event: 可选的回调函数，最终合并阶段以流式方式生成，每个字段完成即回调
+
+    Returns:
+        返回生成的摘要数据，格式与generate_summary相同
+    """
+    model = model_name or DEFAULT_MODEL
+    # 片段序号按较大的位数预留，保证各窗口的提示都不超出预算
+    window_budget = max_tokens or prompt_budget(model, _window_prompt("", 9999, 9999, video_url))
+    reduce_budget = max_tokens or prompt_budget(model, _reduce_prompt("", video_url))
+
+    windows = split_segments(segments, window_budget, model)
+    if len(windows) <= 1:
+        return generate_summary("\n".join(windows), video_url, model_name, base_url, api_key, on_event)
+
     try:
-        response = call_llm(prompt, model_name, base_url, api_key)
-        
-        # 解析回复为JSON
-        try:
-            summary_data = json.loads(response)
-            # 验证JSON数据包含所有需要的字段
-            required_fields = ["标题", "核心内容", "关键点", "详细摘要", "结论"]
-            for field in required_fields:
-                if field not in summary_data:
-                    raise ValueError(f"返回的摘要数据缺少必要字段: {field}")
-            
-            return summary_data
-        except json.JSONDecodeError:
-            # 如果解析失败，尝试提取JSON部分
-            import re
-            json_pattern = r'({[\s\S]*})'
-            match = re.search(json_pattern, response)
-            if match:
-                try:
-                    summary_data = json.loads(match.group(1))
-                    return summary_data
-                except:
-                    pass
-            
-            # 如果仍然无法解析，则抛出错误
-            raise ValueError("LLM返回的内容不是有效的JSON格式")
+        # map阶段：并行总结所有窗口
+        print(f"字幕较长，分为 {len(windows)} 个片段并行总结（每段不超过 {window_budget} tokens）...")
+        # 每个任务复制当前上下文，使工作线程中的LLM用量仍计入当前节点
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run, _summarize_window,
+                    window, i + 1, len(windows), video_url, model_name, base_url, api_key, window_budget
+                )
+                for i, window in enumerate(windows)
+            ]
+            partials = [future.result() for future in futures]
+
+        return _reduce_hierarchically(
+            partials, video_url, model_name, base_url, api_key, reduce_budget, max_workers, on_event
+        )
     except Exception as e:
         raise Exception(f"生成摘要失败: {str(e)}")
 
+def _reduce_hierarchically(partials, video_url, model_name, base_url, api_key, budget, max_workers, on_event=None):
+    """reduce阶段：片段摘要过多时分组逐层合并，每层内部并行"""
+    model = model_name or DEFAULT_MODEL
+    while True:
+        groups = [[]]
+        size = 0
+        for partial in partials:
+            partial_size = estimate_tokens(_format_partial(len(groups[-1]), partial), model) + 1
+            if groups[-1] and size + partial_size > budget:
+                groups.append([])
+                size = 0
+            groups[-1].append(partial)
+            size += partial_size
+        # 只剩一组，或无法继续分组（单个片段摘要已超过上限）时直接合并
+        if len(groups) == 1 or len(groups) == len(partials):
+            return _reduce_summaries(partials, video_url, model_name, base_url, api_key, on_event, budget)
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run, _reduce_summaries,
+                    group, video_url, model_name, base_url, api_key, None, budget
+                ) if len(group) > 1 else None
+                for group in groups
+            ]
+            partials = [
+                future.result() if future is not None else group[0]
+                for future, group in zip(futures, groups)
+            ]
+
+def summarize_subtitles(subtitle_data, video_url, model_name=None, base_url=None, api_key=None, on_event=None):
+    """
+    为一段字幕生成摘要，能放进单次提示时直接总结，否则使用map-reduce模式
+
+    Args:
+        subtitle_data: process_subtitle_file返回的字幕数据
+        video_url: 视频URL
+        model_name: 模型名称，如果为None则使用默认模型
+        base_url: API基础URL，如果为None则使用默认URL
+        api_key: OpenAI API密钥，如果为None则从环境变量获取
+        on_event: 可选的回调函数，提供时以流式方式生成，每个字段完成即回调
+
+    Returns:
+        返回生成的摘要数据
+    """
+    model = model_name or DEFAULT_MODEL
+    if estimate_tokens(subtitle_data["full_text"], model) > subtitle_token_budget(video_url, model):
+        # 超出模型上下文的长视频使用map-reduce模式，避免截断字幕
+        return generate_summary_map_reduce(
+            subtitle_data["subtitles"], video_url, model_name, base_url, api_key, on_event=on_event
+        )
+    return generate_summary(subtitle_data["full_text"], video_url, model_name, base_url, api_key, on_event)
+
+def _course_prompt(parts_text, video_url):
+    """合并各分P摘要的提示文本"""
+    return f"""
+我需要你为一个分为多个分P的视频合集（如系列课程）生成一个全面的中文总摘要。下面是按顺序排列的各分P摘要。
+请将它们整合为一个完整、连贯的合集摘要，概括整个合集的主线和各分P之间的联系，去除重复内容。
+
+视频URL: {video_url}
+
+各分P摘要:
+{parts_text}
+
+请提供以下格式的摘要（用JSON格式输出）:
+{SUMMARY_FORMAT}
+
+请确保你的回答是完全有效的JSON格式。不要添加任何前后缀，如```json或类似标记。
+"""
+
+def _format_part(index, title, summary, compact=False):
+    """合集提示中的单个分P摘要，compact时省略详细摘要"""
+    if compact:
+        summary = {k: v for k, v in summary.items() if k != "详细摘要"}
+    return f"第{index + 1}P {title}:\n{json.dumps(summary, ensure_ascii=False)}"
+
+def generate_course_summary(parts, video_url, model_name=None, base_url=None, api_key=None,
+                            max_workers=8, on_event=None):
+    """
+    为多P视频生成合集摘要：并行总结各分P，再合并为总摘要
+
+    Args:
+        parts: 各分P的字幕数据列表，每项为process_subtitle_file的返回值加上title
+        video_url: 视频URL
+        model_name: 模型名称，如果为None则使用默认模型
+        base_url: API基础URL，如果为None则使用默认URL
+        api_key: OpenAI API密钥，如果为None则从环境变量获取
+        max_workers: 同时总结的分P数量上限
+        on_event: 可选的回调函数，合并阶段以流式方式生成，每个字段完成即回调
+
+    Returns:
+        合集摘要，格式与generate_summary相同，另有"分P摘要"字段按顺序列出各分P的标题和摘要
+    """
+    model = model_name or DEFAULT_MODEL
+    print(f"共 {len(parts)} 个分P，并行总结各分P...")
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run, summarize_subtitles,
+                    part, video_url, model_name, base_url, api_key
+                )
+                for part in parts
+            ]
+            part_summaries = [future.result() for future in futures]
+
+        titles = [part.get("title") or f"P{i + 1}" for i, part in enumerate(parts)]
+        budget = prompt_budget(model, _course_prompt("", video_url))
+        # 各分P的完整摘要放不下时只保留概要字段，仍放不下则逐层合并
+        for compact in (False, True):
+            parts_text = "\n\n".join(
+                _format_part(i, title, summary, compact)
+                for i, (title, summary) in enumerate(zip(titles, part_summaries))
+            )
+            if estimate_tokens(parts_text, model) <= budget:
+                prompt = _course_prompt(parts_text, video_url)
+                course = _call_llm_for_summary(prompt, model_name, base_url, api_key, on_event, budget)
+                break
+        else:
+            reduce_budget = prompt_budget(model, _reduce_prompt("", video_url))
+            course = _reduce_hierarchically(
+                part_summaries, video_url, model_name, base_url, api_key, reduce_budget, max_workers, on_event
+            )
+    except Exception as e:
+        raise Exception(f"生成合集摘要失败: {str(e)}")
+
+    course["分P摘要"] = [{"分P": title, **summary} for title, summary in zip(titles, part_summaries)]
+    return course
+
 if __name__ == "__main__":
     # 测试函数
     prompt = "人工智能的未来是什么？"
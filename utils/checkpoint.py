@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from utils.paths import get_cache_dir
+
+# 可保存检查点的流程阶段，按执行顺序排列，名称与共享数据中的键一致
+STAGES = ("subtitle_info", "subtitle_data", "summary")
+
+def checkpoint_enabled():
+    """是否启用阶段检查点，设置环境变量BILI_CHECKPOINT=0可关闭"""
+    return os.environ.get("BILI_CHECKPOINT", "1").lower() not in ("0", "false", "off", "no")
+
+def stages_from(stage):
+    """
+    返回从指定阶段开始（含该阶段）的所有阶段
+
+    参数:
+        stage (str): 阶段名称，必须是STAGES之一
+
+    返回:
+        tuple: 需要重新运行的阶段
+    """
+    if stage not in STAGES:
+        raise ValueError(f"未知的阶段: {stage}，可选: {', '.join(STAGES)}")
+    return STAGES[STAGES.index(stage):]
+
+def data_digest(data):
+    """阶段输出的内容哈希，下一阶段的检查点以此判断输入是否变化"""
+    canonical = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class CheckpointStore:
+    """
+    按视频保存各阶段输出的检查点，失败后重跑时跳过已完成的阶段
+
+    每个检查点记录生成它的输入键（上一阶段输出的哈希，总结阶段还包括模型和API地址），
+    输入键不一致时视为失效，因此上游阶段重新运行后下游阶段会自动重跑。
+
+    参数:
+        root (str): 检查点目录，默认为缓存目录下的checkpoints/
+    """
+
+    def __init__(self, root=None):
+        self.root = os.path.abspath(root) if root else get_cache_dir("checkpoints")
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, video_id, stage):
+        return os.path.join(self.root, video_id, f"{stage}.json")
+
+    def load(self, video_id, stage, key=""):
+        """
+        读取检查点
+
+        返回:
+            dict: 包含data和digest的检查点记录，不存在或输入键不一致时返回None
+        """
+        try:
+            with open(self._path(video_id, stage), "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(record, dict) or record.get("key") != key or "data" not in record:
+            return None
+        return record
+
+    def latest(self, video_id, stage):
+        """读取检查点中保存的阶段输出，不检查输入键，不存在时返回None"""
+        try:
+            with open(self._path(video_id, stage), "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return record.get("data") if isinstance(record, dict) else None
+
+    def save(self, video_id, stage, data, key=""):
+        """
+        保存检查点，先写临时文件再替换，中途失败不会留下损坏的检查点
+
+        返回:
+            str: 阶段输出的内容哈希
+        """
+        digest = data_digest(data)
+        path = self._path(video_id, stage)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        record = {"stage": stage, "key": key, "digest": digest, "created_at": time.time(), "data": data}
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return digest
+
+    def invalidate(self, video_id, stage=STAGES[0]):
+        """删除指定阶段及之后所有阶段的检查点"""
+        for name in stages_from(stage):
+            try:
+                os.remove(self._path(video_id, name))
+            except OSError:
+                pass
+
+    def remove(self, video_id):
+        """删除指定视频的全部检查点"""
+        shutil.rmtree(os.path.join(self.root, video_id), ignore_errors=True)
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_checkpoint_store():
+    """获取进程内共享的检查点仓库实例"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CheckpointStore()
+        return _store
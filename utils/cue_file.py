@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import mmap
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from utils.timeline import CueTimeline, parse_timestamp
+
+# 文件布局（小端，各列8字节对齐）：
+#   文件头 | 元数据JSON（补齐到8字节） | 开始毫秒[n] | 结束毫秒[n] | 结束毫秒前缀最大值[n] | 文本字节偏移[n+1] | 文本
+# 文本是所有字幕段落以空格连接后的UTF-8编码，第i段为text[offsets[i]:offsets[i + 1] - 1]
+MAGIC = b'BCUE'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQQQ')  # magic, version, 保留, 条目数, 文本字节数, 元数据字节数
+
+def _pad(length):
+    return (length + 7) // 8 * 8
+
+def _segments_of(subtitle_data):
+    parts = subtitle_data.get('parts')
+    if parts:
+        return [segment for part in parts for segment in part['subtitles']]
+    return subtitle_data['subtitles']
+
+def _ms(segment, key):
+    value = segment.get(f'{key}_ms')
+    return value if value is not None else parse_timestamp(segment[f'{key}_time'])
+
+def write_cue_file(path, subtitle_data):
+    """
+    把process_subtitle_file或process_video_subtitles的结果写成二进制字幕文件
+
+    参数:
+        path (str): 输出路径
+        subtitle_data (dict): 字幕数据，多P视频的分P边界和标题保存在元数据中
+
+    返回:
+        int: 写入的字幕段落数
+    """
+    segments = _segments_of(subtitle_data)
+    meta = {'subtitle_file': subtitle_data.get('subtitle_file'), 'format': subtitle_data.get('format')}
+    if subtitle_data.get('parts'):
+        meta['parts'] = []
+        first = 0
+        for part in subtitle_data['parts']:
+            count = len(part['subtitles'])
+            meta['parts'].append({'title': part.get('title'), 'subtitle_file': part.get('subtitle_file'),
+                                  'format': part.get('format'), 'first': first, 'count': count})
+            first += count
+
+    # 各分P的时间都从0开始，结束时间的前缀最大值在分P边界处重新计算
+    boundaries = {part['first'] for part in meta.get('parts', [])}
+    starts, ends, max_ends, offsets = array('q'), array('q'), array('q'), array('Q')
+    texts = []
+    position = 0
+    current = -1
+    for i, segment in enumerate(segments):
+        if i in boundaries:
+            current = -1
+        start_ms, end_ms = _ms(segment, 'start'), _ms(segment, 'end')
+        starts.append(start_ms)
+        ends.append(end_ms)
+        current = max(current, end_ms)
+        max_ends.append(current)
+        data = segment['text'].encode('utf-8')
+        offsets.append(position)
+        texts.append(data)
+        position += len(data) + 1
+    offsets.append(position)
+    text = b' '.join(texts)
+
+    if sys.byteorder != 'little':
+        for column in (starts, ends, max_ends, offsets):
+            column.byteswap()
+    meta_blob = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(segments), len(text), len(meta_blob)))
+        f.write(meta_blob.ljust(_pad(len(meta_blob)), b' '))
+        for column in (starts, ends, max_ends, offsets):
+            column.tofile(f)
+        f.write(text)
+    os.replace(tmp_path, path)
+    return len(segments)
+
+class CueFile(CueTimeline):
+    """
+    以内存映射方式打开的二进制字幕文件
+
+    时间列直接映射为整数序列，按时间查找和范围查询（find、at、range）在映射上二分查找；
+    多P视频各分P的时间都从0开始，查询时必须用part（从1开始）指定分P，返回的仍是全局条目序号。
+    字幕文本只在访问时解码对应的片段，不会载入整个字幕。
+
+    参数:
+        path (str): write_cue_file写入的文件
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, count, text_len, meta_len = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f'不是有效的二进制字幕文件: {path}')
+        self.meta = json.loads(self._mm[HEADER.size:HEADER.size + meta_len].decode('utf-8'))
+
+        position = HEADER.size + _pad(meta_len)
+        self.starts = self._column(position, count, 'q')
+        self.ends = self._column(position + 8 * count, count, 'q')
+        self._max_ends = self._column(position + 16 * count, count, 'q')
+        self.offsets = self._column(position + 24 * count, count + 1, 'Q')
+        self._text_start = position + 32 * count + 8
+        self._text_len = text_len
+
+    def _column(self, position, count, code):
+        data = memoryview(self._mm)[position:position + 8 * count]
+        if sys.byteorder == 'little':
+            return data.cast(code)
+        # 大端平台上需要转换字节序，只能复制一份
+        column = array(code, data.tobytes())
+        column.byteswap()
+        data.release()
+        return column
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """释放映射；关闭前需要先释放引用映射内存的整数序列"""
+        for column in (self.starts, self.ends, self._max_ends, self.offsets):
+            if isinstance(column, memoryview):
+                column.release()
+        self._mm.close()
+
+    def part_bounds(self, part=None):
+        """
+        分P的条目序号范围
+
+        参数:
+            part (int, optional): 分P编号（从1开始），单P字幕可以省略
+
+        返回:
+            tuple: (第一条的序号, 最后一条的序号 + 1)
+        """
+        parts = self.meta.get('parts')
+        if not parts:
+            if part not in (None, 0, 1):
+                raise ValueError(f'单P字幕没有分P {part}')
+            return 0, len(self)
+        if part is None:
+            raise ValueError('多P字幕的时间查询需要指定part')
+        if not 1 <= part <= len(parts):
+            raise ValueError(f'分P编号超出范围: {part}')
+        info = parts[part - 1]
+        return info['first'], info['first'] + info['count']
+
+    def find(self, t_ms, part=None):
+        """
+        查找分P中时间点t_ms正在显示的条目
+
+        返回:
+            int: 条目序号，该时间点没有字幕时返回None
+        """
+        lo, hi = self.part_bounds(part)
+        i = bisect_right(self.starts, t_ms, lo, hi) - 1
+        while i >= lo and self._max_ends[i] >= t_ms:
+            if self.ends[i] >= t_ms:
+                return i
+            i -= 1
+        return None
+
+    def at(self, t_ms, part=None):
+        """返回分P中时间点t_ms正在显示的文本，没有字幕时返回None"""
+        i = self.find(t_ms, part)
+        return None if i is None else self.text_of(i)
+
+    def range(self, start_ms, end_ms, part=None):
+        """
+        查询分P中与[start_ms, end_ms)时间范围重叠的条目
+
+        返回:
+            list: 条目序号列表，按开始时间排序
+        """
+        lo, hi = self.part_bounds(part)
+        first = bisect_right(self._max_ends, start_ms, lo, hi)
+        last = bisect_left(self.starts, end_ms, lo, hi)
+        return [i for i in range(first, last) if self.ends[i] > start_ms]
+
+    def _decode(self, start, end):
+        return self._mm[self._text_start + start:self._text_start + end].decode('utf-8')
+
+    def text_of(self, i):
+        """返回第i条的文本"""
+        return self._decode(self.offsets[i], self.offsets[i + 1] - 1)
+
+    def text_between(self, lo, hi):
+        """第lo到hi-1条文本以空格连接的结果，只解码一次连续的片段"""
+        if lo >= hi:
+            return ''
+        return self._decode(self.offsets[lo], self.offsets[hi] - 1)
+
+    @property
+    def text(self):
+        """全部字幕文本（以空格连接），会解码整个文本区"""
+        return self._decode(0, self._text_len)
+
+    def to_subtitle_data(self):
+        """
+        转换为process_subtitle_file（多P视频为process_video_subtitles）返回的字典结构
+
+        返回:
+            dict: 包含subtitles和full_text，多P视频另有parts
+        """
+        parts = self.meta.get('parts')
+        if not parts:
+            return {
+                'subtitle_file': self.meta.get('subtitle_file'),
+                'format': self.meta.get('format'),
+                'subtitles': self.to_segments(),
+                'full_text': self.text_between(0, len(self))
+            }
+        results = []
+        for part in parts:
+            first, count = part['first'], part['count']
+            results.append({
+                'subtitle_file': part.get('subtitle_file'),
+                'format': part.get('format'),
+                'subtitles': [self.segment(i) for i in range(first, first + count)],
+                'full_text': self.text_between(first, first + count),
+                'title': part.get('title')
+            })
+        return {
+            'subtitle_file': self.meta.get('subtitle_file'),
+            'format': self.meta.get('format'),
+            'parts': results,
+            'subtitles': [segment for result in results for segment in result['subtitles']],
+            'full_text': ' '.join(result['full_text'] for result in results)
+        }
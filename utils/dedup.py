@@ -0,0 +1,203 @@
+import os
+import re
+import json
+import time
+import struct
+import sqlite3
+import hashlib
+import threading
+from utils.paths import get_cache_dir
+
+# 签名长度与LSH分段：32段×每段4个值，相似度约0.5以上的字幕大概率落入同一个桶成为候选
+NUM_HASHES = 128
+BANDS = 32
+ROWS = NUM_HASHES // BANDS
+
+# 按字符取5-gram，中文字幕不分词也能得到稳定的片段
+SHINGLE_SIZE = 5
+
+# 签名相似度达到该值时复用已有摘要
+DEFAULT_THRESHOLD = float(os.environ.get("BILI_DEDUP_THRESHOLD", "0.8"))
+
+# 单哈希分桶时各桶取值范围的宽度，空桶借用右侧桶的值时加上距离的倍数以区分来源
+_BIN_WIDTH = 2 ** 64 // NUM_HASHES
+
+_SIGNATURE = struct.Struct(f"<{NUM_HASHES}Q")
+
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+def dedup_enabled():
+    """是否检测重复字幕并复用已有摘要，设置环境变量BILI_DEDUP=0可关闭"""
+    return os.environ.get("BILI_DEDUP", "1").lower() not in ("0", "false", "off", "no")
+
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+def shingle_hashes(text):
+    """
+    字幕文本的片段哈希集合：去掉空白和标点并转为小写后，取所有连续SHINGLE_SIZE个字符
+
+    返回:
+        set: 64位哈希值集合
+    """
+    text = _NON_WORD_RE.sub("", text.lower())
+    if len(text) < SHINGLE_SIZE:
+        return {_hash64(text.encode("utf-8"))} if text else set()
+    return {_hash64(text[i:i + SHINGLE_SIZE].encode("utf-8")) for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+def minhash_signature(text):
+    """
+    计算字幕文本的MinHash签名
+
+    使用单哈希分桶（one permutation hashing）：每个片段只计算一次哈希，按哈希值落入NUM_HASHES个桶，
+    每个桶取最小值；空桶按循环顺序借用右侧第一个非空桶的值。长字幕的计算量与片段数成正比。
+
+    参数:
+        text (str): 字幕全文
+
+    返回:
+        list: NUM_HASHES个整数，文本为空时返回None
+    """
+    hashes = shingle_hashes(text)
+    if not hashes:
+        return None
+    bins = [None] * NUM_HASHES
+    for h in hashes:
+        i = h % NUM_HASHES
+        value = h // NUM_HASHES
+        if bins[i] is None or value < bins[i]:
+            bins[i] = value
+    signature = list(bins)
+    for i in range(NUM_HASHES):
+        if bins[i] is None:
+            for distance in range(1, NUM_HASHES):
+                value = bins[(i + distance) % NUM_HASHES]
+                if value is not None:
+                    signature[i] = value + distance * _BIN_WIDTH
+                    break
+    return signature
+
+def signature_similarity(a, b):
+    """两个签名相同位置取值相等的比例，即字幕片段集合Jaccard相似度的估计"""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_HASHES
+
+def band_keys(signature):
+    """签名每一段的桶键，任意一段完全相同的两个签名成为候选"""
+    keys = []
+    for band in range(BANDS):
+        values = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(struct.pack(f"<{ROWS}Q", *values), digest_size=8).digest()
+        keys.append((band, int.from_bytes(digest, "little", signed=True)))
+    return keys
+
+class DuplicateIndex:
+    """
+    基于SQLite的LSH索引，记录已总结视频的字幕签名和摘要
+
+    参数:
+        path (str): 数据库路径，默认为缓存目录下的dedup.sqlite3
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_cache_dir(), "dedup.sqlite3")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS videos (
+                video_id TEXT PRIMARY KEY,
+                video_url TEXT NOT NULL,
+                model TEXT,
+                parts INTEGER NOT NULL,
+                signature BLOB NOT NULL,
+                summary TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS bands (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                video_id TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_bands ON bands (band, bucket)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_bands_video ON bands (video_id)")
+        self._conn.commit()
+
+    def add(self, video_id, video_url, signature, summary, model=None, parts=0):
+        """记录一个已总结视频的签名和摘要，同一视频重复添加时覆盖"""
+        with self._lock:
+            self._conn.execute("DELETE FROM bands WHERE video_id = ?", (video_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO videos (video_id, video_url, model, parts, signature, summary, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (video_id, video_url, model, parts, _SIGNATURE.pack(*signature),
+                 json.dumps(summary, ensure_ascii=False), time.time())
+            )
+            self._conn.executemany(
+                "INSERT INTO bands (band, bucket, video_id) VALUES (?, ?, ?)",
+                [(band, bucket, video_id) for band, bucket in band_keys(signature)]
+            )
+            self._conn.commit()
+
+    def find(self, signature, model=None, parts=0, exclude=None, threshold=DEFAULT_THRESHOLD):
+        """
+        查找字幕最相似的已总结视频
+
+        参数:
+            signature (list): 待查视频的签名
+            model (str, optional): 只匹配用该模型生成的摘要
+            parts (int): 分P数量，只匹配分P数量相同的视频（单P视频为0）
+            exclude (str, optional): 排除的视频ID（通常是待查视频自身）
+            threshold (float): 最低相似度
+
+        返回:
+            dict: {"video_id", "video_url", "similarity", "summary"}，没有达到阈值的视频时返回None
+        """
+        best = None
+        with self._lock:
+            candidates = set()
+            for band, bucket in band_keys(signature):
+                rows = self._conn.execute(
+                    "SELECT video_id FROM bands WHERE band = ? AND bucket = ?", (band, bucket)
+                ).fetchall()
+                candidates.update(row[0] for row in rows)
+            candidates.discard(exclude)
+
+            for video_id in candidates:
+                row = self._conn.execute(
+                    "SELECT video_url, model, parts, signature FROM videos WHERE video_id = ?", (video_id,)
+                ).fetchone()
+                if row is None or row[2] != parts or (model is not None and row[1] != model):
+                    continue
+                similarity = signature_similarity(signature, _SIGNATURE.unpack(row[3]))
+                if similarity >= threshold and (best is None or similarity > best["similarity"]):
+                    best = {"video_id": video_id, "video_url": row[0], "similarity": similarity}
+
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            row = self._conn.execute("SELECT summary FROM videos WHERE video_id = ?", (best["video_id"],)).fetchone()
+        best["summary"] = json.loads(row[0])
+        return best
+
+    def stats(self):
+        """返回索引中的视频数和本进程的命中、未命中次数"""
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+        return {"videos": count, "hits": self.hits, "misses": self.misses}
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_duplicate_index():
+    """获取进程内共享的重复检测索引"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DuplicateIndex()
+        return _index
@@ -1,27 +1,62 @@
 import os
+import re
+import json
+import shutil
 import subprocess
 import tempfile
-import json
 from pathlib import Path
+from utils.subtitle_store import get_subtitle_store
+from utils.bilibili_api import fetch_subtitles
 
-def download_subtitle(video_url, sessdata=None, output_dir=None):
+def normalize_video_url(video):
     """
-    使用yutto下载B站视频的字幕
-    
+    将BV号、av号或完整URL统一为视频URL
+
+    参数:
+        video (str): BV号（如BV1GJ411x7h7）、av号（如av170001）或完整的视频URL
+
+    返回:
+        str: 视频URL
+    """
+    video = video.strip()
+    if video.startswith(("http://", "https://")):
+        return video
+    if video.lower().startswith("av"):
+        return f"https://www.bilibili.com/video/av{video[2:]}"
+    if video.startswith("BV"):
+        return f"https://www.bilibili.com/video/{video}"
+    raise ValueError(f"无法识别的视频地址: {video}")
+
+def extract_video_id(video_url):
+    """
+    从视频URL中提取视频ID
+
+    检查点、字幕仓库、摘要数据、归档页面和全文索引都使用这个ID，同一视频在各处一致。
+
     参数:
         video_url (str): B站视频的URL
-        sessdata (str, optional): B站的SESSDATA cookie
-        output_dir (str, optional): 输出目录，默认为临时目录
-        
+
     返回:
-        dict: 包含字幕文件路径和视频信息的字典
+        str: BV号，或带av前缀的av号（如av170001）
     """
-    if output_dir is None:
-        output_dir = tempfile.mkdtemp(prefix="bilibili_summarizer_")
-    else:
-        output_dir = os.path.abspath(output_dir)
-        os.makedirs(output_dir, exist_ok=True)
-    
+    match = re.search(r"(BV[0-9A-Za-z]{10})", video_url)
+    if match:
+        return match.group(1)
+    match = re.search(r"av(\d+)", video_url, re.IGNORECASE)
+    if match:
+        return f"av{match.group(1)}"
+    # 无法识别时退回URL路径的最后一段
+    return video_url.rstrip("/").split("/")[-1].split("?")[0] or "unknown"
+
+def _find_subtitle_files(directory):
+    """查找目录下的字幕文件，优先使用SRT格式"""
+    subtitle_files = list(Path(directory).glob("**/*.srt"))
+    if not subtitle_files:
+        subtitle_files = list(Path(directory).glob("**/*.ass"))
+    return subtitle_files
+
+def _run_yutto(video_url, sessdata, output_dir):
+    """运行yutto下载字幕到指定目录，返回找到的字幕文件"""
     # 构建yutto命令
     cmd = ["yutto", video_url, "--subtitle-only", "--dir", output_dir]
     
@@ -31,37 +66,121 @@ def download_subtitle(video_url, sessdata=None, output_dir=None):
     
     # 运行yutto命令
     try:
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        subprocess.run(cmd, check=True, capture_output=True, text=True)
         print("yutto命令执行成功")
+    except subprocess.CalledProcessError as e:
+        print(f"yutto命令执行失败: {e}")
+        print(f"错误输出: {e.stderr}")
+        raise Exception(f"字幕下载失败: {e}")
+
+    # 查找下载的字幕文件
+    subtitle_files = _find_subtitle_files(output_dir)
+    if not subtitle_files:
+        raise Exception("未找到下载的字幕文件")
+    return subtitle_files
+
+def _fetch_subtitles(video_id, sessdata):
+    """
+    通过B站接口在进程内获取字幕内容
+
+    设置环境变量BILI_SUBTITLE_FETCHER=yutto时直接使用yutto；接口失败且安装了yutto时返回None，
+    由调用方退回yutto下载。
+
+    返回:
+        dict: 文件名到字幕内容的映射，需要改用yutto时为None
+    """
+    if os.environ.get("BILI_SUBTITLE_FETCHER", "api") == "yutto":
+        return None
+    try:
+        subtitles = fetch_subtitles(video_id, sessdata)
+    except Exception as e:
+        if shutil.which("yutto") is None:
+            raise Exception(f"字幕下载失败: {e}")
+        print(f"通过B站接口获取字幕失败（{e}），改用yutto下载")
+        return None
+    print(f"通过B站接口获取到 {len(subtitles)} 个字幕轨道")
+    return subtitles
+
+def _write_subtitles(subtitles, directory):
+    """将内存中的字幕内容写入目录，返回文件路径列表"""
+    subtitle_files = []
+    for name, data in subtitles.items():
+        path = Path(directory) / name
+        path.write_bytes(data)
+        subtitle_files.append(path)
+    return subtitle_files
+
+def download_subtitle(video_url, sessdata=None, output_dir=None, use_store=True, force=False):
+    """
+    下载B站视频的字幕，优先通过B站接口在进程内获取，yutto作为备用
+    
+    参数:
+        video_url (str): B站视频的URL
+        sessdata (str, optional): B站的SESSDATA cookie
+        output_dir (str, optional): 输出目录，指定后直接下载到该目录且不使用本地字幕仓库
+        use_store (bool): 是否使用本地字幕仓库，已下载过的视频不会再次下载
+        force (bool): 是否忽略仓库中已有的字幕重新下载
         
-        # 查找下载的字幕文件
-        subtitle_files = list(Path(output_dir).glob("**/*.srt"))
-        if not subtitle_files:
-            subtitle_files = list(Path(output_dir).glob("**/*.ass"))
-        
-        if not subtitle_files:
-            raise Exception("未找到下载的字幕文件")
-        
-        # 获取视频信息
-        video_id = video_url.split("/")[-1].split("?")[0]
-        if video_id.startswith("av"):
-            video_id = video_id[2:]
-        elif video_id.startswith("BV"):
-            # BV号，这里简化处理
-            pass
-        
-        # 返回结果
+    返回:
+        dict: 包含字幕文件路径和视频信息的字典
+    """
+    video_id = extract_video_id(video_url)
+
+    if output_dir is not None:
+        output_dir = os.path.abspath(output_dir)
+        os.makedirs(output_dir, exist_ok=True)
+        subtitles = _fetch_subtitles(video_id, sessdata)
+        if subtitles is not None:
+            subtitle_files = _write_subtitles(subtitles, output_dir)
+        else:
+            subtitle_files = _run_yutto(video_url, sessdata, output_dir)
         return {
             "subtitle_files": [str(f) for f in subtitle_files],
             "video_url": video_url,
             "video_id": video_id,
             "output_dir": output_dir
         }
-        
-    except subprocess.CalledProcessError as e:
-        print(f"yutto命令执行失败: {e}")
-        print(f"错误输出: {e.stderr}")
-        raise Exception(f"字幕下载失败: {e}")
+
+    store = get_subtitle_store() if use_store else None
+    entry = store.get(video_id) if store is not None and not force else None
+
+    subtitles = None
+    if entry is None:
+        subtitles = _fetch_subtitles(video_id, sessdata)
+
+    if entry is None and subtitles is not None and store is not None:
+        # 接口获取的字幕直接写入仓库，不经过临时目录
+        entry = store.put_data(video_id, video_url, subtitles)
+    elif entry is None:
+        # 下载到临时目录，保存进仓库后清理
+        temp_dir = tempfile.mkdtemp(prefix="bilibili_summarizer_")
+        try:
+            if subtitles is not None:
+                subtitle_files = _write_subtitles(subtitles, temp_dir)
+            else:
+                subtitle_files = _run_yutto(video_url, sessdata, temp_dir)
+            if store is None:
+                return {
+                    "subtitle_files": [str(f) for f in subtitle_files],
+                    "video_url": video_url,
+                    "video_id": video_id,
+                    "output_dir": temp_dir
+                }
+            entry = store.put(video_id, video_url, [str(f) for f in subtitle_files])
+        finally:
+            if store is not None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+    else:
+        print(f"使用本地已保存的字幕: {video_id}")
+
+    # 返回结果
+    return {
+        "subtitle_files": [t["file"] for t in entry["tracks"]],
+        "tracks": entry["tracks"],
+        "video_url": video_url,
+        "video_id": video_id,
+        "output_dir": os.path.dirname(entry["tracks"][0]["file"])
+    }
 
 if __name__ == "__main__":
     # 测试函数
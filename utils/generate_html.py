@@ -1,209 +1,227 @@
 import os
+import re
 import json
+import html
 from datetime import datetime
+from utils.download_subtitle import extract_video_id
 
-def generate_html(summary, video_url, subtitle_data=None, output_path=None):
-    """
-    生成包含视频摘要的HTML页面
-    
-    参数:
-        summary (dict): 摘要信息字典
-        video_url (str): 视频URL
-        subtitle_data (dict, optional): 字幕数据
-        output_path (str, optional): 输出文件路径
-        
-    返回:
-        str: 生成的HTML文件路径
-    """
-    # 获取视频ID
-    if "bilibili.com/video/" in video_url:
-        video_id = video_url.split("bilibili.com/video/")[1].split("?")[0].split("/")[0]
-    else:
-        video_id = "unknown"
-    
-    # 处理关键点
-    key_points_html = ""
-    if summary.get("关键点"):
-        for i, point in enumerate(summary["关键点"]):
-            key_points_html += f'<li><span class="point-number">{i+1}</span><span class="point-content">{point}</span></li>\n'
-    
-    # 当前时间
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # 生成HTML内容
-    html_content = f"""<!DOCTYPE html>
+# 所有页面共享的样式表，写入输出目录的static/下，不再内联到每个页面
+STYLE_CSS = """
+:root {
+    --primary-color: #FB7299;
+    --secondary-color: #23ADE5;
+    --background-color: #f6f7f8;
+    --card-background: #ffffff;
+    --text-color: #18191c;
+    --text-secondary: #61666d;
+    --border-radius: 12px;
+    --shadow: 0 5px 20px rgba(0, 0, 0, 0.05);
+}
+
+* {
+    margin: 0;
+    padding: 0;
+    box-sizing: border-box;
+}
+
+body {
+    font-family: "PingFang SC", "Microsoft YaHei", sans-serif;
+    background-color: var(--background-color);
+    color: var(--text-color);
+    line-height: 1.6;
+    padding: 20px;
+}
+
+.container {
+    max-width: 800px;
+    margin: 0 auto;
+}
+
+header {
+    text-align: center;
+    margin-bottom: 30px;
+    padding-top: 20px;
+}
+
+.logo {
+    font-size: 24px;
+    font-weight: bold;
+    color: var(--primary-color);
+    margin-bottom: 10px;
+}
+
+h1 {
+    font-size: 28px;
+    margin-bottom: 10px;
+    line-height: 1.4;
+}
+
+.video-info {
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    color: var(--text-secondary);
+    font-size: 14px;
+    margin-bottom: 10px;
+}
+
+.video-info a {
+    color: var(--secondary-color);
+    text-decoration: none;
+    margin-left: 5px;
+}
+
+.card {
+    background-color: var(--card-background);
+    border-radius: var(--border-radius);
+    box-shadow: var(--shadow);
+    padding: 24px;
+    margin-bottom: 24px;
+}
+
+.card-title {
+    font-size: 18px;
+    margin-bottom: 16px;
+    display: flex;
+    align-items: center;
+}
+
+.card-title::before {
+    content: "";
+    display: inline-block;
+    width: 4px;
+    height: 18px;
+    background-color: var(--primary-color);
+    margin-right: 10px;
+    border-radius: 2px;
+}
+
+.core-content {
+    font-size: 16px;
+    line-height: 1.8;
+}
+
+.key-points-list {
+    list-style: none;
+    margin-top: 12px;
+}
+
+.key-points-list li {
+    margin-bottom: 12px;
+    display: flex;
+    align-items: flex-start;
+}
+
+.point-number {
+    display: inline-flex;
+    align-items: center;
+    justify-content: center;
+    width: 24px;
+    height: 24px;
+    background-color: var(--primary-color);
+    color: white;
+    border-radius: 50%;
+    font-size: 14px;
+    margin-right: 10px;
+    flex-shrink: 0;
+}
+
+.point-content {
+    flex: 1;
+}
+
+.part-title {
+    font-size: 16px;
+    margin-bottom: 8px;
+}
+
+.summary-text {
+    line-height: 1.8;
+    text-align: justify;
+}
+
+.conclusion {
+    font-size: 16px;
+    line-height: 1.8;
+    padding: 16px;
+    background-color: rgba(251, 114, 153, 0.05);
+    border-left: 4px solid var(--primary-color);
+    border-radius: 0 var(--border-radius) var(--border-radius) 0;
+}
+
+.archive-title {
+    font-size: 18px;
+    margin-bottom: 6px;
+}
+
+.archive-title a {
+    color: var(--text-color);
+    text-decoration: none;
+}
+
+.archive-title a:hover {
+    color: var(--primary-color);
+}
+
+.archive-meta {
+    color: var(--text-secondary);
+    font-size: 13px;
+    margin-bottom: 10px;
+}
+
+.pagination {
+    display: flex;
+    justify-content: space-between;
+    font-size: 14px;
+}
+
+.pagination a {
+    color: var(--secondary-color);
+    text-decoration: none;
+}
+
+footer {
+    text-align: center;
+    margin-top: 50px;
+    color: var(--text-secondary);
+    font-size: 14px;
+}
+
+@media (max-width: 768px) {
+    body {
+        padding: 16px;
+    }
+
+    h1 {
+        font-size: 22px;
+    }
+
+    .card {
+        padding: 16px;
+    }
+}
+"""
+
+STYLE_PATH = "static/bilibili_summary.css"
+
+# 摘要数据保存在输出目录的data/下，修改模板后可直接重新渲染，无需重跑流程
+DATA_DIR = "data"
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
 <html lang="zh-CN">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{summary.get("标题", "视频摘要")} - 哔哩哔哩视频总结器</title>
-    <style>
-        :root {{
-            --primary-color: #FB7299;
-            --secondary-color: #23ADE5;
-            --background-color: #f6f7f8;
-            --card-background: #ffffff;
-            --text-color: #18191c;
-            --text-secondary: #61666d;
-            --border-radius: 12px;
-            --shadow: 0 5px 20px rgba(0, 0, 0, 0.05);
-        }}
-        
-        * {{
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }}
-        
-        body {{
-            font-family: "PingFang SC", "Microsoft YaHei", sans-serif;
-            background-color: var(--background-color);
-            color: var(--text-color);
-            line-height: 1.6;
-            padding: 20px;
-        }}
-        
-        .container {{
-            max-width: 800px;
-            margin: 0 auto;
-        }}
-        
-        header {{
-            text-align: center;
-            margin-bottom: 30px;
-            padding-top: 20px;
-        }}
-        
-        .logo {{
-            font-size: 24px;
-            font-weight: bold;
-            color: var(--primary-color);
-            margin-bottom: 10px;
-        }}
-        
-        h1 {{
-            font-size: 28px;
-            margin-bottom: 10px;
-            line-height: 1.4;
-        }}
-        
-        .video-info {{
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            color: var(--text-secondary);
-            font-size: 14px;
-            margin-bottom: 10px;
-        }}
-        
-        .video-info a {{
-            color: var(--secondary-color);
-            text-decoration: none;
-            margin-left: 5px;
-        }}
-        
-        .card {{
-            background-color: var(--card-background);
-            border-radius: var(--border-radius);
-            box-shadow: var(--shadow);
-            padding: 24px;
-            margin-bottom: 24px;
-        }}
-        
-        .card-title {{
-            font-size: 18px;
-            margin-bottom: 16px;
-            display: flex;
-            align-items: center;
-        }}
-        
-        .card-title::before {{
-            content: "";
-            display: inline-block;
-            width: 4px;
-            height: 18px;
-            background-color: var(--primary-color);
-            margin-right: 10px;
-            border-radius: 2px;
-        }}
-        
-        .core-content {{
-            font-size: 16px;
-            line-height: 1.8;
-        }}
-        
-        .key-points-list {{
-            list-style: none;
-            margin-top: 12px;
-        }}
-        
-        .key-points-list li {{
-            margin-bottom: 12px;
-            display: flex;
-            align-items: flex-start;
-        }}
-        
-        .point-number {{
-            display: inline-flex;
-            align-items: center;
-            justify-content: center;
-            width: 24px;
-            height: 24px;
-            background-color: var(--primary-color);
-            color: white;
-            border-radius: 50%;
-            font-size: 14px;
-            margin-right: 10px;
-            flex-shrink: 0;
-        }}
-        
-        .point-content {{
-            flex: 1;
-        }}
-        
-        .summary-text {{
-            line-height: 1.8;
-            text-align: justify;
-        }}
-        
-        .conclusion {{
-            font-size: 16px;
-            line-height: 1.8;
-            padding: 16px;
-            background-color: rgba(251, 114, 153, 0.05);
-            border-left: 4px solid var(--primary-color);
-            border-radius: 0 var(--border-radius) var(--border-radius) 0;
-        }}
-        
-        footer {{
-            text-align: center;
-            margin-top: 50px;
-            color: var(--text-secondary);
-            font-size: 14px;
-        }}
-        
-        @media (max-width: 768px) {{
-            body {{
-                padding: 16px;
-            }}
-            
-            h1 {{
-                font-size: 22px;
-            }}
-            
-            .card {{
-                padding: 16px;
-            }}
-        }}
-    </style>
+    <title>{{title}} - 哔哩哔哩视频总结器</title>
+    <link rel="stylesheet" href="{{css_href}}">
 </head>
 <body>
     <div class="container">
         <header>
             <div class="logo">哔哩哔哩视频总结器</div>
-            <h1>{summary.get("标题", "视频摘要")}</h1>
+            <h1>{{title}}</h1>
             <div class="video-info">
-                视频链接：<a href="{video_url}" target="_blank">BV{video_id}</a>
+                视频链接：<a href="{{video_url}}" target="_blank">{{video_id}}</a>
             </div>
         </header>
         
@@ -211,40 +229,167 @@ def generate_html(summary, video_url, subtitle_data=None, output_path=None):
             <section class="card">
                 <h2 class="card-title">核心内容</h2>
                 <div class="core-content">
-                    {summary.get("核心内容", "暂无内容")}
+                    {{core}}
                 </div>
             </section>
             
             <section class="card">
                 <h2 class="card-title">关键点</h2>
                 <ul class="key-points-list">
-                    {key_points_html}
+                    {{key_points}}
                 </ul>
             </section>
             
             <section class="card">
                 <h2 class="card-title">详细摘要</h2>
                 <div class="summary-text">
-                    {summary.get("详细摘要", "暂无内容")}
+                    {{detail}}
                 </div>
             </section>
             
             <section class="card">
                 <h2 class="card-title">结论</h2>
                 <div class="conclusion">
-                    {summary.get("结论", "暂无内容")}
+                    {{conclusion}}
                 </div>
             </section>
+            {{parts}}
         </main>
         
         <footer>
-            由哔哩哔哩视频总结器生成 - {current_time}
+            由哔哩哔哩视频总结器生成 - {{generated_at}}
         </footer>
     </div>
 </body>
 </html>
 """
-    
+
+PART_TEMPLATE = """
+            <section class="card">
+                <h2 class="card-title">{{part}}</h2>
+                <h3 class="part-title">{{title}}</h3>
+                <div class="core-content">{{core}}</div>
+                <ul class="key-points-list">
+                    {{key_points}}
+                </ul>
+            </section>
+"""
+
+_SLOT_RE = re.compile(r"\{\{(\w+)\}\}")
+
+class CompiledTemplate:
+    """
+    预编译的模板，模板中的{{名称}}为插槽
+
+    编译时把模板切分为静态片段和插槽名称，渲染时只需按顺序拼接，不再解析模板。
+    插槽的值需由调用方提前转义。
+    """
+
+    def __init__(self, template):
+        pieces = _SLOT_RE.split(template)
+        self.static = pieces[0::2]
+        self.slots = pieces[1::2]
+
+    def render(self, values):
+        out = [self.static[0]]
+        for slot, static in zip(self.slots, self.static[1:]):
+            out.append(values[slot])
+            out.append(static)
+        return "".join(out)
+
+_page = CompiledTemplate(PAGE_TEMPLATE)
+_part = CompiledTemplate(PART_TEMPLATE)
+
+def _text(value, default=""):
+    """转义LLM输出的文本，非字符串的值先转为字符串"""
+    if value is None or value == "":
+        value = default
+    return html.escape(value if isinstance(value, str) else str(value))
+
+def _key_points(points):
+    return "".join(
+        f'<li><span class="point-number">{i+1}</span><span class="point-content">{_text(point)}</span></li>\n'
+        for i, point in enumerate(points or [])
+    )
+
+def render_html(summary, video_url, css_href=STYLE_PATH, generated_at=None):
+    """
+    将摘要渲染为HTML文本，所有来自LLM的内容都会转义
+
+    参数:
+        summary (dict): 摘要信息字典
+        video_url (str): 视频URL
+        css_href (str): 共享样式表的地址（相对于页面）
+        generated_at (str, optional): 页脚显示的生成时间，默认为当前时间
+
+    返回:
+        str: HTML文本
+    """
+    parts = "".join(
+        _part.render({
+            "part": _text(part.get("分P")),
+            "title": _text(part.get("标题")),
+            "core": _text(part.get("核心内容")),
+            "key_points": _key_points(part.get("关键点"))
+        })
+        for part in summary.get("分P摘要") or []
+    )
+    return _page.render({
+        "title": _text(summary.get("标题"), "视频摘要"),
+        "css_href": html.escape(css_href),
+        "video_url": html.escape(video_url),
+        "video_id": _text(extract_video_id(video_url)),
+        "core": _text(summary.get("核心内容"), "暂无内容"),
+        "key_points": _key_points(summary.get("关键点")),
+        "detail": _text(summary.get("详细摘要"), "暂无内容"),
+        "conclusion": _text(summary.get("结论"), "暂无内容"),
+        "parts": parts,
+        "generated_at": generated_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    })
+
+def write_style(output_dir):
+    """
+    将共享样式表写入输出目录，内容未变化时不重复写入
+
+    返回:
+        str: 样式表路径
+    """
+    path = os.path.join(output_dir, STYLE_PATH)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read() == STYLE_CSS:
+                return path
+    except OSError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_file(path, STYLE_CSS)
+    return path
+
+def _write_file(path, content):
+    """整体编码后一次写入文件"""
+    data = content.encode("utf-8")
+    with open(path, "wb", buffering=0) as f:
+        f.write(data)
+
+def _css_href(page_dir, output_dir):
+    return os.path.relpath(os.path.join(output_dir, STYLE_PATH), page_dir).replace(os.sep, "/")
+
+def generate_html(summary, video_url, subtitle_data=None, output_path=None, output_dir=None, model_name=None):
+    """
+    生成包含视频摘要的HTML页面
+
+    参数:
+        summary (dict): 摘要信息字典
+        video_url (str): 视频URL
+        subtitle_data (dict, optional): 字幕数据
+        output_path (str, optional): 输出文件路径
+        output_dir (str, optional): 输出目录，未指定output_path时使用，默认为当前工作目录
+        model_name (str, optional): 生成摘要的模型，记录在摘要数据中供归档索引显示
+
+    返回:
+        str: 生成的HTML文件路径
+    """
+    video_id = extract_video_id(video_url)
+
     # 确定输出路径
     if not output_path:
         if video_id != "unknown":
@@ -252,14 +397,37 @@ def generate_html(summary, video_url, subtitle_data=None, output_path=None):
         else:
             filename = f"bilibili_summary_{datetime.now().strftime('%Y%m%d%H%M%S')}.html"
         
-        output_path = os.path.join(os.getcwd(), filename)
-    
-    # 写入文件
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(html_content)
-    
+        if output_dir:
+            output_dir = os.path.abspath(output_dir)
+            os.makedirs(output_dir, exist_ok=True)
+        else:
+            output_dir = os.getcwd()
+        output_path = os.path.join(output_dir, filename)
+    else:
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+
+    # 样式表与页面放在同一目录下的static/中
+    generated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    write_style(output_dir)
+    _write_file(output_path, render_html(summary, video_url, _css_href(output_dir, output_dir), generated_at))
+    save_summary_data(output_dir, summary, video_url, model_name, generated_at)
+
     return output_path
 
+def save_summary_data(output_dir, summary, video_url, model_name=None, generated_at=None):
+    """保存摘要数据（连同模型和生成时间），供之后批量重新渲染和构建归档"""
+    data_dir = os.path.join(output_dir, DATA_DIR)
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"{extract_video_id(video_url)}.json")
+    record = {
+        "video_url": video_url,
+        "summary": summary,
+        "model": model_name,
+        "generated_at": generated_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+    _write_file(path, json.dumps(record, ensure_ascii=False))
+    return path
+
 if __name__ == "__main__":
     # 测试函数
     summary = {
@@ -0,0 +1,191 @@
+import os
+import gzip
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from utils.process_subtitle import process_video_subtitles
+from utils.subtitle_tracks import group_parts, select_track
+
+# 批量导入的字幕扩展名（.json可能是其他数据，不自动导入）
+SUBTITLE_EXTENSIONS = (".srt", ".ass", ".ssa", ".bcc")
+
+# 每个任务处理的字幕字节数上限，任务太小时进程间通信开销占比高，太大时各进程负载不均
+CHUNK_BYTES = 4 * 1024 * 1024
+CHUNK_VIDEOS = 64
+
+def find_videos(root, per_dir=False):
+    """
+    遍历目录树，找出每个视频的字幕文件
+
+    默认按文件名分组：同一目录下只有语言标记不同的文件（如"视频A_中文.srt"和"视频A_en-US.srt"）
+    是同一个视频的不同语言轨道，其余文件（包括lesson_1.srt、lesson_2.srt）各自是一个视频。
+    per_dir为True时同一目录下的字幕文件属于同一个视频（yutto的下载目录，多P视频按文件名分P）。
+    每个分P按语言偏好只选出一个轨道，返回的文件列表和字节数只包含实际解析的文件。
+
+    参数:
+        root (str): 根目录
+        per_dir (bool): 是否把每个目录作为一个视频
+
+    返回:
+        list: 每项为(视频ID, 字幕文件列表, 总字节数)，视频ID为相对于根目录的路径
+    """
+    root = os.path.abspath(root)
+    videos = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        files = sorted(os.path.join(dirpath, name) for name in filenames
+                       if name.lower().endswith(SUBTITLE_EXTENSIONS))
+        if not files:
+            continue
+        if per_dir:
+            video_id = os.path.relpath(dirpath, root)
+            if video_id == ".":
+                video_id = os.path.basename(root)
+            selected = [select_track(part["files"]) for part in group_parts(files)]
+            videos.append((video_id, selected, sum(os.path.getsize(path) for path in selected)))
+            continue
+        for group in group_parts(files, language_tags_only=True):
+            video_id = os.path.relpath(os.path.join(dirpath, group["title"]), root)
+            selected = select_track(group["files"])
+            videos.append((video_id, [selected], os.path.getsize(selected)))
+    return videos
+
+def _chunks(videos):
+    """按字节数和视频数把视频分成任务"""
+    chunk, size = [], 0
+    for video in videos:
+        chunk.append(video)
+        size += video[2]
+        if size >= CHUNK_BYTES or len(chunk) >= CHUNK_VIDEOS:
+            yield chunk
+            chunk, size = [], 0
+    if chunk:
+        yield chunk
+
+def _compact(subtitle_data):
+    """去掉可由字幕段落重新拼接的full_text，减小语料体积"""
+    data = {key: value for key, value in subtitle_data.items() if key != "full_text"}
+    if "parts" in data:
+        data["parts"] = [_compact(part) for part in data["parts"]]
+        # 多P视频的subtitles是各分P的拼接，读取时重建
+        data.pop("subtitles", None)
+    return data
+
+def _restore(subtitle_data):
+    """还原_compact去掉的字段"""
+    if "parts" in subtitle_data:
+        subtitle_data["parts"] = [_restore(part) for part in subtitle_data["parts"]]
+        subtitle_data["subtitles"] = [s for part in subtitle_data["parts"] for s in part["subtitles"]]
+        subtitle_data["full_text"] = " ".join(part["full_text"] for part in subtitle_data["parts"])
+    else:
+        subtitle_data["full_text"] = " ".join(s["text"] for s in subtitle_data["subtitles"])
+    return subtitle_data
+
+def _process_chunk(chunk, root):
+    """
+    在子进程中解析一批视频的字幕，并把结果序列化、压缩为一个独立的gzip成员
+
+    返回:
+        tuple: (压缩后的字节, 成功的视频数, 失败列表[(视频ID, 错误信息)])
+    """
+    lines = []
+    errors = []
+    for video_id, files, size in chunk:
+        try:
+            # 进程池已经并行，视频内的分P不再开线程
+            subtitle_data = process_video_subtitles(files, max_workers=1)
+        except Exception as e:
+            errors.append((video_id, str(e)))
+            continue
+        record = {
+            "video_id": video_id,
+            "files": [os.path.relpath(path, root) for path in files],
+            "bytes": size,
+            "subtitle_data": _compact(subtitle_data)
+        }
+        lines.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+    data = "".join(line + "\n" for line in lines).encode("utf-8")
+    return gzip.compress(data, compresslevel=6), len(lines), errors
+
+def _write_results(f, results, stats):
+    for data, count, errors in results:
+        f.write(data)
+        stats["videos"] += count
+        stats["failed"] += len(errors)
+        stats["errors"].extend(errors)
+
+def ingest_directory(root, output_path, workers=None, per_dir=False):
+    """
+    把目录树中的字幕并行解析、合并后写入语料文件
+
+    语料文件是gzip压缩的JSON Lines，每行一个视频：{"video_id", "files", "bytes", "subtitle_data"}，
+    subtitle_data与process_video_subtitles的结果相同但去掉了full_text，用iter_corpus读取时还原。
+    各子进程独立压缩自己的结果，主进程只负责按顺序拼接（多个gzip成员拼接仍是合法的gzip文件）。
+
+    参数:
+        root (str): 字幕根目录
+        output_path (str): 语料文件路径
+        workers (int, optional): 进程数，默认为CPU核数
+        per_dir (bool): 是否把每个目录作为一个视频（yutto的下载目录）
+
+    返回:
+        dict: 导入统计，包含videos、files、bytes、failed、errors、elapsed、files_per_second、mb_per_second
+    """
+    root = os.path.abspath(root)
+    workers = max(1, workers or os.cpu_count() or 1)
+    start = time.perf_counter()
+    videos = find_videos(root, per_dir)
+    stats = {
+        "videos": 0,
+        "files": sum(len(files) for _, files, _ in videos),
+        "bytes": sum(size for _, _, size in videos),
+        "failed": 0,
+        "errors": [],
+        "workers": workers
+    }
+
+    output_path = os.path.abspath(output_path)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = f"{output_path}.tmp"
+    chunks = list(_chunks(videos))
+    with open(tmp_path, "wb") as f:
+        # 只有一个任务或一个进程时直接在当前进程处理，省去启动子进程的开销
+        if workers == 1 or len(chunks) <= 1:
+            results = (_process_chunk(chunk, root) for chunk in chunks)
+            _write_results(f, results, stats)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # 按提交顺序写入，语料中的视频顺序与目录遍历顺序一致
+                _write_results(f, executor.map(_process_chunk, chunks, [root] * len(chunks)), stats)
+    os.replace(tmp_path, output_path)
+
+    elapsed = time.perf_counter() - start
+    stats["elapsed"] = elapsed
+    stats["output_bytes"] = os.path.getsize(output_path)
+    stats["files_per_second"] = stats["files"] / elapsed if elapsed > 0 else 0.0
+    stats["mb_per_second"] = stats["bytes"] / 1024 / 1024 / elapsed if elapsed > 0 else 0.0
+    return stats
+
+def iter_corpus(path):
+    """
+    逐条读取语料文件，不会一次载入整个文件
+
+    返回:
+        generator: 视频记录，subtitle_data中的full_text等字段已还原
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            _restore(record["subtitle_data"])
+            yield record
+
+def print_ingest_stats(stats):
+    """打印导入统计"""
+    print(f"导入 {stats['videos']} 个视频（{stats['files']} 个字幕文件，{stats['bytes'] / 1024 / 1024:.1f}MB），"
+          f"失败 {stats['failed']} 个，{stats['workers']} 个进程，耗时 {stats['elapsed']:.2f}s")
+    print(f"吞吐量: {stats['files_per_second']:.1f} 文件/秒，{stats['mb_per_second']:.2f} MB/秒，"
+          f"语料文件 {stats['output_bytes'] / 1024 / 1024:.1f}MB")
+    for video_id, error in stats["errors"]:
+        print(f"  - {video_id}: {error}")
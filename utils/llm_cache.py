@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from utils.paths import get_cache_dir
+
+# 默认缓存配置，可通过环境变量覆盖
+DEFAULT_MAX_ENTRIES = int(os.environ.get("BILI_LLM_CACHE_MAX_ENTRIES", "5000"))
+DEFAULT_MAX_BYTES = int(float(os.environ.get("BILI_LLM_CACHE_MAX_MB", "200")) * 1024 * 1024)
+DEFAULT_TTL_SECONDS = int(float(os.environ.get("BILI_LLM_CACHE_TTL_DAYS", "30")) * 86400)
+
+def cache_enabled():
+    """是否启用LLM缓存，设置环境变量BILI_LLM_CACHE=0可全局绕过缓存"""
+    return os.environ.get("BILI_LLM_CACHE", "1").lower() not in ("0", "false", "off", "no")
+
+def make_cache_key(model, base_url, temperature, prompt):
+    """
+    根据模型、API地址、温度和提示文本生成缓存键
+
+    参数:
+        model (str): 模型名称
+        base_url (str): API基础URL，None表示官方API
+        temperature (float): 采样温度
+        prompt (str): 提示文本
+
+    返回:
+        str: 内容寻址的缓存键
+    """
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    raw = json.dumps([model, base_url or "", temperature, prompt_hash])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    """基于SQLite的LLM回复缓存，支持按条目数、总大小和过期时间淘汰"""
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                 ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path or os.path.join(get_cache_dir(), "llm_cache.sqlite3")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed_at ON responses (accessed_at)")
+        self._conn.commit()
+
+    def get(self, model, base_url, temperature, prompt):
+        """
+        查询缓存
+
+        返回:
+            str: 缓存的回复内容，未命中或已过期时返回None
+        """
+        key = make_cache_key(model, base_url, temperature, prompt)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl_seconds and now - row[1] > self.ttl_seconds):
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, model, base_url, temperature, prompt, response):
+        """写入缓存，并在超出容量时淘汰最久未访问的条目"""
+        key = make_cache_key(model, base_url, temperature, prompt)
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        """删除过期条目，再按最近访问时间淘汰超出容量的条目"""
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC").fetchall()
+        stale = []
+        for key, size in rows:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            stale.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def invalidate(self, model, base_url, temperature, prompt):
+        """删除指定请求的缓存，例如回复内容无法解析时"""
+        key = make_cache_key(model, base_url, temperature, prompt)
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": count,
+            "bytes": total,
+            "path": self.path
+        }
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_llm_cache():
+    """获取进程内共享的LLM缓存实例"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
+
+if __name__ == "__main__":
+    import sys
+    cache = get_llm_cache()
+    if len(sys.argv) > 1 and sys.argv[1] == "clear":
+        cache.clear()
+        print("LLM缓存已清空")
+    print(json.dumps(cache.stats(), ensure_ascii=False, indent=2))
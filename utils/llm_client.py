@@ -0,0 +1,70 @@
+import os
+import threading
+import openai
+
+try:
+    import httpx
+except ImportError:  # httpx是openai的依赖，缺失时退回openai默认的连接池配置
+    httpx = None
+
+# 连接池与超时配置，可通过环境变量覆盖
+_config = {
+    "max_connections": int(os.environ.get("BILI_LLM_MAX_CONNECTIONS", "20")),
+    "max_keepalive_connections": int(os.environ.get("BILI_LLM_MAX_KEEPALIVE", "10")),
+    "keepalive_expiry": float(os.environ.get("BILI_LLM_KEEPALIVE_EXPIRY", "60")),
+    "timeout": float(os.environ.get("BILI_LLM_TIMEOUT", "120")),
+    "connect_timeout": float(os.environ.get("BILI_LLM_CONNECT_TIMEOUT", "10")),
+}
+
+_clients = {}
+_lock = threading.Lock()
+
+def resolve_api_key(api_key=None):
+    """返回传入的API密钥，未提供时从环境变量OPENAI_API_KEY获取"""
+    if api_key:
+        return api_key
+    api_key_env = os.environ.get("OPENAI_API_KEY")
+    if not api_key_env:
+        raise ValueError("未设置OPENAI_API_KEY环境变量或未提供api_key参数")
+    return api_key_env
+
+def _client_kwargs(api_key, base_url):
+    """构建OpenAI客户端参数，httpx可用时配置连接池上限"""
+    # 重试由utils.rate_limit统一处理（按接口限流、熔断），关闭SDK自带的重试避免重复
+    kwargs = {"api_key": api_key, "max_retries": 0}
+    if base_url:
+        kwargs["base_url"] = base_url
+    if httpx is None:
+        kwargs["timeout"] = _config["timeout"]
+        return kwargs
+
+    limits = httpx.Limits(
+        max_connections=_config["max_connections"],
+        max_keepalive_connections=_config["max_keepalive_connections"],
+        keepalive_expiry=_config["keepalive_expiry"]
+    )
+    timeout = httpx.Timeout(_config["timeout"], connect=_config["connect_timeout"])
+    http_client_cls = getattr(openai, "DefaultHttpxClient", httpx.Client)
+    kwargs["http_client"] = http_client_cls(limits=limits, timeout=timeout)
+    kwargs["timeout"] = timeout
+    return kwargs
+
+def get_client(api_key=None, base_url=None):
+    """
+    获取共享的同步OpenAI客户端，相同(api_key, base_url)复用同一个连接池
+
+    参数:
+        api_key (str, optional): OpenAI API密钥，为None时从环境变量获取
+        base_url (str, optional): API基础URL，为None时使用官方API
+
+    返回:
+        openai.OpenAI: 客户端实例
+    """
+    api_key = resolve_api_key(api_key)
+    key = (api_key, base_url or None)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = openai.OpenAI(**_client_kwargs(api_key, base_url))
+            _clients[key] = client
+        return client
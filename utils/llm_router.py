@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils.llm_client import get_client
+from utils.rate_limit import get_limiter
+
+# 每个接口保留的最近延迟样本数
+LATENCY_WINDOW = 200
+# 样本不足时p95不可靠，使用默认的对冲延迟
+MIN_SAMPLES = 5
+DEFAULT_HEDGE_DELAY = float(os.environ.get("BILI_LLM_HEDGE_DEFAULT", "2.0"))
+MIN_HEDGE_DELAY = 0.05
+# 超过这个秒数没有新样本的接口重新参与探测，避免一次慢请求后被永久冷落
+EXPLORE_AFTER = 30.0
+
+class NoEndpointAvailableError(Exception):
+    """接口池中所有接口都处于熔断状态"""
+
+class Endpoint:
+    """
+    接口池中的一个OpenAI兼容接口，记录最近的延迟
+
+    参数:
+        base_url (str): API基础URL
+        model (str): 该接口使用的模型名称
+        api_key (str, optional): API密钥，默认读取环境变量OPENAI_API_KEY
+        weight (float): 权重，越大越优先（排序时延迟除以权重）
+        name (str, optional): 显示名称，默认为base_url
+    """
+
+    def __init__(self, base_url, model, api_key=None, weight=1.0, name=None):
+        self.base_url = base_url
+        self.model = model
+        self.api_key = api_key
+        self.weight = max(float(weight), 1e-6)
+        self.name = name or base_url
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.ewma = None
+        self.observed_at = 0.0
+        self.stats = {"requests": 0, "wins": 0, "errors": 0, "hedges": 0}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """记录一次成功请求的延迟"""
+        with self._lock:
+            self.latencies.append(seconds)
+            self.ewma = seconds if self.ewma is None else 0.8 * self.ewma + 0.2 * seconds
+            self.observed_at = time.monotonic()
+
+    def observe_error(self):
+        """请求失败时加倍估计延迟，使路由暂时避开该接口"""
+        with self._lock:
+            self.stats["errors"] += 1
+            self.ewma = max((self.ewma or DEFAULT_HEDGE_DELAY) * 2, DEFAULT_HEDGE_DELAY)
+            self.observed_at = time.monotonic()
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def percentile(self, q):
+        """最近延迟的q分位数，样本不足时返回None"""
+        with self._lock:
+            samples = sorted(self.latencies)
+        if len(samples) < MIN_SAMPLES:
+            return None
+        index = min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def score(self):
+        """排序分数，越小越优先；还没有延迟样本或样本已过时的接口优先尝试"""
+        if self.ewma is None or time.monotonic() - self.observed_at > EXPLORE_AFTER:
+            return 0.0
+        return self.ewma / self.weight
+
+    def available(self):
+        return get_limiter(self.base_url, self.model).breaker.state != "open"
+
+    def describe(self):
+        with self._lock:
+            stats = dict(self.stats)
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return dict(stats, name=self.name, model=self.model, weight=self.weight,
+                    p50=round(p50, 3) if p50 is not None else None,
+                    p95=round(p95, 3) if p95 is not None else None)
+
+class LLMRouter:
+    """
+    在多个OpenAI兼容接口之间路由请求
+
+    调用方指定了模型且接口池中有该模型的接口时，只在这些接口之间路由。每个请求发往按(最近延迟 / 权重)排序最优的接口；等待对冲延迟（默认为该接口最近延迟的p95）
+    仍未返回时，向次优接口发送相同的请求，采用先返回的结果。主请求失败时立即改用次优接口。
+    被放弃的请求在后台完成，其延迟仍计入统计。
+
+    参数:
+        endpoints (list): Endpoint列表
+        hedge_delay (str|float): 对冲延迟，"p95"等分位数或固定秒数，"off"表示不对冲
+        max_workers (int): 发送请求的线程数上限
+    """
+
+    def __init__(self, endpoints, hedge_delay="p95", max_workers=32):
+        if not endpoints:
+            raise ValueError("接口池为空")
+        self.endpoints = list(endpoints)
+        self.hedge_delay = hedge_delay
+        # 接口池的标识（各接口的地址和模型），用于区分不同接口池的回复缓存和摘要检查点
+        identity = json.dumps(sorted([e.base_url, e.model] for e in self.endpoints))
+        self.identity = hashlib.sha256(identity.encode("utf-8")).hexdigest()[:16]
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-router")
+
+    def candidates(self, model=None):
+        """可以处理该模型请求的接口：接口池中有该模型的接口时只用这些接口，否则为全部接口"""
+        if model:
+            matching = [e for e in self.endpoints if e.model == model]
+            if matching:
+                return matching
+        return self.endpoints
+
+    def ranked(self, model=None):
+        """可用接口按优先级排序，全部熔断时抛出NoEndpointAvailableError"""
+        available = [e for e in self.candidates(model) if e.available()]
+        if not available:
+            raise NoEndpointAvailableError("所有LLM接口都处于熔断状态")
+        return sorted(available, key=lambda e: (e.score(), -e.weight))
+
+    def hedge_delay_for(self, endpoint):
+        """
+        主请求发出后等待多久再发送对冲请求
+
+        返回:
+            float: 等待秒数，不对冲时为None
+        """
+        setting = str(self.hedge_delay).lower()
+        if setting in ("off", "none", "0", ""):
+            return None
+        if setting.startswith("p"):
+            delay = endpoint.percentile(float(setting[1:]))
+            if delay is None:
+                delay = DEFAULT_HEDGE_DELAY
+        else:
+            delay = float(setting)
+        return max(MIN_HEDGE_DELAY, delay)
+
+    def _request(self, endpoint, messages, temperature):
+        endpoint.count("requests")
+        client = get_client(endpoint.api_key, endpoint.base_url)
+
+        def attempt():
+            start = time.perf_counter()
+            response = client.chat.completions.create(
+                model=endpoint.model,
+                messages=messages,
+                temperature=temperature,
+            )
+            endpoint.observe(time.perf_counter() - start)
+            return response
+
+        try:
+            return get_limiter(endpoint.base_url, endpoint.model).call(attempt)
+        except Exception:
+            endpoint.observe_error()
+            raise
+
+    def _submit(self, endpoint, messages, temperature):
+        # 在当前上下文中执行，LLM用量仍归到发起请求的节点上
+        context = contextvars.copy_context()
+        return self.executor.submit(context.run, self._request, endpoint, messages, temperature)
+
+    def complete(self, messages, temperature, model=None):
+        """
+        发送一次非流式的chat completion请求
+
+        参数:
+            messages (list): 消息列表
+            temperature (float): 采样温度
+            model (str, optional): 调用方指定的模型
+
+        返回:
+            tuple: (回复对象, 返回结果的Endpoint)
+        """
+        ranked = self.ranked(model)
+        primary = ranked[0]
+        backups = ranked[1:2]
+        futures = {self._submit(primary, messages, temperature): primary}
+        timeout = self.hedge_delay_for(primary) if backups else None
+        last_error = None
+
+        while futures:
+            done, _ = wait(list(futures), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                endpoint = futures.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                endpoint.count("wins")
+                return response, endpoint
+            # 超过对冲延迟或主请求失败：向次优接口发送同样的请求
+            if backups and (not done or not futures):
+                backup = backups.pop()
+                backup.count("hedges")
+                futures[self._submit(backup, messages, temperature)] = backup
+            timeout = None
+        raise last_error
+
+    def stats(self):
+        """各接口的请求数、胜出次数、失败次数、作为对冲目标的次数和延迟分位数"""
+        return [endpoint.describe() for endpoint in self.endpoints]
+
+def load_endpoints(spec):
+    """
+    解析接口池配置
+
+    参数:
+        spec (str): JSON文件路径或JSON文本。内容为接口列表，每项包含base_url、model，
+            可选weight、name、api_key或api_key_env（保存API密钥的环境变量名）；
+            也可以是{"endpoints": [...], "hedge_delay": "p95"}
+
+    返回:
+        tuple: (Endpoint列表, 对冲延迟设置)
+    """
+    text = spec
+    if not spec.lstrip().startswith(("[", "{")):
+        with open(spec, "r", encoding="utf-8") as f:
+            text = f.read()
+    config = json.loads(text)
+    hedge_delay = os.environ.get("BILI_LLM_HEDGE_DELAY", "p95")
+    if isinstance(config, dict):
+        hedge_delay = config.get("hedge_delay", hedge_delay)
+        config = config.get("endpoints", [])
+
+    endpoints = []
+    for item in config:
+        if not item.get("base_url") or not item.get("model"):
+            raise ValueError(f"接口配置缺少base_url或model: {item}")
+        api_key = item.get("api_key")
+        if not api_key and item.get("api_key_env"):
+            api_key = os.environ.get(item["api_key_env"])
+        endpoints.append(Endpoint(item["base_url"], item["model"], api_key,
+                                  item.get("weight", 1.0), item.get("name")))
+    return endpoints, hedge_delay
+
+_router = None
+_router_spec = None
+_router_lock = threading.Lock()
+
+def get_router():
+    """
+    获取环境变量BILI_LLM_ENDPOINTS配置的共享路由器
+
+    返回:
+        LLMRouter: 路由器，未配置接口池时为None
+    """
+    global _router, _router_spec
+    spec = os.environ.get("BILI_LLM_ENDPOINTS")
+    if not spec:
+        return None
+    with _router_lock:
+        if _router is None or spec != _router_spec:
+            endpoints, hedge_delay = load_endpoints(spec)
+            if _router is not None:
+                # 进行中的请求继续完成，不再接受新请求，空闲线程随后退出
+                _router.executor.shutdown(wait=False)
+            _router = LLMRouter(endpoints, hedge_delay)
+            _router_spec = spec
+        return _router
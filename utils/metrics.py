@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import threading
+import contextvars
+
+# 当前节点运行的LLM用量累加器，call_llm通过它把token数归到正在运行的节点上
+_current_usage = contextvars.ContextVar("bilibili_llm_usage", default=None)
+
+PHASES = ("prep", "exec", "post")
+
+def payload_size(obj):
+    """估算节点输入/输出的字节数"""
+    if obj is None:
+        return 0
+    if isinstance(obj, bytes):
+        return len(obj)
+    if isinstance(obj, str):
+        return len(obj.encode("utf-8"))
+    try:
+        return len(json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return 0
+
+class MetricsRecorder:
+    """
+    记录节点运行指标，同时输出JSON Lines明细和Prometheus文本格式的汇总
+
+    参数:
+        output_dir (str): 指标输出目录，明细写入metrics.jsonl，汇总写入metrics.prom
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = os.path.abspath(output_dir)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.jsonl_path = os.path.join(self.output_dir, "metrics.jsonl")
+        self.prom_path = os.path.join(self.output_dir, "metrics.prom")
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def record(self, entry):
+        """写入一条节点运行记录并更新汇总"""
+        with self._lock:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+            totals = self._totals.setdefault(entry["node"], {
+                "runs": 0, "errors": 0, "bytes_in": 0, "bytes_out": 0,
+                "llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                "llm_retries": 0, "llm_throttle_seconds": 0.0,
+                "wall": dict.fromkeys(PHASES, 0.0), "cpu": dict.fromkeys(PHASES, 0.0)
+            })
+            totals["runs"] += 1
+            totals["errors"] += 1 if entry["error"] else 0
+            totals["bytes_in"] += entry["bytes_in"]
+            totals["bytes_out"] += entry["bytes_out"]
+            totals["llm_calls"] += entry["llm_calls"]
+            totals["prompt_tokens"] += entry["prompt_tokens"]
+            totals["completion_tokens"] += entry["completion_tokens"]
+            totals["llm_retries"] += entry["llm_retries"]
+            totals["llm_throttle_seconds"] += entry["llm_throttle_seconds"]
+            for phase in PHASES:
+                totals["wall"][phase] += entry["wall_seconds"][phase]
+                totals["cpu"][phase] += entry["cpu_seconds"][phase]
+            self._write_prometheus()
+
+    def _write_prometheus(self):
+        """以Prometheus文本格式覆盖写入汇总指标"""
+        metrics = [
+            ("bilibili_node_runs_total", "counter", "节点运行次数", "runs"),
+            ("bilibili_node_errors_total", "counter", "节点运行失败次数", "errors"),
+            ("bilibili_node_bytes_in_total", "counter", "节点输入字节数", "bytes_in"),
+            ("bilibili_node_bytes_out_total", "counter", "节点输出字节数", "bytes_out"),
+            ("bilibili_llm_calls_total", "counter", "LLM调用次数", "llm_calls"),
+            ("bilibili_llm_prompt_tokens_total", "counter", "LLM提示token数", "prompt_tokens"),
+            ("bilibili_llm_completion_tokens_total", "counter", "LLM生成token数", "completion_tokens"),
+            ("bilibili_llm_retries_total", "counter", "LLM调用重试次数", "llm_retries"),
+            ("bilibili_llm_throttle_seconds_total", "counter", "LLM调用因限流和退避等待的秒数", "llm_throttle_seconds"),
+        ]
+        lines = []
+        for name, metric_type, help_text, key in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for node, totals in sorted(self._totals.items()):
+                lines.append(f'{name}{{node="{node}"}} {totals[key]}')
+        for name, help_text, key in (
+            ("bilibili_node_wall_seconds_total", "节点各阶段累计耗时（秒）", "wall"),
+            ("bilibili_node_cpu_seconds_total", "节点各阶段累计CPU时间（秒）", "cpu"),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for node, totals in sorted(self._totals.items()):
+                for phase in PHASES:
+                    lines.append(f'{name}{{node="{node}",phase="{phase}"}} {totals[key][phase]:.6f}')
+
+        tmp_path = self.prom_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prom_path)
+
+_recorder = MetricsRecorder(os.environ["BILI_METRICS_DIR"]) if os.environ.get("BILI_METRICS_DIR") else None
+
+def enable_metrics(output_dir):
+    """启用指标记录，也可以通过环境变量BILI_METRICS_DIR启用"""
+    global _recorder
+    _recorder = MetricsRecorder(output_dir)
+    return _recorder
+
+def disable_metrics():
+    """停用指标记录"""
+    global _recorder
+    _recorder = None
+
+def metrics_enabled():
+    """是否启用了指标记录"""
+    return _recorder is not None
+
+def record_llm_usage(usage):
+    """
+    记录一次LLM调用的token用量，归到当前正在运行的节点上
+
+    参数:
+        usage: OpenAI回复中的usage对象，可能为None（如流式输出或兼容服务未返回）
+    """
+    accumulator = _current_usage.get()
+    if accumulator is None:
+        return
+    with accumulator["lock"]:
+        accumulator["llm_calls"] += 1
+        if usage is not None:
+            accumulator["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+            accumulator["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+def record_llm_throttle(seconds, retries):
+    """
+    记录LLM调用因限流、Retry-After和退避等待的时间，归到当前正在运行的节点上
+
+    参数:
+        seconds (float): 等待的秒数
+        retries (int): 重试次数
+    """
+    accumulator = _current_usage.get()
+    if accumulator is None or (not seconds and not retries):
+        return
+    with accumulator["lock"]:
+        accumulator["llm_retries"] += retries
+        accumulator["llm_throttle_seconds"] += seconds
+
+def run_instrumented(node, shared):
+    """
+    执行节点的prep/exec/post并记录耗时、CPU时间、输入输出字节数和LLM用量
+
+    参数:
+        node: PocketFlow节点
+        shared (dict): 共享数据
+
+    返回:
+        post的返回值
+    """
+    # CPU时间使用thread_time，只统计运行节点的线程，批量模式下各视频互不干扰
+    accumulator = {"lock": threading.Lock(), "llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                   "llm_retries": 0, "llm_throttle_seconds": 0.0}
+    token = _current_usage.set(accumulator)
+    wall = {}
+    cpu = {}
+    try:
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        prep_res = node.prep(shared)
+        wall["prep"], cpu["prep"] = time.perf_counter() - wall_start, time.thread_time() - cpu_start
+
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        exec_res = node._exec(prep_res)
+        wall["exec"], cpu["exec"] = time.perf_counter() - wall_start, time.thread_time() - cpu_start
+
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        action = node.post(shared, prep_res, exec_res)
+        wall["post"], cpu["post"] = time.perf_counter() - wall_start, time.thread_time() - cpu_start
+    finally:
+        _current_usage.reset(token)
+
+    recorder = _recorder
+    if recorder is not None:
+        recorder.record({
+            "timestamp": time.time(),
+            "node": type(node).__name__,
+            "video_url": shared.get("video_url"),
+            "wall_seconds": wall,
+            "cpu_seconds": cpu,
+            "bytes_in": payload_size(prep_res),
+            "bytes_out": payload_size(exec_res),
+            "llm_calls": accumulator["llm_calls"],
+            "prompt_tokens": accumulator["prompt_tokens"],
+            "completion_tokens": accumulator["completion_tokens"],
+            "llm_retries": accumulator["llm_retries"],
+            "llm_throttle_seconds": accumulator["llm_throttle_seconds"],
+            "error": isinstance(exec_res, dict) and "error" in exec_res
+        })
+    return action
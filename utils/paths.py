@@ -0,0 +1,19 @@
+import os
+
+def get_cache_dir(*parts):
+    """
+    获取本地缓存目录，不存在时自动创建
+
+    参数:
+        *parts (str): 缓存根目录下的子目录
+
+    返回:
+        str: 缓存目录的绝对路径，根目录可通过环境变量BILI_SUMMARY_CACHE_DIR指定，
+             默认为~/.cache/bilibili_summarizer
+    """
+    base_dir = os.environ.get("BILI_SUMMARY_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "bilibili_summarizer"
+    )
+    path = os.path.abspath(os.path.join(base_dir, *parts))
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -2,6 +2,162 @@ import re
 import os
 import json
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from utils.timeline import CueTimeline, format_timestamp
+from utils.subtitle_tracks import group_parts, select_track
+
+# 每次读取的字符数
+SRT_CHUNK_SIZE = 1 << 18
+
+# 字幕块之间的空行（允许只含空白字符）
+_BLANK_LINE_RE = re.compile(r'\n[ \t]*\n\s*')
+# 流式解析时的切分点
+_BLOCK_END_RE = re.compile(r'\n[ \t]*\n')
+# 非标准时间轴行（小时位数不同、毫秒不足三位等）的兜底解析
+_TIMING_RE = re.compile(
+    r'(\d+):(\d{2}):(\d{2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{2}):(\d{2})[,.](\d{1,3})'
+)
+
+# 标准时间戳各字段到毫秒数的查找表，比逐个int()转换更快
+_HOURS_MS = {f"{i:02d}": i * 3600000 for i in range(100)}
+_MINUTES_MS = {f"{i:02d}": i * 60000 for i in range(60)}
+_SECONDS_MS = {f"{i:02d}": i * 1000 for i in range(60)}
+_MILLIS = {f"{i:03d}": i for i in range(1000)}
+
+# ASS覆盖标签（如{\b1}、{\pos(10,20)}）和转义字符（\N换行、\h硬空格）
+_ASS_TAG_RE = re.compile(r'\{[^}]*\}')
+_ASS_ESCAPE_RE = re.compile(r'\\[Nnh]')
+# 绘图模式（{\p1}等）下的文本是矢量图形指令，不是字幕
+_ASS_DRAWING_RE = re.compile(r'\{[^}]*\\p[1-9][^}]*\}')
+_ASS_DEFAULT_FIELDS = ['layer', 'start', 'end', 'style', 'name', 'marginl', 'marginr', 'marginv', 'effect', 'text']
+
+_FORMAT_BY_EXTENSION = {
+    '.srt': 'srt',
+    '.ass': 'ass',
+    '.ssa': 'ass',
+    '.json': 'bcc',
+    '.bcc': 'bcc'
+}
+
+class Cue:
+    """单条字幕，时间以整数毫秒保存"""
+    __slots__ = ('index', 'start_ms', 'end_ms', 'text')
+
+    def __init__(self, index, start_ms, end_ms, text):
+        self.index = index
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.text = text
+
+    @property
+    def start_time(self):
+        return format_timestamp(self.start_ms)
+
+    @property
+    def end_time(self):
+        return format_timestamp(self.end_ms)
+
+    def to_dict(self):
+        """转换为字典形式"""
+        return {
+            'index': self.index,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'text': self.text
+        }
+
+    def __repr__(self):
+        return f"Cue({self.index}, {self.start_ms}, {self.end_ms}, {self.text!r})"
+
+def _parse_timing(line):
+    """解析SRT时间轴行，返回(开始毫秒, 结束毫秒)，格式不正确时返回None"""
+    match = _TIMING_RE.search(line)
+    if not match:
+        return None
+    h1, m1, s1, f1, h2, m2, s2, f2 = match.groups()
+    # 毫秒部分可能不足三位（如",5"表示500毫秒）
+    return (
+        ((int(h1) * 60 + int(m1)) * 60 + int(s1)) * 1000 + int(f1.ljust(3, '0')),
+        ((int(h2) * 60 + int(m2)) * 60 + int(s2)) * 1000 + int(f2.ljust(3, '0'))
+    )
+
+def _parse_srt_blocks(text, cues, offset=0):
+    """解析若干完整的SRT字幕块，追加到cues列表中，offset为此前已解析的字幕数"""
+    hours, minutes, seconds, millis = _HOURS_MS, _MINUTES_MS, _SECONDS_MS, _MILLIS
+    for block in _BLANK_LINE_RE.split(text):
+        lines = block.strip().split('\n')
+        # 序号行可能缺失，此时第一行即为时间轴
+        if lines[0].isdigit():
+            index = int(lines[0])
+            del lines[0]
+        else:
+            index = offset + len(cues) + 1
+        if len(lines) < 2:
+            continue
+
+        # 快速路径：标准格式"HH:MM:SS,mmm --> HH:MM:SS,mmm"，否则用正则兜底
+        line = lines[0]
+        try:
+            if len(line) != 29 or line[12:17] != ' --> ':
+                raise KeyError(line)
+            start_ms = hours[line[0:2]] + minutes[line[3:5]] + seconds[line[6:8]] + millis[line[9:12]]
+            end_ms = hours[line[17:19]] + minutes[line[20:22]] + seconds[line[23:25]] + millis[line[26:29]]
+        except KeyError:
+            timing = _parse_timing(line)
+            if timing is None:
+                continue
+            start_ms, end_ms = timing
+
+        if len(lines) == 2:
+            text_part = lines[1].strip()
+        else:
+            text_part = ' '.join(l.strip() for l in lines[1:] if l.strip())
+        if text_part:
+            cues.append(Cue(index, start_ms, end_ms, text_part))
+
+def iter_srt(srt_file, chunk_size=SRT_CHUNK_SIZE):
+    """
+    分块流式解析SRT字幕文件
+
+    按块读取文件，只在空行（允许只含空格或制表符）处切分，内存占用只与块大小有关，与文件大小无关。
+    兼容CRLF换行和UTF-8 BOM；缺少时间轴或文本的损坏字幕块会被直接跳过，不需要二次扫描。
+
+    参数:
+        srt_file (str): SRT文件路径
+        chunk_size (int): 每次读取的字符数
+
+    返回:
+        generator: 逐条产出Cue对象
+    """
+    cues = []
+    buffer = ''
+    count = 0
+    # 缓冲区中scan之前的部分已经查找过，不会再出现切分点
+    scan = 0
+    # utf-8-sig自动去除BOM，通用换行模式统一处理\r\n
+    with open(srt_file, 'r', encoding='utf-8-sig') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            buffer += chunk
+            match = None
+            for match in _BLOCK_END_RE.finditer(buffer, scan):
+                pass
+            if match is None:
+                # 下次从最后一个换行处继续查找，跨越两次读取的空行不会漏掉
+                newline = buffer.rfind('\n', scan)
+                scan = newline if newline >= 0 else len(buffer)
+                continue
+            _parse_srt_blocks(buffer[:match.start()], cues, count)
+            buffer = buffer[match.end():]
+            scan = 0
+            count += len(cues)
+            yield from cues
+            cues = []
+
+    _parse_srt_blocks(buffer, cues, count)
+    yield from cues
 
 def parse_srt(srt_file):
     """
@@ -11,87 +167,185 @@ def parse_srt(srt_file):
         srt_file (str): SRT文件路径
         
     返回:
-        list: 包含字幕内容和时间戳的列表
+        list: Cue对象列表，包含字幕序号、起止毫秒数和文本
     """
-    with open(srt_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # 分割字幕块
-    subtitle_blocks = re.split(r'\n\s*\n', content.strip())
-    subtitles = []
-    
-    for block in subtitle_blocks:
-        lines = block.strip().split('\n')
-        if len(lines) < 3:
+    return list(iter_srt(srt_file))
+
+def _parse_ass_time(time_str):
+    """将ASS时间（H:MM:SS.cc）解析为毫秒数"""
+    hms, _, fraction = time_str.strip().partition('.')
+    h, m, sec = hms.split(':')
+    # ASS时间通常精确到百分之一秒
+    return ((int(h) * 60 + int(m)) * 60 + int(sec)) * 1000 + int(fraction.ljust(3, '0')[:3] or 0)
+
+def _clean_ass_text(text):
+    """去除ASS覆盖标签，并把换行和硬空格转换为普通空格"""
+    if '{' in text:
+        text = _ASS_TAG_RE.sub('', text)
+    if '\\' in text:
+        text = _ASS_ESCAPE_RE.sub(' ', text)
+    return ' '.join(text.split())
+
+def iter_ass(ass_file):
+    """
+    流式解析ASS/SSA字幕文件中的对话行
+
+    按[Events]段的Format行确定字段顺序，去除{\\b1}等覆盖标签，跳过注释和绘图指令。
+
+    参数:
+        ass_file (str): ASS/SSA文件路径
+
+    返回:
+        generator: 按文件顺序逐条产出Cue对象
+    """
+    in_events = False
+    fields = _ASS_DEFAULT_FIELDS
+    count = 0
+    with open(ass_file, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('['):
+                in_events = line.lower() == '[events]'
+                continue
+            if not in_events:
+                continue
+
+            key, sep, value = line.partition(':')
+            if not sep:
+                continue
+            key = key.strip().lower()
+            if key == 'format':
+                fields = [name.strip().lower() for name in value.split(',')]
+                continue
+            if key != 'dialogue':
+                continue
+
+            # Text是最后一个字段，其中可能包含逗号
+            values = value.split(',', len(fields) - 1)
+            if len(values) != len(fields):
+                continue
+            event = dict(zip(fields, values))
+            raw_text = event.get('text', '')
+            if _ASS_DRAWING_RE.search(raw_text):
+                continue
+            try:
+                start_ms = _parse_ass_time(event['start'])
+                end_ms = _parse_ass_time(event['end'])
+            except (KeyError, ValueError):
+                continue
+            text = _clean_ass_text(raw_text)
+            if not text:
+                continue
+            count += 1
+            yield Cue(count, start_ms, end_ms, text)
+
+def parse_ass(ass_file):
+    """
+    解析ASS/SSA字幕文件
+
+    参数:
+        ass_file (str): ASS/SSA文件路径
+
+    返回:
+        list: 按开始时间排序的Cue对象列表，结构与parse_srt相同
+    """
+    return sorted(iter_ass(ass_file), key=lambda cue: cue.start_ms)
+
+def iter_bcc(bcc_file):
+    """
+    解析B站BCC/JSON格式字幕
+
+    BCC字幕形如{"body": [{"from": 0.5, "to": 2.3, "content": "..."}]}，时间单位为秒。
+
+    参数:
+        bcc_file (str): BCC/JSON文件路径
+
+    返回:
+        generator: 逐条产出Cue对象
+    """
+    with open(bcc_file, 'r', encoding='utf-8-sig') as f:
+        data = json.load(f)
+    yield from bcc_to_cues(data)
+
+def bcc_to_cues(data):
+    """
+    将已加载的BCC字幕数据转换为Cue对象
+
+    参数:
+        data (dict|list): BCC字幕JSON对象，或其中的body列表
+
+    返回:
+        generator: 逐条产出Cue对象
+    """
+    body = data.get('body', []) if isinstance(data, dict) else data
+    count = 0
+    for item in body:
+        try:
+            start_ms = int(round(float(item['from']) * 1000))
+            end_ms = int(round(float(item['to']) * 1000))
+        except (KeyError, TypeError, ValueError):
             continue
-        
-        # 第一行是序号
-        index = lines[0]
-        
-        # 第二行是时间戳
-        time_line = lines[1]
-        time_match = re.match(r'(\d{2}:\d{2}:\d{2},\d{3}) --> (\d{2}:\d{2}:\d{2},\d{3})', time_line)
-        if not time_match:
+        text = ' '.join(str(item.get('content', '')).split())
+        if not text:
             continue
-            
-        start_time, end_time = time_match.groups()
-        
-        # 剩余行是字幕文本
-        text = ' '.join(lines[2:])
-        
-        subtitles.append({
-            'index': index,
-            'start_time': start_time,
-            'end_time': end_time,
-            'text': text
-        })
-    
-    return subtitles
+        count += 1
+        yield Cue(count, start_ms, end_ms, text)
+
+def parse_bcc(bcc_file):
+    """
+    解析B站BCC/JSON格式字幕
+
+    参数:
+        bcc_file (str): BCC/JSON文件路径
+
+    返回:
+        list: 按开始时间排序的Cue对象列表，结构与parse_srt相同
+    """
+    return sorted(iter_bcc(bcc_file), key=lambda cue: cue.start_ms)
+
+def detect_subtitle_format(subtitle_file):
+    """
+    根据文件内容判断字幕格式，内容无法判断时再参考扩展名
+
+    参数:
+        subtitle_file (str): 字幕文件路径
+
+    返回:
+        str: 'srt'、'ass'或'bcc'
+
+    异常:
+        ValueError: 无法识别的字幕格式
+    """
+    with open(subtitle_file, 'r', encoding='utf-8-sig', errors='replace') as f:
+        head = f.read(4096).lstrip()
+
+    if head.startswith(('{', '[{')) or head == '[]':
+        return 'bcc'
+    if head.startswith('[') and ('[Events]' in head or '[Script Info]' in head or '[V4' in head):
+        return 'ass'
+    if 'Dialogue:' in head:
+        return 'ass'
+    if _TIMING_RE.search(head):
+        return 'srt'
+
+    file_ext = os.path.splitext(subtitle_file)[1].lower()
+    if file_ext in _FORMAT_BY_EXTENSION:
+        return _FORMAT_BY_EXTENSION[file_ext]
+    raise ValueError(f"暂不支持的字幕格式: {file_ext}")
 
 def combine_subtitles(subtitles, max_gap_seconds=2):
     """
     合并相近的字幕行，形成更连贯的段落
     
     参数:
-        subtitles (list): 字幕列表
+        subtitles (iterable): Cue对象列表或iter_srt返回的生成器
         max_gap_seconds (int): 合并的最大时间间隔（秒）
         
     返回:
         list: 合并后的字幕列表
     """
-    if not subtitles:
-        return []
-    
-    def time_to_seconds(time_str):
-        """将时间字符串转换为秒数"""
-        h, m, s = time_str.replace(',', '.').split(':')
-        return int(h) * 3600 + int(m) * 60 + float(s)
-    
-    combined = []
-    current_group = {
-        'start_time': subtitles[0]['start_time'],
-        'end_time': subtitles[0]['end_time'],
-        'text': subtitles[0]['text']
-    }
-    
-    for i in range(1, len(subtitles)):
-        current_end = time_to_seconds(current_group['end_time'])
-        next_start = time_to_seconds(subtitles[i]['start_time'])
-        
-        # 如果时间间隔小于阈值，则合并
-        if next_start - current_end <= max_gap_seconds:
-            current_group['end_time'] = subtitles[i]['end_time']
-            current_group['text'] += ' ' + subtitles[i]['text']
-        else:
-            combined.append(current_group)
-            current_group = {
-                'start_time': subtitles[i]['start_time'],
-                'end_time': subtitles[i]['end_time'],
-                'text': subtitles[i]['text']
-            }
-    
-    combined.append(current_group)
-    return combined
+    timeline = CueTimeline.from_cues(subtitles, max_gap_ms=max_gap_seconds * 1000)
+    return timeline.to_segments()
 
 def process_subtitle_file(subtitle_file):
     """
@@ -103,26 +357,58 @@ def process_subtitle_file(subtitle_file):
     返回:
         dict: 处理后的字幕信息
     """
-    file_ext = os.path.splitext(subtitle_file)[1].lower()
-    
-    if file_ext == '.srt':
-        # 解析SRT文件
-        subtitles = parse_srt(subtitle_file)
-        
-        # 合并相近的字幕
-        combined_subtitles = combine_subtitles(subtitles)
-        
-        # 提取纯文本用于摘要
-        full_text = ' '.join([s['text'] for s in combined_subtitles])
-        
-        return {
-            'subtitle_file': subtitle_file,
-            'subtitles': combined_subtitles,
-            'full_text': full_text
-        }
+    subtitle_format = detect_subtitle_format(subtitle_file)
+
+    if subtitle_format == 'srt':
+        # 流式解析SRT文件
+        cues = iter_srt(subtitle_file)
+    elif subtitle_format == 'ass':
+        cues = parse_ass(subtitle_file)
     else:
-        # 目前只支持SRT格式
-        raise ValueError(f"暂不支持的字幕格式: {file_ext}")
+        cues = parse_bcc(subtitle_file)
+
+    # 合并相近的字幕
+    combined_subtitles = combine_subtitles(cues)
+
+    # 提取纯文本用于摘要
+    full_text = ' '.join([s['text'] for s in combined_subtitles])
+
+    return {
+        'subtitle_file': subtitle_file,
+        'format': subtitle_format,
+        'subtitles': combined_subtitles,
+        'full_text': full_text
+    }
+
+def process_video_subtitles(subtitle_files, max_workers=8):
+    """
+    处理一个视频的全部字幕文件：按分P分组，每个分P按语言偏好和质量选出一个轨道，并行解析
+
+    参数:
+        subtitle_files (list): 字幕文件路径列表
+        max_workers (int): 同时解析的分P数量上限
+
+    返回:
+        dict: 单P视频与process_subtitle_file的结果相同；多P视频另有parts字段按顺序列出
+        各分P的字幕信息（含title），subtitles和full_text为各分P依次拼接的结果
+    """
+    parts = group_parts(subtitle_files)
+    selected = [select_track(part["files"]) for part in parts]
+    if len(selected) == 1:
+        return process_subtitle_file(selected[0])
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(selected)))) as executor:
+        results = list(executor.map(process_subtitle_file, selected))
+    for part, result in zip(parts, results):
+        result['title'] = part['title']
+
+    return {
+        'subtitle_file': selected[0],
+        'format': results[0]['format'],
+        'parts': results,
+        'subtitles': [segment for result in results for segment in result['subtitles']],
+        'full_text': ' '.join(result['full_text'] for result in results)
+    }
 
 if __name__ == "__main__":
     # 测试函数
@@ -0,0 +1,182 @@
+import os
+import math
+import heapq
+import threading
+from collections import OrderedDict
+from utils.paths import get_cache_dir
+from utils.checkpoint import data_digest
+from utils.timeline import format_timestamp
+from utils.search_index import (
+    KIND_SUBTITLE, BM25_K1, BM25_B, TOKENIZER_VERSION, Segment, tokenize, write_segment
+)
+
+# 检索单位：相邻字幕段落合并成的时间窗口，窗口跨度达到该毫秒数后开始新窗口
+WINDOW_MS = int(float(os.environ.get("BILI_QA_WINDOW_SECONDS", "30")) * 1000)
+
+# 每个问题发送给LLM的窗口数量
+DEFAULT_TOP_K = 4
+
+# 出现在超过这个比例窗口中的词（如“这个”“我们”）对排序几乎没有作用，跳过以免读取很长的倒排表
+MAX_DF_RATIO = 0.5
+
+# 进程内保持打开的视频索引数量
+MAX_OPEN_INDEXES = 32
+
+ANSWER_PROMPT = """你是一个视频内容问答助手。以下是视频《{title}》的字幕中与问题最相关的几个片段，每个片段前标注了开始时间：
+
+{context}
+
+请只根据以上字幕片段回答问题，并在相应的句子后用方括号标注依据的片段时间，例如[00:01:30]。
+如果片段中没有回答问题所需的信息，请直接说明无法从字幕中找到答案，不要编造。
+
+问题：{question}
+"""
+
+def build_windows(subtitle_data, window_ms=WINDOW_MS):
+    """
+    把字幕段落按时间合并为检索窗口，多P视频的窗口不跨越分P
+
+    参数:
+        subtitle_data (dict): process_video_subtitles或process_subtitle_file的结果
+        window_ms (int): 窗口跨度（毫秒）
+
+    返回:
+        list: (分P, 开始毫秒, 文本)列表，单P视频的分P为0
+    """
+    parts = subtitle_data.get("parts") or [subtitle_data]
+    windows = []
+    for i, part in enumerate(parts):
+        part_number = i + 1 if subtitle_data.get("parts") else 0
+        start_ms = None
+        texts = []
+        for segment in part.get("subtitles") or []:
+            if start_ms is not None and segment["start_ms"] - start_ms >= window_ms:
+                windows.append((part_number, start_ms, " ".join(texts)))
+                start_ms, texts = None, []
+            if start_ms is None:
+                start_ms = segment["start_ms"]
+            texts.append(segment["text"])
+        if texts:
+            windows.append((part_number, start_ms, " ".join(texts)))
+    return windows
+
+def cite(part, start_ms):
+    """片段的时间标注，多P视频带上分P编号"""
+    timestamp = format_timestamp(start_ms)[:8]
+    return f"P{part} {timestamp}" if part else timestamp
+
+class VideoQAIndex:
+    """
+    单个视频字幕的BM25索引
+
+    索引保存为search_index格式的段文件（每个检索窗口是一个单元），以内存映射打开，
+    检索只读取问题中各词的倒排表和命中的窗口，耗时与视频长度无关。
+
+    参数:
+        path (str): 段文件路径
+    """
+
+    def __init__(self, path):
+        self.segment = Segment(path)
+        self.avg_len = self.segment.total_tokens / max(self.segment.n_units, 1)
+
+    def retrieve(self, question, top_k=DEFAULT_TOP_K):
+        """
+        检索与问题最相关的窗口
+
+        返回:
+            list: 按时间排序的{"part", "start_ms", "text", "score"}列表
+        """
+        segment = self.segment
+        n_units = segment.n_units
+        scores = {}
+        # 问题是自然语言，单字和二元组一起参与打分：单字保证召回（如“狗呢”中的“狗”），二元组提高相关片段的排名
+        for term in dict.fromkeys(tokenize(question)):
+            info = segment.term_info(term)
+            if info is None or (n_units >= 10 and info[1] > n_units * MAX_DF_RATIO):
+                continue
+            df = info[1]
+            idf = math.log(1 + (n_units - df + 0.5) / (df + 0.5))
+            for unit_id, tf in segment.postings(term, info):
+                length = segment.unit(unit_id)[6]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / self.avg_len)
+                scores[unit_id] = scores.get(unit_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        hits = []
+        for unit_id, score in heapq.nlargest(top_k, scores.items(), key=lambda item: item[1]):
+            unit = segment.unit(unit_id)
+            hits.append({"part": unit[1], "start_ms": unit[3], "text": segment.text(unit), "score": round(score, 4)})
+        hits.sort(key=lambda hit: (hit["part"], hit["start_ms"]))
+        return hits
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def get_video_index(video_id, subtitle_data):
+    """
+    获取视频的问答索引，首次使用时构建并保存在缓存目录的qa/下
+
+    索引文件名包含字幕内容的哈希和切分规则版本，字幕或切分规则变化后自动重建。
+
+    返回:
+        VideoQAIndex: 问答索引
+    """
+    digest = data_digest(subtitle_data)[:16]
+    path = os.path.join(get_cache_dir("qa"), f"{video_id}-{digest}-{WINDOW_MS}-t{TOKENIZER_VERSION}.idx")
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is not None:
+            _indexes.move_to_end(path)
+            return index
+        if not os.path.exists(path):
+            units = [(KIND_SUBTITLE, part, start_ms, text) for part, start_ms, text in build_windows(subtitle_data)]
+            write_segment(path, [{"video_id": video_id, "units": units}])
+        index = _indexes[path] = VideoQAIndex(path)
+        # 淘汰的索引可能仍在其他线程中使用，由垃圾回收关闭内存映射
+        while len(_indexes) > MAX_OPEN_INDEXES:
+            _indexes.popitem(last=False)
+        return index
+
+def load_subtitle_data(video_url, sessdata=None):
+    """
+    读取视频的字幕数据：优先使用总结流程保存的检查点，没有时下载并处理字幕
+
+    返回:
+        dict: process_video_subtitles的结果
+    """
+    from utils.checkpoint import get_checkpoint_store
+    from utils.download_subtitle import download_subtitle, extract_video_id
+    from utils.process_subtitle import process_video_subtitles
+    subtitle_data = get_checkpoint_store().latest(extract_video_id(video_url), "subtitle_data")
+    if subtitle_data:
+        return subtitle_data
+    subtitle_info = download_subtitle(video_url, sessdata)
+    return process_video_subtitles(subtitle_info["subtitle_files"])
+
+def answer_question(question, index, video_url, title=None, model_name=None, base_url=None,
+                    api_key=None, top_k=DEFAULT_TOP_K):
+    """
+    根据视频字幕回答问题，只把检索到的窗口发送给LLM，提示长度与视频长度无关
+
+    参数:
+        question (str): 问题
+        index (VideoQAIndex): get_video_index返回的视频问答索引
+        video_url (str): 视频URL
+        title (str, optional): 视频标题，用于提示
+        model_name (str, optional): 模型名称
+        base_url (str, optional): API基础URL
+        api_key (str, optional): OpenAI API密钥
+        top_k (int): 发送给LLM的窗口数量
+
+    返回:
+        dict: {"answer": 回答文本, "sources": 检索到的窗口列表}
+    """
+    from utils.call_llm import call_llm
+    sources = index.retrieve(question, top_k)
+    if not sources:
+        return {"answer": "没有在字幕中找到与问题相关的内容。", "sources": []}
+
+    context = "\n\n".join(f"[{cite(s['part'], s['start_ms'])}] {s['text']}" for s in sources)
+    prompt = ANSWER_PROMPT.format(title=title or video_url, context=context, question=question)
+    answer = call_llm(prompt, model_name, base_url, api_key)
+    return {"answer": answer.strip(), "sources": sources}
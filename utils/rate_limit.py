@@ -0,0 +1,309 @@
+import os
+import time
+import random
+import threading
+import openai
+from utils.metrics import record_llm_throttle
+
+# 限流与重试配置，可通过环境变量覆盖
+DEFAULT_RPM = float(os.environ.get("BILI_LLM_RPM", "600"))
+DEFAULT_BURST = int(os.environ.get("BILI_LLM_BURST", "10"))
+DEFAULT_MAX_RETRIES = int(os.environ.get("BILI_LLM_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.environ.get("BILI_LLM_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.environ.get("BILI_LLM_BACKOFF_MAX", "30"))
+BREAKER_THRESHOLD = int(os.environ.get("BILI_LLM_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET = float(os.environ.get("BILI_LLM_BREAKER_RESET", "30"))
+
+# 被限流后速率最低降到配置值的这个比例
+MIN_RATE_FACTOR = 0.05
+
+class CircuitOpenError(Exception):
+    """接口连续失败后熔断，在恢复探测之前直接拒绝请求"""
+
+class TokenBucket:
+    """
+    令牌桶限流器，速率可以动态调整
+
+    参数:
+        rate (float): 每秒补充的令牌数
+        capacity (int): 桶容量，即允许的突发请求数
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        # 服务端通过Retry-After要求暂停时，在此之前不发放令牌
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """
+        取一个令牌，没有可用令牌时等待
+
+        返回:
+            float: 等待的秒数
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                if now < self.blocked_until:
+                    delay = self.blocked_until - now
+                else:
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        """在接下来的seconds秒内不发放令牌，所有共享该桶的调用方一起暂停"""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败达到阈值后打开，reset_timeout秒后放行一个探测请求，
+    探测成功则恢复，失败则继续熔断
+
+    参数:
+        threshold (int): 触发熔断的连续失败次数
+        reset_timeout (float): 熔断持续的秒数
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.probing else "open"
+
+    def before_call(self):
+        """请求前检查，熔断期间抛出CircuitOpenError"""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self.probing:
+                raise CircuitOpenError(f"接口连续失败已熔断，{max(remaining, 0):.1f}秒后重试")
+            self.probing = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def release_probe(self):
+        """探测请求被放弃（既没有成功也没有失败，如流式输出被中途关闭）时释放探测名额，下一个请求重新探测"""
+        with self._lock:
+            self.probing = False
+
+    def record_failure(self):
+        """
+        记录一次失败
+
+        返回:
+            bool: 本次失败是否使熔断器打开
+        """
+        with self._lock:
+            self.failures += 1
+            if self.probing or (self.opened_at is None and self.failures >= self.threshold):
+                self.opened_at = time.monotonic()
+                self.probing = False
+                return True
+            return False
+
+def retry_after_seconds(error):
+    """从错误回复的Retry-After（或retry-after-ms）头中读取服务端要求的等待秒数"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        # HTTP日期格式的Retry-After按指数退避处理
+        return None
+    return None
+
+def is_retryable(error):
+    """
+    判断错误是否值得重试：限流、超时、连接失败和服务端5xx错误可以重试，
+    鉴权失败、请求格式错误等客户端错误重试也不会成功
+    """
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError,
+                          openai.InternalServerError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return isinstance(error, (TimeoutError, ConnectionError))
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """带完全抖动的指数退避：在[0, min(cap, base * 2^attempt)]中随机取值，避免并发请求同时重试"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+class EndpointLimiter:
+    """
+    单个(base_url, model)的限流、重试和熔断
+
+    速率按AIMD自适应：收到429时减半并按Retry-After暂停整个桶，之后每次成功缓慢恢复到配置值。
+
+    参数:
+        rpm (float): 每分钟请求数上限
+        burst (int): 允许的突发请求数
+        max_retries (int): 可重试错误的最大重试次数
+    """
+
+    def __init__(self, rpm=DEFAULT_RPM, burst=DEFAULT_BURST, max_retries=DEFAULT_MAX_RETRIES):
+        self.max_rate = rpm / 60.0
+        self.bucket = TokenBucket(self.max_rate, burst)
+        self.breaker = CircuitBreaker()
+        self.max_retries = max_retries
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "failures": 0,
+                      "circuit_opened": 0, "rejected": 0, "throttle_seconds": 0.0}
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self.stats[key] += value
+
+    def acquire(self):
+        """请求前检查熔断并取令牌，返回等待的秒数"""
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self._count("rejected")
+            raise
+        waited = self.bucket.acquire()
+        self._count("requests")
+        if waited:
+            self._count("throttle_seconds", waited)
+        return waited
+
+    def abandon(self):
+        """请求在得到结果前被放弃，不计入成功或失败"""
+        self.breaker.release_probe()
+
+    def success(self):
+        self.breaker.record_success()
+        # 加性恢复速率
+        with self.bucket._lock:
+            self.bucket.rate = min(self.max_rate, self.bucket.rate + self.max_rate * 0.05)
+
+    def failure(self, error, attempt):
+        """
+        记录一次失败
+
+        参数:
+            error (Exception): 调用抛出的异常
+            attempt (int): 已重试的次数
+
+        返回:
+            float: 重试前需要等待的秒数，不应重试时为None
+        """
+        if not is_retryable(error):
+            # 接口有回复（如参数错误），说明服务可用，结束可能进行中的熔断探测
+            self.breaker.record_success()
+            return None
+        self._count("failures")
+        retry_after = retry_after_seconds(error)
+        if isinstance(error, openai.RateLimitError) or getattr(error, "status_code", None) == 429:
+            self._count("rate_limited")
+            self.breaker.record_success()
+            pause = retry_after if retry_after is not None else backoff_delay(attempt)
+            # 乘性降低速率，同一批并发请求收到的429只降一次
+            now = time.monotonic()
+            with self.bucket._lock:
+                if now - self._last_decrease >= max(1.0, pause):
+                    self.bucket.rate = max(self.max_rate * MIN_RATE_FACTOR, self.bucket.rate / 2)
+                    self._last_decrease = now
+            # 让共享该桶的其他请求一起等待
+            self.bucket.pause(pause)
+        elif self.breaker.record_failure():
+            # 限流说明接口仍在工作，只有超时、连接失败和5xx计入熔断
+            self._count("circuit_opened")
+        if attempt >= self.max_retries:
+            return None
+        delay = retry_after if retry_after is not None else backoff_delay(attempt)
+        self._count("retries")
+        self._count("throttle_seconds", delay)
+        return delay
+
+    def call(self, fn):
+        """
+        在限流、重试和熔断保护下调用fn
+
+        返回:
+            fn的返回值；不可重试的错误或重试次数用完后抛出最后一次的异常
+        """
+        attempt = 0
+        while True:
+            waited = self.acquire()
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self.failure(e, attempt)
+                if delay is None:
+                    record_llm_throttle(waited, 0)
+                    raise
+                record_llm_throttle(waited + delay, 1)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # KeyboardInterrupt等中断：不记录结果，但要释放可能持有的熔断探测名额
+                self.abandon()
+                raise
+            record_llm_throttle(waited, 0)
+            self.success()
+            return result
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(base_url=None, model=None):
+    """按(base_url, model)获取进程内共享的限流器"""
+    key = (base_url or "", model or "")
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = EndpointLimiter()
+        return limiter
+
+def limiter_stats():
+    """
+    汇总所有限流器的统计
+
+    返回:
+        dict: 请求数、重试次数、被限流次数、失败次数、熔断次数、被熔断拒绝的请求数和累计等待秒数
+    """
+    totals = {"requests": 0, "retries": 0, "rate_limited": 0, "failures": 0,
+              "circuit_opened": 0, "rejected": 0, "throttle_seconds": 0.0}
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    for limiter in limiters:
+        with limiter._lock:
+            for key in totals:
+                totals[key] += limiter.stats[key]
+    return totals
@@ -0,0 +1,524 @@
+import os
+import re
+import json
+import math
+import mmap
+import heapq
+import struct
+import uuid
+import threading
+from collections import Counter
+from utils.paths import get_cache_dir
+
+# 索引段文件格式：文件头 | 词项表 | 词项文本 | 倒排表 | 单元表 | 单元文本 | 文档信息(JSON)
+# 单元是建立索引的最小粒度：一段字幕或摘要中的一个字段，命中结果精确到单元及其开始时间
+MAGIC = b"BSIX"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIIQQQQQQQ")  # magic, version, 词项数, 单元数, 文档数, 总词数, 6个区段偏移
+TERM = struct.Struct("<IIQI")             # 词项文本偏移, 词项文本长度, 倒排表偏移, 倒排表条数
+POSTING = struct.Struct("<IH")            # 单元编号, 词频
+UNIT = struct.Struct("<IHBqQII")          # 文档编号, 分P, 类型, 开始毫秒, 文本偏移, 文本长度, 词数
+
+KIND_SUMMARY = 0
+KIND_SUBTITLE = 1
+
+# 同一层级（按文档数以MERGE_FACTOR为底取对数）的段达到MERGE_FACTOR个时合并为一个
+MERGE_FACTOR = 4
+
+# BM25参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+MANIFEST_NAME = "manifest.json"
+
+# 中日文字符（汉字、假名）按单字和二元组切分，字母和数字按单词切分
+_TOKEN_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿豈-﫿]+|[0-9a-z]+")
+
+# 切分规则变化时递增，依赖切分结果的缓存（如问答索引）据此重建
+TOKENIZER_VERSION = 2
+
+def search_index_enabled():
+    """是否在生成摘要后更新搜索索引，设置环境变量BILI_SEARCH_INDEX=0可关闭"""
+    return os.environ.get("BILI_SEARCH_INDEX", "1").lower() not in ("0", "false", "off", "no")
+
+def tokenize(text):
+    """
+    切分文本为索引词：连续的中日文字符切为单字和相邻二元组，字母数字按单词切分并转为小写
+
+    索引中保留单字，单个汉字的查询（如“猫”）也能命中。
+
+    参数:
+        text (str): 文本
+
+    返回:
+        list: 词列表
+    """
+    tokens = []
+    for run in _TOKEN_RE.findall(text.lower()):
+        if run[0] >= "぀":
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+def query_terms(text):
+    """
+    切分查询文本：两个字以上的中日文按二元组切分（相当于短语的近似匹配），单个字作为单字查询
+
+    返回:
+        list: 去重后的查询词列表
+    """
+    terms = []
+    for run in _TOKEN_RE.findall(text.lower()):
+        if run[0] >= "぀" and len(run) > 1:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            terms.append(run)
+    return list(dict.fromkeys(terms))
+
+def summary_units(summary):
+    """把摘要拆成可检索的文本单元（标题、核心内容、每个关键点、详细摘要、结论和各分P摘要）"""
+    texts = [summary.get("标题"), summary.get("核心内容")]
+    texts.extend(summary.get("关键点") or [])
+    texts.extend([summary.get("详细摘要"), summary.get("结论")])
+    units = [(KIND_SUMMARY, 0, -1, str(text)) for text in texts if text]
+    for i, part in enumerate(summary.get("分P摘要") or []):
+        for text in [part.get("核心内容")] + list(part.get("关键点") or []):
+            if text:
+                units.append((KIND_SUMMARY, i + 1, -1, str(text)))
+    return units
+
+def subtitle_units(subtitle_data):
+    """把字幕段落转为文本单元，多P视频按分P分别记录，开始时间相对于所在分P"""
+    if not subtitle_data:
+        return []
+    parts = subtitle_data.get("parts") or [subtitle_data]
+    units = []
+    for i, part in enumerate(parts):
+        part_number = i + 1 if subtitle_data.get("parts") else 0
+        for segment in part.get("subtitles") or []:
+            start_ms = segment.get("start_ms")
+            if start_ms is None:
+                from utils.timeline import parse_timestamp
+                start_ms = parse_timestamp(segment["start_time"])
+            units.append((KIND_SUBTITLE, part_number, int(start_ms), segment["text"]))
+    return units
+
+def write_segment(path, docs):
+    """
+    把文档写成一个索引段文件
+
+    参数:
+        path (str): 段文件路径
+        docs (list): 每项为{"video_id", "video_url", "title", "html_path", "units"}，
+            units为(类型, 分P, 开始毫秒, 文本)列表
+
+    返回:
+        int: 写入的单元数
+    """
+    postings = {}
+    units = bytearray()
+    text_blob = bytearray()
+    meta = []
+    unit_id = 0
+    total_tokens = 0
+    for doc_id, doc in enumerate(docs):
+        meta.append({key: doc.get(key) for key in ("video_id", "video_url", "title", "html_path")})
+        for kind, part, start_ms, text in doc["units"]:
+            tokens = tokenize(text)
+            total_tokens += len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((unit_id, min(tf, 0xFFFF)))
+            data = text.encode("utf-8")
+            units += UNIT.pack(doc_id, part, kind, start_ms, len(text_blob), len(data), len(tokens))
+            text_blob += data
+            unit_id += 1
+
+    # 词项按UTF-8字节序排列，查询时在内存映射上二分查找
+    terms = sorted((term.encode("utf-8"), term) for term in postings)
+    term_table = bytearray()
+    term_blob = bytearray()
+    posting_blob = bytearray()
+    for encoded, term in terms:
+        entries = postings[term]
+        term_table += TERM.pack(len(term_blob), len(encoded), len(posting_blob), len(entries))
+        term_blob += encoded
+        for entry in entries:
+            posting_blob += POSTING.pack(*entry)
+
+    meta_blob = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+    offsets = []
+    position = HEADER.size
+    for section in (term_table, term_blob, posting_blob, units, text_blob):
+        offsets.append(position)
+        position += len(section)
+    offsets.append(position)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(terms), unit_id, len(docs), total_tokens, *offsets))
+        for section in (term_table, term_blob, posting_blob, units, text_blob, meta_blob):
+            f.write(section)
+    os.replace(tmp_path, path)
+    return unit_id
+
+class Segment:
+    """以内存映射方式打开的只读索引段"""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.n_terms, self.n_units, self.n_docs, self.total_tokens,
+         self._terms, self._term_blob, self._postings, self._units, self._text, self._meta) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"不是有效的索引段文件: {path}")
+        self.docs = json.loads(self._mm[self._meta:].decode("utf-8"))
+
+    def close(self):
+        self._mm.close()
+
+    def _term_at(self, i):
+        offset, length, post_offset, count = TERM.unpack_from(self._mm, self._terms + i * TERM.size)
+        start = self._term_blob + offset
+        return self._mm[start:start + length], post_offset, count
+
+    def term_info(self, term):
+        """
+        在词项表中二分查找词项
+
+        返回:
+            tuple: (倒排表偏移, 倒排表条数)，词项不存在时为None
+        """
+        target = term.encode("utf-8")
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term_at(mid)[0] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.n_terms:
+            return None
+        encoded, post_offset, count = self._term_at(lo)
+        if encoded != target:
+            return None
+        return post_offset, count
+
+    def postings(self, term, info=None):
+        """
+        查找词项的倒排表
+
+        返回:
+            list: (单元编号, 词频)列表，词项不存在时为空
+        """
+        info = info or self.term_info(term)
+        if info is None:
+            return []
+        post_offset, count = info
+        start = self._postings + post_offset
+        return list(POSTING.iter_unpack(self._mm[start:start + count * POSTING.size]))
+
+    def unit(self, unit_id):
+        """返回(文档编号, 分P, 类型, 开始毫秒, 文本偏移, 文本长度, 词数)"""
+        return UNIT.unpack_from(self._mm, self._units + unit_id * UNIT.size)
+
+    def text(self, unit):
+        start = self._text + unit[4]
+        return self._mm[start:start + unit[5]].decode("utf-8")
+
+    def iter_docs(self):
+        """按文档依次返回(文档信息, 单元列表)，用于合并段"""
+        units = {}
+        for unit_id in range(self.n_units):
+            unit = self.unit(unit_id)
+            units.setdefault(unit[0], []).append((unit[2], unit[1], unit[3], self.text(unit)))
+        for doc_id, doc in enumerate(self.docs):
+            yield doc, units.get(doc_id, [])
+
+class SearchIndex:
+    """
+    持久化的倒排索引，覆盖所有视频的摘要和字幕
+
+    每次添加视频写入一个新的小段文件，同一层级的段达到一定数量后合并（对数级合并），
+    清单记录每个视频当前所在的段，重新添加的视频在旧段中的记录在查询时被忽略，合并时删除。
+    查询时以内存映射读取段文件，只访问命中的词项和单元。
+
+    参数:
+        root (str): 索引目录，默认为缓存目录下的search/
+    """
+
+    def __init__(self, root=None):
+        self.root = os.path.abspath(root) if root else get_cache_dir("search")
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.RLock()
+        self._segments = {}
+        self._manifest = None
+        self._manifest_stamp = None
+
+    def _manifest_path(self):
+        return os.path.join(self.root, MANIFEST_NAME)
+
+    def _load_manifest(self):
+        """读取清单，文件未变化时使用已加载的版本"""
+        path = self._manifest_path()
+        try:
+            st = os.stat(path)
+        except OSError:
+            return {"segments": {}, "videos": {}}
+        stamp = (st.st_mtime_ns, st.st_size)
+        if self._manifest is None or stamp != self._manifest_stamp:
+            with open(path, "r", encoding="utf-8") as f:
+                self._manifest = json.load(f)
+            self._manifest_stamp = stamp
+        return self._manifest
+
+    def _save_manifest(self, manifest):
+        path = self._manifest_path()
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._manifest = manifest
+        st = os.stat(path)
+        self._manifest_stamp = (st.st_mtime_ns, st.st_size)
+
+    def _segment(self, name):
+        segment = self._segments.get(name)
+        if segment is None:
+            segment = self._segments[name] = Segment(os.path.join(self.root, name))
+        return segment
+
+    def _live_segments(self, manifest):
+        # 关闭已被合并掉的段
+        for name in list(self._segments):
+            if name not in manifest["segments"]:
+                self._segments.pop(name).close()
+        return [self._segment(name) for name in manifest["segments"]]
+
+    def add_video(self, video_id, video_url, summary, subtitle_data=None, html_path=None):
+        """
+        添加或更新一个视频的摘要和字幕
+
+        返回:
+            int: 写入的文本单元数
+        """
+        doc = {
+            "video_id": video_id,
+            "video_url": video_url,
+            "title": (summary or {}).get("标题") or video_id,
+            "html_path": html_path,
+            "units": summary_units(summary or {}) + subtitle_units(subtitle_data)
+        }
+        with self._lock:
+            manifest = json.loads(json.dumps(self._load_manifest()))
+            name = f"seg-{uuid.uuid4().hex}.idx"
+            count = write_segment(os.path.join(self.root, name), [doc])
+            old = manifest["videos"].get(video_id)
+            if old in manifest["segments"]:
+                manifest["segments"][old]["live"] -= 1
+            manifest["segments"][name] = {"docs": 1, "live": 1}
+            manifest["videos"][video_id] = name
+            self._merge(manifest)
+            self._save_manifest(manifest)
+        return count
+
+    def remove_video(self, video_id):
+        """从索引中删除一个视频，其记录在下次合并时清除"""
+        with self._lock:
+            manifest = json.loads(json.dumps(self._load_manifest()))
+            old = manifest["videos"].pop(video_id, None)
+            if old is None:
+                return False
+            if old in manifest["segments"]:
+                manifest["segments"][old]["live"] -= 1
+            self._save_manifest(manifest)
+            return True
+
+    def _merge(self, manifest):
+        """按层级合并段，并删除不再包含有效记录的段"""
+        def level(info):
+            # 整数运算，避免浮点对数在恰好是MERGE_FACTOR的幂时（如log(64, 4) = 2.999…）少算一层
+            live, result = max(info["live"], 1), 0
+            while live >= MERGE_FACTOR:
+                live //= MERGE_FACTOR
+                result += 1
+            return result
+
+        while True:
+            for name in [n for n, info in manifest["segments"].items() if info["live"] <= 0]:
+                self._drop_segment(manifest, name)
+            levels = {}
+            for name, info in manifest["segments"].items():
+                levels.setdefault(level(info), []).append(name)
+            group = next((names for names in levels.values() if len(names) >= MERGE_FACTOR), None)
+            if group is None:
+                return
+
+            docs = []
+            for name in group:
+                for doc, units in self._segment(name).iter_docs():
+                    if manifest["videos"].get(doc["video_id"]) == name:
+                        docs.append(dict(doc, units=units))
+            merged = f"seg-{uuid.uuid4().hex}.idx"
+            write_segment(os.path.join(self.root, merged), docs)
+            for name in group:
+                self._drop_segment(manifest, name)
+            manifest["segments"][merged] = {"docs": len(docs), "live": len(docs)}
+            for doc in docs:
+                manifest["videos"][doc["video_id"]] = merged
+
+    def _drop_segment(self, manifest, name):
+        manifest["segments"].pop(name, None)
+        segment = self._segments.pop(name, None)
+        if segment is not None:
+            segment.close()
+        try:
+            os.remove(os.path.join(self.root, name))
+        except OSError:
+            pass
+
+    def search(self, query, limit=10, max_per_video=3):
+        """
+        检索摘要和字幕，按BM25对文本单元排序
+
+        优先返回包含全部查询词的单元（中文查询相当于短语的近似匹配），没有时退回包含任一查询词的单元。
+
+        参数:
+            query (str): 查询文本
+            limit (int): 返回的最大结果数
+            max_per_video (int): 每个视频最多返回的结果数，为None时不限制
+
+        返回:
+            list: 每项为{"score", "video_id", "video_url", "title", "html_path", "kind", "part", "start_ms", "text"}，
+            kind为"summary"或"subtitle"，摘要单元的start_ms为None
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+        with self._lock:
+            manifest = self._load_manifest()
+            segments = self._live_segments(manifest)
+            videos = manifest["videos"]
+
+            n_units = sum(s.n_units for s in segments)
+            if not n_units:
+                return []
+            avg_len = sum(s.total_tokens for s in segments) / n_units
+
+            matches = []
+            for segment in segments:
+                per_unit = {}
+                for term in terms:
+                    for unit_id, tf in segment.postings(term):
+                        per_unit.setdefault(unit_id, {})[term] = tf
+                matches.append((segment, per_unit))
+
+            df = Counter()
+            for _, per_unit in matches:
+                for found in per_unit.values():
+                    df.update(found.keys())
+            idf = {t: math.log(1 + (n_units - df[t] + 0.5) / (df[t] + 0.5)) for t in terms}
+
+            for require_all in (True, False):
+                scored = []
+                for segment, per_unit in matches:
+                    for unit_id, found in per_unit.items():
+                        if require_all and len(found) < len(terms):
+                            continue
+                        unit = segment.unit(unit_id)
+                        doc = segment.docs[unit[0]]
+                        if videos.get(doc["video_id"]) != segment.name:
+                            continue
+                        norm = BM25_K1 * (1 - BM25_B + BM25_B * unit[6] / avg_len)
+                        score = sum(idf[t] * tf * (BM25_K1 + 1) / (tf + norm) for t, tf in found.items())
+                        scored.append((score, segment.name, unit_id))
+                if scored:
+                    break
+
+            hits = []
+            per_video = Counter()
+            for score, name, unit_id in heapq.nlargest(len(scored), scored):
+                segment = self._segment(name)
+                unit = segment.unit(unit_id)
+                doc = segment.docs[unit[0]]
+                if max_per_video is not None and per_video[doc["video_id"]] >= max_per_video:
+                    continue
+                per_video[doc["video_id"]] += 1
+                hits.append(dict(
+                    doc,
+                    score=round(score, 4),
+                    kind="summary" if unit[2] == KIND_SUMMARY else "subtitle",
+                    part=unit[1],
+                    start_ms=unit[3] if unit[3] >= 0 else None,
+                    text=segment.text(unit)
+                ))
+                if len(hits) >= limit:
+                    break
+            return hits
+
+    def stats(self):
+        """索引的视频数、段数和文本单元数"""
+        with self._lock:
+            manifest = self._load_manifest()
+            segments = self._live_segments(manifest)
+            return {
+                "videos": len(manifest["videos"]),
+                "segments": len(segments),
+                "units": sum(s.n_units for s in segments)
+            }
+
+def index_archive(output_dir, index=None):
+    """
+    把输出目录data/中已保存的摘要加入索引，字幕从阶段检查点中读取（没有检查点时只索引摘要）
+
+    返回:
+        int: 加入索引的视频数
+    """
+    from utils.generate_html import DATA_DIR
+    from utils.archive import page_filename
+    from utils.checkpoint import get_checkpoint_store
+    from utils.download_subtitle import extract_video_id
+    index = index or get_search_index()
+    store = get_checkpoint_store()
+    data_dir = os.path.join(os.path.abspath(output_dir), DATA_DIR)
+    if not os.path.isdir(data_dir):
+        return 0
+    count = 0
+    for filename in sorted(os.listdir(data_dir)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(data_dir, filename), "r", encoding="utf-8") as f:
+            record = json.load(f)
+        video_id = extract_video_id(record["video_url"])
+        html_path = os.path.join(os.path.dirname(data_dir), page_filename(filename[:-len(".json")]))
+        index.add_video(video_id, record["video_url"], record.get("summary") or {},
+                        store.latest(video_id, "subtitle_data"),
+                        html_path=html_path if os.path.exists(html_path) else None)
+        count += 1
+    return count
+
+def hit_link(hit):
+    """命中结果在B站播放页上的跳转链接，分P和开始时间通过p和t参数指定"""
+    url = hit["video_url"]
+    params = []
+    if hit.get("part"):
+        params.append(f"p={hit['part']}")
+    if hit.get("start_ms") is not None:
+        params.append(f"t={hit['start_ms'] // 1000}")
+    if not params:
+        return url
+    return url + ("&" if "?" in url else "?") + "&".join(params)
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_search_index():
+    """获取进程内共享的搜索索引，目录可通过环境变量BILI_SEARCH_INDEX_DIR指定"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SearchIndex(os.environ.get("BILI_SEARCH_INDEX_DIR"))
+        return _index
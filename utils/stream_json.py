@@ -0,0 +1,139 @@
+import json
+
+_WHITESPACE = " \t\r\n"
+
+class JSONObjectStreamParser:
+    """
+    增量解析流式输出的JSON对象
+
+    逐段喂入LLM的输出文本，每当顶层对象的某个字段完整时产出一个事件，
+    顶层字段为数组时，数组中的每个元素完整时也会单独产出事件。
+    第一个"{"之前的内容（如```json标记）会被忽略。
+
+    事件格式:
+        ("field", 字段名, 字段值)
+        ("item", 字段名, 元素序号, 元素值)
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._started = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect_key = True
+        self._key = None
+        self._key_start = None
+        self._value_start = None
+        self._value_is_array = False
+        self._item_start = None
+        self._item_index = 0
+
+    @property
+    def done(self):
+        """顶层对象是否已经解析完毕"""
+        return self._done
+
+    def feed(self, text):
+        """
+        喂入新的文本片段
+
+        返回:
+            list: 本次新完成的事件列表
+        """
+        self.buffer += text
+        events = []
+        buf = self.buffer
+        i = self._pos
+        end = len(buf)
+        while i < end and not self._done:
+            c = buf[i]
+            if not self._started:
+                if c == "{":
+                    self._started = True
+                    self._depth = 1
+                    self._expect_key = True
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._on_string_end(i, events)
+            else:
+                self._on_char(c, i, events)
+            i += 1
+        self._pos = i
+        return events
+
+    def _on_string_end(self, i, events):
+        if self._depth == 1 and self._expect_key:
+            self._key = json.loads(self.buffer[self._key_start:i + 1])
+        elif self._depth == 1 and self._value_start is not None:
+            # 字符串字段在右引号处即完整，不必等待后面的逗号
+            self._emit_field(i + 1, events)
+        elif self._depth == 2 and self._value_is_array and self._item_start is not None:
+            self._emit_item(i + 1, events)
+
+    def _on_char(self, c, i, events):
+        depth = self._depth
+        if c in _WHITESPACE:
+            return
+
+        # 记录顶层字段值或数组元素的起始位置
+        if depth == 1 and not self._expect_key and self._value_start is None and c not in ":,}":
+            self._value_start = i
+            self._value_is_array = c == "["
+            self._item_index = 0
+        elif depth == 2 and self._value_is_array and self._item_start is None and c not in ",]":
+            self._item_start = i
+
+        if c == '"':
+            self._in_string = True
+            if depth == 1 and self._expect_key:
+                self._key_start = i
+        elif c in "{[":
+            self._depth += 1
+        elif c in "}]":
+            if depth == 2 and self._value_is_array and self._item_start is not None:
+                self._emit_item(i, events)
+            if depth == 1:
+                # 顶层对象结束，补发最后一个非字符串字段
+                if self._value_start is not None:
+                    self._emit_field(i, events)
+                self._done = True
+            self._depth -= 1
+            if self._depth == 1 and self._value_start is not None:
+                self._emit_field(i + 1, events)
+        elif c == ":" and depth == 1:
+            self._expect_key = False
+        elif c == ",":
+            if depth == 1:
+                if self._value_start is not None:
+                    self._emit_field(i, events)
+                self._expect_key = True
+            elif depth == 2 and self._value_is_array and self._item_start is not None:
+                self._emit_item(i, events)
+
+    def _emit_field(self, end, events):
+        raw = self.buffer[self._value_start:end].strip()
+        self._value_start = None
+        self._value_is_array = False
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return
+        events.append(("field", self._key, value))
+
+    def _emit_item(self, end, events):
+        raw = self.buffer[self._item_start:end].strip()
+        self._item_start = None
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return
+        events.append(("item", self._key, self._item_index, value))
+        self._item_index += 1
@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from utils.paths import get_cache_dir
+
+SUBTITLE_EXTENSIONS = (".srt", ".ass", ".json")
+MANIFEST_NAME = "manifest.json"
+DEFAULT_MAX_BYTES = int(float(os.environ.get("BILI_SUBTITLE_STORE_MAX_MB", "500")) * 1024 * 1024)
+# 没有清单的目录超过这个秒数未修改才视为中断写入的残留并清理
+STALE_SECONDS = 3600
+
+def file_sha256(path):
+    """计算文件的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def guess_language(subtitle_file):
+    """
+    从yutto生成的文件名中推断字幕语言
+
+    yutto的字幕文件名形如"视频标题_中文（自动翻译）.srt"，最后一个下划线之后为语言名称。
+    """
+    stem = Path(subtitle_file).stem
+    return stem.rsplit("_", 1)[1] if "_" in stem else ""
+
+class SubtitleStore:
+    """
+    按视频ID保存已下载字幕的本地仓库，超出容量时按最近访问时间淘汰
+
+    字幕先写入根目录下以"."开头的临时目录，写完清单后再整体换到视频目录，
+    其他进程不会看到写了一半的视频目录。
+    """
+
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = os.path.abspath(root) if root else get_cache_dir("subtitles")
+        os.makedirs(self.root, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _video_dir(self, video_id):
+        return os.path.join(self.root, video_id)
+
+    def _read_manifest(self, video_id):
+        manifest_path = os.path.join(self._video_dir(video_id), MANIFEST_NAME)
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_manifest(self, video_dir, manifest):
+        manifest_path = os.path.join(video_dir, MANIFEST_NAME)
+        tmp_path = f"{manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, manifest_path)
+
+    def get(self, video_id):
+        """
+        查询已保存的字幕
+
+        参数:
+            video_id (str): 视频ID（BV号或av号）
+
+        返回:
+            dict: 清单信息，tracks中的file为绝对路径；未保存或文件缺失时返回None
+        """
+        with self._lock:
+            manifest = self._read_manifest(video_id)
+            if not manifest or not manifest.get("tracks"):
+                return None
+
+            video_dir = self._video_dir(video_id)
+            tracks = []
+            for track in manifest["tracks"]:
+                path = os.path.join(video_dir, track["file"])
+                # 只校验大小，避免每次读取全部文件计算哈希
+                if not os.path.isfile(path) or os.path.getsize(path) != track["size"]:
+                    return None
+                tracks.append({**track, "file": path})
+
+            manifest["last_access"] = time.time()
+            self._write_manifest(video_dir, manifest)
+            return {**manifest, "tracks": tracks}
+
+    def put(self, video_id, video_url, subtitle_files, move=True):
+        """
+        保存字幕文件并写入清单
+
+        参数:
+            video_id (str): 视频ID
+            video_url (str): 视频URL
+            subtitle_files (list): 字幕文件路径列表
+            move (bool): 是否移动而不是复制源文件
+
+        返回:
+            dict: 与get相同格式的清单信息
+        """
+        with self._lock:
+            staging_dir = self._staging_dir(video_id)
+
+            tracks = []
+            used_names = set()
+            for src in subtitle_files:
+                name = os.path.basename(src)
+                # 不同子目录下可能存在同名文件
+                if name in used_names:
+                    name = f"{len(used_names)}_{name}"
+                used_names.add(name)
+                dst = os.path.join(staging_dir, name)
+                if move:
+                    shutil.move(src, dst)
+                else:
+                    shutil.copyfile(src, dst)
+                tracks.append({
+                    "file": name,
+                    "language": guess_language(name),
+                    "size": os.path.getsize(dst),
+                    "sha256": file_sha256(dst)
+                })
+            return self._commit(video_id, video_url, tracks, staging_dir)
+
+    def put_data(self, video_id, video_url, subtitle_data):
+        """
+        直接保存内存中的字幕内容并写入清单，不经过临时文件
+
+        参数:
+            video_id (str): 视频ID
+            video_url (str): 视频URL
+            subtitle_data (dict): 文件名到字幕内容（bytes）的映射
+
+        返回:
+            dict: 与get相同格式的清单信息
+        """
+        with self._lock:
+            staging_dir = self._staging_dir(video_id)
+
+            tracks = []
+            for name, data in subtitle_data.items():
+                with open(os.path.join(staging_dir, name), "wb") as f:
+                    f.write(data)
+                tracks.append({
+                    "file": name,
+                    "language": guess_language(name),
+                    "size": len(data),
+                    "sha256": hashlib.sha256(data).hexdigest()
+                })
+            return self._commit(video_id, video_url, tracks, staging_dir)
+
+    def _staging_dir(self, video_id):
+        """创建本进程、本线程专用的临时目录"""
+        path = os.path.join(self.root, f".{video_id}.{os.getpid()}.{threading.get_ident()}.tmp")
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        return path
+
+    def _commit(self, video_id, video_url, tracks, staging_dir):
+        """在临时目录中写入清单，换到视频目录后按容量淘汰，调用方需持有锁"""
+        now = time.time()
+        manifest = {
+            "video_id": video_id,
+            "video_url": video_url,
+            "fetched_at": now,
+            "last_access": now,
+            "total_bytes": sum(t["size"] for t in tracks),
+            "tracks": tracks
+        }
+        self._write_manifest(staging_dir, manifest)
+
+        video_dir = self._video_dir(video_id)
+        old_dir = f"{staging_dir}.old"
+        if os.path.isdir(video_dir):
+            os.replace(video_dir, old_dir)
+        try:
+            os.replace(staging_dir, video_dir)
+        except OSError:
+            # 其他进程同时保存了同一视频，保留先完成的结果
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            manifest = self._read_manifest(video_id) or manifest
+            tracks = manifest["tracks"]
+        shutil.rmtree(old_dir, ignore_errors=True)
+        self._evict(keep=video_id)
+        return {**manifest, "tracks": [{**t, "file": os.path.join(video_dir, t["file"])} for t in tracks]}
+
+    def _evict(self, keep=None):
+        """总大小超出上限时，按最近访问时间删除最旧的视频字幕"""
+        entries = []
+        total = 0
+        now = time.time()
+        for name in os.listdir(self.root):
+            manifest = None if name.startswith(".") else self._read_manifest(name)
+            if manifest is None:
+                # 临时目录或没有清单的目录可能是其他进程正在进行的写入，只清理长时间未修改的残留
+                path = os.path.join(self.root, name)
+                try:
+                    stale = now - os.path.getmtime(path) > STALE_SECONDS
+                except OSError:
+                    continue
+                if stale:
+                    shutil.rmtree(path, ignore_errors=True)
+                continue
+            entries.append((manifest.get("last_access", 0), name, manifest.get("total_bytes", 0)))
+            total += manifest.get("total_bytes", 0)
+
+        entries.sort()
+        for _, video_id, size in entries:
+            if total <= self.max_bytes:
+                break
+            if video_id == keep:
+                continue
+            shutil.rmtree(self._video_dir(video_id), ignore_errors=True)
+            total -= size
+
+    def remove(self, video_id):
+        """删除指定视频的字幕"""
+        with self._lock:
+            shutil.rmtree(self._video_dir(video_id), ignore_errors=True)
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_subtitle_store():
+    """获取进程内共享的字幕仓库实例"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SubtitleStore()
+        return _store
@@ -0,0 +1,100 @@
+import os
+import re
+from pathlib import Path
+from utils.subtitle_store import guess_language
+
+# 字幕语言偏好，越靠前越优先，可通过环境变量BILI_SUBTITLE_LANGUAGES（逗号分隔）覆盖。
+# 同时匹配B站接口的语言代码（zh-CN、ai-zh）和yutto文件名中的语言名称（中文（中国））
+DEFAULT_LANGUAGE_PREFERENCE = ["zh-CN", "zh-Hans", "zh", "中文", "en", "英"]
+
+# 自动生成（AI识别或机器翻译）的字幕质量通常不如人工字幕
+_AUTO_TRACK_RE = re.compile(r"^ai-|自动|机翻|翻译", re.IGNORECASE)
+
+_PART_NUMBER_RE = re.compile(r"^P(\d+)\b")
+
+# 可以识别的语言轨道标记：B站接口的语言代码（zh-CN、en-US、ai-zh）和yutto文件名中的语言名称（中文（中国）、English）
+_LANGUAGE_CODES = {"zh", "en", "ja", "ko", "es", "fr", "de", "ru", "pt", "it", "ar", "th", "vi", "id", "ms", "hi", "tr"}
+_LANGUAGE_CODE_RE = re.compile(r"^(?:ai-)?([a-z]{2})(?:-[a-z0-9]{2,8})*$", re.IGNORECASE)
+_LANGUAGE_NAME_RE = re.compile(
+    r"中文|简体|繁体|繁體|英语|英文|日语|日文|日本語|韩语|韩文|한국어|粤语|字幕|自动|翻译|"
+    r"chinese|english|japanese|korean|español|français|deutsch|русский",
+    re.IGNORECASE
+)
+
+def is_language_tag(tag):
+    """文件名最后一个下划线之后的部分是否是语言轨道标记（而不是lesson_1中的集数等）"""
+    match = _LANGUAGE_CODE_RE.match(tag)
+    if match:
+        return match.group(1).lower() in _LANGUAGE_CODES
+    return bool(_LANGUAGE_NAME_RE.search(tag))
+
+def get_language_preference():
+    """返回字幕语言偏好列表"""
+    configured = os.environ.get("BILI_SUBTITLE_LANGUAGES")
+    if configured:
+        return [lang.strip() for lang in configured.split(",") if lang.strip()]
+    return DEFAULT_LANGUAGE_PREFERENCE
+
+def track_score(subtitle_file, preference=None):
+    """
+    计算字幕轨道的排序键，越小越优先
+
+    依次比较：语言在偏好列表中的位置、是否为自动生成的字幕、文件大小（内容越多越完整）。
+
+    参数:
+        subtitle_file (str): 字幕文件路径
+        preference (list): 语言偏好，默认使用get_language_preference()
+
+    返回:
+        tuple: 排序键
+    """
+    preference = preference or get_language_preference()
+    language = guess_language(subtitle_file).lower()
+    rank = len(preference)
+    for i, lang in enumerate(preference):
+        if lang.lower() in language:
+            rank = i
+            break
+    is_auto = 1 if _AUTO_TRACK_RE.search(language) else 0
+    try:
+        size = os.path.getsize(subtitle_file)
+    except OSError:
+        size = 0
+    return (rank, is_auto, -size)
+
+def select_track(subtitle_files, preference=None):
+    """从同一分P的多个字幕轨道中选出最合适的一个"""
+    return min(subtitle_files, key=lambda f: track_score(f, preference))
+
+def group_parts(subtitle_files, language_tags_only=False):
+    """
+    按分P对字幕文件分组
+
+    文件名中最后一个下划线之前的部分相同的视为同一分P的不同语言轨道，
+    形如"P001 标题"的分P按编号排序，其余保持原有顺序。
+
+    参数:
+        subtitle_files (list): 字幕文件路径列表
+        language_tags_only (bool): 只在最后一个下划线之后是可识别的语言标记时分组，
+            否则整个文件名作为分P名称（适用于来源不明的文件，如lesson_1.srt、lesson_2.srt）
+
+    返回:
+        list: 分P列表，每项为{"title": 分P名称, "files": 字幕文件列表}
+    """
+    parts = {}
+    for subtitle_file in subtitle_files:
+        stem = Path(subtitle_file).stem
+        key = stem
+        if "_" in stem:
+            prefix, tag = stem.rsplit("_", 1)
+            if not language_tags_only or is_language_tag(tag):
+                key = prefix
+        parts.setdefault(key, []).append(str(subtitle_file))
+
+    def order(item):
+        index, (key, _) = item
+        match = _PART_NUMBER_RE.match(key)
+        return (int(match.group(1)), index) if match else (0, index)
+
+    ordered = sorted(enumerate(parts.items()), key=order)
+    return [{"title": key, "files": files} for _, (key, files) in ordered]
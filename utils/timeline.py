@@ -0,0 +1,120 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+def format_timestamp(ms):
+    """将毫秒数格式化为SRT时间戳（HH:MM:SS,mmm）"""
+    seconds, ms = divmod(int(ms), 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+def parse_timestamp(time_str):
+    """将SRT时间戳（HH:MM:SS,mmm）解析为毫秒数"""
+    hms, _, millis = time_str.replace('.', ',').partition(',')
+    h, m, s = hms.split(':')
+    return ((int(h) * 60 + int(m)) * 60 + int(s)) * 1000 + int(millis.ljust(3, '0')[:3] or 0)
+
+class CueTimeline:
+    """
+    列式存储的字幕时间轴
+
+    起止时间保存在两个毫秒数组中，所有文本拼接为一个字符串并用偏移数组切分，
+    按时间查找和范围查询都是二分查找。
+    """
+
+    def __init__(self, starts, ends, offsets, text):
+        self.starts = starts
+        self.ends = ends
+        # offsets比条目数多一个，第i条文本为text[offsets[i]:offsets[i + 1]]
+        self.offsets = offsets
+        self.text = text
+        # 结束时间的前缀最大值单调不减，可用于二分查找与某时间点重叠的第一条
+        self._max_ends = array('q')
+        current = -1
+        for end in ends:
+            if end > current:
+                current = end
+            self._max_ends.append(current)
+
+    @classmethod
+    def from_cues(cls, cues, max_gap_ms=None):
+        """
+        从Cue对象序列构建时间轴
+
+        参数:
+            cues (iterable): Cue对象列表或iter_srt返回的生成器
+            max_gap_ms (int, optional): 间隔不超过该毫秒数的相邻字幕合并为一段，为None时不合并
+
+        返回:
+            CueTimeline: 时间轴
+        """
+        starts, ends, offsets = array('q'), array('q'), array('q', [0])
+        parts = []
+        length = 0
+        for cue in cues:
+            if starts and max_gap_ms is not None and cue.start_ms - ends[-1] <= max_gap_ms:
+                # 合并到当前段落
+                ends[-1] = cue.end_ms
+                parts.append(' ')
+                parts.append(cue.text)
+                length += 1 + len(cue.text)
+                offsets[-1] = length
+            else:
+                starts.append(cue.start_ms)
+                ends.append(cue.end_ms)
+                parts.append(cue.text)
+                length += len(cue.text)
+                offsets.append(length)
+        return cls(starts, ends, offsets, ''.join(parts))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def text_of(self, i):
+        """返回第i条的文本"""
+        return self.text[self.offsets[i]:self.offsets[i + 1]]
+
+    def segment(self, i):
+        """返回第i条的字典形式，与combine_subtitles的输出格式相同"""
+        return {
+            'start_time': format_timestamp(self.starts[i]),
+            'end_time': format_timestamp(self.ends[i]),
+            'start_ms': self.starts[i],
+            'end_ms': self.ends[i],
+            'text': self.text_of(i)
+        }
+
+    def to_segments(self):
+        """转换为段落字典列表"""
+        return [self.segment(i) for i in range(len(self))]
+
+    def find(self, t_ms):
+        """
+        查找时间点t_ms正在显示的条目
+
+        返回:
+            int: 条目序号，该时间点没有字幕时返回None
+        """
+        i = bisect_right(self.starts, t_ms) - 1
+        # 条目可能重叠，向前检查仍覆盖该时间点的条目
+        while i >= 0 and self._max_ends[i] >= t_ms:
+            if self.ends[i] >= t_ms:
+                return i
+            i -= 1
+        return None
+
+    def at(self, t_ms):
+        """返回时间点t_ms正在显示的文本，没有字幕时返回None"""
+        i = self.find(t_ms)
+        return None if i is None else self.text_of(i)
+
+    def range(self, start_ms, end_ms):
+        """
+        查询与[start_ms, end_ms)时间范围重叠的条目
+
+        返回:
+            list: 条目序号列表，按开始时间排序
+        """
+        lo = bisect_right(self._max_ends, start_ms)
+        hi = bisect_left(self.starts, end_ms)
+        return [i for i in range(lo, hi) if self.ends[i] > start_ms]
@@ -0,0 +1,157 @@
+import os
+import re
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken是可选依赖，缺失时使用估算器
+    tiktoken = None
+
+# 常见模型的上下文窗口（tokens），按最长前缀匹配模型名称
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+    "o1": 200000,
+    "o3": 200000,
+    "o4-mini": 200000,
+    "deepseek": 65536,
+    "qwen": 32768,
+    "qwen-long": 1000000,
+    "qwen-plus": 131072,
+    "qwen-turbo": 1000000,
+    "glm-4": 128000,
+    "moonshot-v1-8k": 8192,
+    "moonshot-v1-32k": 32768,
+    "moonshot-v1-128k": 131072,
+}
+
+# 未知模型使用的上下文窗口，可通过环境变量BILI_LLM_CONTEXT_TOKENS覆盖
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# 为模型输出预留的tokens（摘要JSON约800字详细摘要加其余字段）
+OUTPUT_RESERVE_TOKENS = int(os.environ.get("BILI_LLM_OUTPUT_TOKENS", "2048"))
+
+# 中日韩文字、假名、谚文及全角标点，在常见分词器中大多单独成为一个token
+_CJK_RE = re.compile("[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+def get_context_window(model):
+    """
+    返回模型的上下文窗口大小
+
+    参数:
+        model (str): 模型名称
+
+    返回:
+        int: 上下文窗口（tokens）
+    """
+    override = os.environ.get("BILI_LLM_CONTEXT_TOKENS")
+    if override:
+        return int(override)
+    name = (model or "").lower()
+    # 去掉"openai/gpt-4o"这类代理服务使用的前缀
+    name = name.rsplit("/", 1)[-1]
+    best = None
+    for prefix in MODEL_CONTEXT_WINDOWS:
+        if name.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return MODEL_CONTEXT_WINDOWS[best] if best else DEFAULT_CONTEXT_WINDOW
+
+@lru_cache(maxsize=None)
+def _get_encoding(model):
+    """返回模型对应的tiktoken编码，未知模型按名称选择常用编码"""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        name = (model or "").lower().rsplit("/", 1)[-1]
+        newer = name.startswith(("gpt-4o", "gpt-4.1", "o1", "o3", "o4"))
+        return tiktoken.get_encoding("o200k_base" if newer else "cl100k_base")
+
+def estimate_tokens(text, model=None):
+    """
+    估算文本的token数
+
+    安装了tiktoken时使用模型对应的编码精确计算；否则中日韩字符按每字1个token、
+    其他字符按约3.5个字符1个token估算，对中文字幕略偏保守。
+
+    参数:
+        text (str): 文本
+        model (str): 模型名称
+
+    返回:
+        int: token数
+    """
+    if not text:
+        return 0
+    if tiktoken is not None:
+        return len(_get_encoding(model).encode(text, disallowed_special=()))
+    cjk = len(text) - len(_CJK_RE.sub("", text))
+    other = len(text) - cjk
+    return cjk + (other * 2 + 6) // 7
+
+def prompt_budget(model, prompt_overhead, output_reserve=None):
+    """
+    计算提示中可用于正文（字幕、片段摘要）的tokens
+
+    参数:
+        model (str): 模型名称
+        prompt_overhead (str): 不含正文的提示模板
+        output_reserve (int): 为输出预留的tokens，默认OUTPUT_RESERVE_TOKENS
+
+    返回:
+        int: 正文可用的tokens，至少为1
+    """
+    reserve = OUTPUT_RESERVE_TOKENS if output_reserve is None else output_reserve
+    return max(1, get_context_window(model) - reserve - estimate_tokens(prompt_overhead, model))
+
+def truncate_to_tokens(text, max_tokens, model=None):
+    """
+    截取不超过max_tokens的最长前缀
+
+    返回:
+        str: 截取后的文本
+    """
+    if estimate_tokens(text, model) <= max_tokens:
+        return text
+    # token数随前缀长度单调增加，二分查找截断位置
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid], model) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low]
+
+def pack_segments(texts, max_tokens, model=None, separator=" "):
+    """
+    按顺序装入尽可能多的完整段落，不在段落中间截断
+
+    第一个段落本身就超出预算时按tokens截断，保证结果非空。
+
+    参数:
+        texts (list): 段落文本列表
+        max_tokens (int): 可用的tokens
+        model (str): 模型名称
+        separator (str): 段落之间的分隔符
+
+    返回:
+        tuple: (拼接后的文本, 装入的段落数, 估算的tokens)
+    """
+    separator_tokens = estimate_tokens(separator, model)
+    packed = []
+    used = 0
+    for text in texts:
+        tokens = estimate_tokens(text, model) + (separator_tokens if packed else 0)
+        if used + tokens > max_tokens:
+            if not packed:
+                text = truncate_to_tokens(text, max_tokens, model)
+                packed.append(text)
+                used = estimate_tokens(text, model)
+            break
+        packed.append(text)
+        used += tokens
+    return separator.join(packed), len(packed), used